@@ -3,15 +3,35 @@ from vocode.streaming.models.message import BaseMessage
 from vocode.streaming.models.synthesizer import ElevenLabsSynthesizerConfig
 from vocode.streaming.models.transcriber import DeepgramTranscriberConfig
 from .groq_agent import GroqSalesAgent, GroqAgentConfig
+from .speculation import SpeculativeResponder
+from .deepgram_stream import DeepgramStreamingTranscriber
+from .http_client import get_http_client
+from .runtime import run_async
+from .tts_cache import TTSCache, normalize_text
+from .audio import TELEPHONY_FORMAT, mulaw_wav, to_telephony
+from .conversation_registry import ConversationRegistry, OutboundCallError
+from .conversation_store import ConversationState, VersionConflictError, create_state_store
+from .metrics import stage_metrics
+from .provider_limits import deepgram_limiter, elevenlabs_limiter
+from .turn_pipeline import TurnPipeline
 import os
 import asyncio
-import requests
 import json
-import base64
+import threading
 from typing import Dict, Optional, List, Any
 
+# Default provider endpoints; DEEPGRAM_API_URL and ELEVENLABS_API_URL override them (e.g. with local stubs)
+DEEPGRAM_API_URL = "https://api.deepgram.com/v1/listen"
+ELEVENLABS_API_URL = "https://api.elevenlabs.io/v1"
+
+DEFAULT_GREETING = "Hello! Welcome to Jivus AI. How can I assist you today?"
+NOT_UNDERSTOOD_MESSAGE = "I'm sorry, I couldn't understand that. Could you please try again?"
+
+# Attempts to save a turn when other workers keep saving the same call in between
+STATE_SAVE_ATTEMPTS = 3
+
 class SalesAgent:
-    def __init__(self):
+    def __init__(self, audio_dir: str = 'audio_responses', llm_client=None, twilio_client=None):
         # Check for required environment variables
         required_env_vars = [
             "GROQ_API_KEY",
@@ -28,7 +48,7 @@ class SalesAgent:
         # Configure the agent with GroqSalesAgent
         self.agent_config = GroqAgentConfig(
             initial_message=BaseMessage(
-                text="Hello! Welcome to Jivus AI. How can I assist you today?"
+                text=DEFAULT_GREETING
             ),
             model_name="llama3-70b-8192",
             temperature=0.3,
@@ -61,88 +81,261 @@ class SalesAgent:
             audio_encoding="linear16"  # Using string instead of enum
         )
         
-        # Keep track of active conversations
-        self.active_conversations = {}
+        # Synthesized phrases are shared by all calls, keyed by text and voice
+        self.tts_cache = TTSCache(
+            audio_dir,
+            max_disk_bytes=int(os.getenv("TTS_CACHE_MAX_MB", 512)) * 1024 * 1024,
+            max_memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_MB", 32)) * 1024 * 1024,
+            # Clips are stored phone-ready (see synthesize_audio)
+            extension="wav"
+        )
+        
+        # Renders phrases that are not tied to any call, such as greetings and fallbacks
+        self.synthesizer = EnhancedConversation(
+            agent=None,
+            deepgram_config=self.deepgram_config,
+            elevenlabs_config=self.elevenlabs_config,
+            tts_cache=self.tts_cache
+        )
+        
+        # Conversations share one Groq client; None means the process-wide pooled client
+        self.llm_client = llm_client
+        
+        # Keep track of active conversations; idle ones are reaped in the background
+        self.active_conversations = ConversationRegistry(
+            ttl_seconds=float(os.getenv("CONVERSATION_TTL_SECONDS", 600)),
+            max_live=int(os.getenv("MAX_LIVE_CONVERSATIONS", 500)),
+            overflow_policy=os.getenv("CONVERSATION_OVERFLOW_POLICY", "evict_oldest")
+        )
+        self.active_conversations.start_reaper()
+        
+        # History and call metadata, saved after every turn so any worker can continue the call (CONVERSATION_STORE)
+        self.state_store = create_state_store()
+        
+        # One Twilio REST client, and its keep-alive connections, for every outbound call; None means build it on first use
+        self._twilio_client = twilio_client
+        self._twilio_lock = threading.Lock()
     
-    def get_conversation(self, call_sid):
-        """Get or create a conversation for the given call SID."""
-        if call_sid in self.active_conversations:
-            return self.active_conversations[call_sid]
+    @property
+    def twilio_client(self):
+        """The shared Twilio REST client."""
+        if self._twilio_client is None:
+            with self._twilio_lock:
+                if self._twilio_client is None:
+                    from twilio.rest import Client
+                    self._twilio_client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+        return self._twilio_client
+    
+    def get_conversation(self, call_sid, metadata: Optional[Dict] = None, reserved: bool = False):
+        """Get or create a conversation for the given call SID.
+        
+        A call this worker has not seen (or has lost, e.g. to a restart) is
+        resumed from the state store; with a shared store, a conversation
+        held here is brought up to date if another worker has taken turns.
+        With reserved, a registry slot was already taken with reserve() and
+        is either filled or given back.
+        """
+        conversation = self.active_conversations.get(call_sid)
+        if conversation is not None:
+            if reserved:
+                # A webhook for the call got here first
+                self.active_conversations.release()
+            if self.state_store.shared:
+                conversation.refresh_state()
+            if metadata:
+                conversation.metadata.update(metadata)
+            return conversation
+        
+        # Fail before building anything if the registry would reject the call
+        if not reserved:
+            self.active_conversations.check_capacity()
+        try:
+            conversation = self._new_conversation(call_sid, metadata)
+        except Exception:
+            if reserved:
+                self.active_conversations.release()
+            raise
         
-        # Create the GroqSalesAgent instance
-        agent = GroqSalesAgent(self.agent_config)
+        # Store the conversation
+        self.active_conversations.add(call_sid, conversation, reserved=reserved)
+        return conversation
+    
+    def _new_conversation(self, call_sid, metadata: Optional[Dict] = None):
+        """Build a call's conversation, resumed from the state store if it has any."""
+        # Create the GroqSalesAgent instance; it only holds this call's history
+        agent = GroqSalesAgent(self.agent_config, llm_client=self.llm_client)
         
         # Create an enhanced conversation with Deepgram and ElevenLabs integration
         conversation = EnhancedConversation(
             agent=agent,
             deepgram_config=self.deepgram_config,
-            elevenlabs_config=self.elevenlabs_config
+            elevenlabs_config=self.elevenlabs_config,
+            tts_cache=self.tts_cache
         )
         conversation.call_sid = call_sid
-        
-        # Store the conversation
-        self.active_conversations[call_sid] = conversation
+        conversation.state_store = self.state_store
+        conversation.refresh_state()
+        if metadata:
+            conversation.metadata.update(metadata)
         return conversation
     
-    def make_outbound_call(self, to_phone, from_phone, webhook_base_url=""):
-        """Make an outbound call to the specified phone number."""
-        # Import Twilio client
-        from twilio.rest import Client
+    def end_conversation(self, call_sid):
+        """Release a finished call's conversation here and its state everywhere."""
+        conversation = self.active_conversations.pop(call_sid)
+        if conversation is not None:
+            conversation.terminate()
+        try:
+            self.state_store.delete(call_sid)
+        except Exception as e:
+            print(f"Error deleting conversation state for {call_sid}: {e}")
+    
+    async def warm_up(self, extra_phrases=()):
+        """Pre-render the greeting and standard phrases into the TTS cache.
+        
+        Returns the number of phrases that are ready to be played.
+        """
+        greeting = await GroqSalesAgent(self.agent_config).get_initial_message()
+        configured = [phrase for phrase in os.getenv("WARMUP_PHRASES", "").split("|") if phrase.strip()]
         
-        # Get Twilio credentials from environment variables
-        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+        phrases = []
+        for phrase in [greeting, DEFAULT_GREETING, NOT_UNDERSTOOD_MESSAGE, *extra_phrases, *configured]:
+            if phrase and phrase not in phrases:
+                phrases.append(phrase)
         
-        client = Client(account_sid, auth_token)
+        clips = await asyncio.gather(*(self.synthesizer.synthesize_clip(phrase) for phrase in phrases))
+        return sum(1 for clip in clips if clip)
+    
+    def make_outbound_call(self, to_phone, from_phone, webhook_base_url="", metadata: Optional[Dict] = None):
+        """Make an outbound call to the specified phone number.
         
+        Raises RegistryFullError (before dialing) if there is no room for the
+        conversation, and OutboundCallError if the call was placed but its
+        conversation could not be set up.
+        """
         # Set up webhook URLs
         if not webhook_base_url:
             webhook_base_url = "http://your-server-url"  # Default fallback
             print(f"Warning: Using default webhook URL: {webhook_base_url}")
             print("Please provide your actual server URL for webhooks to work properly.")
         
-        # Create the call
-        call = client.calls.create(
-            to=to_phone,
-            from_=from_phone,
-            url=f"{webhook_base_url}/twilio/outbound-connect",
-            status_callback=f"{webhook_base_url}/twilio/status"
-        )
+        # Hold the conversation's slot while dialing, so a call that is placed always has room
+        self.active_conversations.reserve()
+        try:
+            call = self.twilio_client.calls.create(
+                to=to_phone,
+                from_=from_phone,
+                url=f"{webhook_base_url}/twilio/outbound-connect",
+                status_callback=f"{webhook_base_url}/twilio/status"
+            )
+        except Exception:
+            self.active_conversations.release()
+            raise
         
         # Create a conversation
-        conversation = self.get_conversation(call.sid)
-        
-        return conversation
+        try:
+            return self.get_conversation(
+                call.sid, {"customer_number": to_phone, "direction": "outbound", **(metadata or {})}, reserved=True
+            )
+        except Exception as e:
+            raise OutboundCallError(call.sid, f"Call {call.sid} was placed but its conversation failed: {e}") from e
 
 
 class EnhancedConversation:
     """An enhanced conversation that integrates Deepgram and ElevenLabs."""
     
-    def __init__(self, agent, deepgram_config, elevenlabs_config):
+    def __init__(self, agent, deepgram_config, elevenlabs_config, tts_cache: Optional[TTSCache] = None):
         self.agent = agent
         self.deepgram_config = deepgram_config
         self.elevenlabs_config = elevenlabs_config
+        self.tts_cache = tts_cache
         self.call_sid = None
         self.is_active = True
+        # Externalized state: None for conversations not tied to a call (e.g. the warmup synthesizer)
+        self.state_store = None
+        self.state_version = 0
+        self.metadata: Dict[str, Any] = {}
+        # The history's messages as of the last load or save, to tell this worker's new ones apart
+        self._synced_messages: List[Dict] = []
         
         # Store API keys for direct access
         self.deepgram_api_key = deepgram_config.api_key
         self.elevenlabs_api_key = elevenlabs_config.api_key
         self.elevenlabs_voice_id = elevenlabs_config.voice_id
         self.elevenlabs_model_id = elevenlabs_config.model_id
+        self.voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.75
+        }
+        self.deepgram_url = os.getenv("DEEPGRAM_API_URL", DEEPGRAM_API_URL)
+        self.elevenlabs_url = os.getenv("ELEVENLABS_API_URL", ELEVENLABS_API_URL)
+        # Start generating on stable interim transcripts when streaming recognition is used
+        self.speculative_responses = os.getenv("SPECULATIVE_RESPONSES", "1") == "1"
+        self.speculation_threshold = float(os.getenv("SPECULATION_SIMILARITY", 0.9))
+        # Webhook turns run through STT, LLM and TTS stages that overlap across turns
+        self.pipeline = TurnPipeline(
+            transcribe=self.transcribe_with_deepgram,
+            respond=lambda text: self.agent.respond(text, self.call_sid),
+            synthesize=self.synthesize_clip,
+            max_pending_turns=int(os.getenv("PIPELINE_MAX_PENDING_TURNS", 2))
+        )
+    
+    def export_state(self) -> ConversationState:
+        context = self.agent.context
+        return ConversationState(self.call_sid, list(context.messages), context.summary, dict(self.metadata), self.state_version)
     
-    async def transcribe_with_deepgram(self, audio_data_base64):
-        """Transcribe audio using Deepgram API directly."""
+    def apply_state(self, state: ConversationState):
+        """Replace this conversation's history and metadata with a stored state."""
+        self.agent.context.messages = state.messages
+        self.agent.context.summary = state.summary
+        self.metadata = dict(state.metadata)
+        self.state_version = state.version
+        self._synced_messages = list(state.messages)
+    
+    def refresh_state(self):
+        """Load the stored state if it is newer than what this conversation holds."""
+        if self.state_store is None:
+            return
+        try:
+            state = self.state_store.load(self.call_sid)
+        except Exception as e:
+            print(f"Error loading conversation state for {self.call_sid}: {e}")
+            return
+        if state is not None and state.version > self.state_version:
+            self.apply_state(state)
+    
+    async def save_state(self):
+        """Save the history after a turn, replaying this turn on top of any newer stored version."""
+        if self.state_store is None or not self.is_active:
+            return
+        for _ in range(STATE_SAVE_ATTEMPTS):
+            state = self.export_state()
+            try:
+                saved = await asyncio.to_thread(self.state_store.save, state)
+            except VersionConflictError:
+                # Another worker saved this call since we loaded it; keep its turns, then ours
+                synced = self._synced_messages
+                new_messages = [m for m in self.agent.context.messages if not any(m is s for s in synced)]
+                remote = await asyncio.to_thread(self.state_store.load, self.call_sid)
+                if remote is None:
+                    # Deleted because the call ended elsewhere
+                    return
+                self.apply_state(remote)
+                self.agent.context.messages.extend(new_messages)
+                continue
+            except Exception as e:
+                print(f"Error saving conversation state for {self.call_sid}: {e}")
+                return
+            self.state_version = saved.version
+            self._synced_messages = state.messages
+            return
+        print(f"Gave up saving conversation state for {self.call_sid} after {STATE_SAVE_ATTEMPTS} conflicts")
+    
+    async def transcribe_with_deepgram(self, audio_data):
+        """Transcribe audio bytes using Deepgram API directly."""
         try:
-            # Decode base64 audio data
-            audio_data = base64.b64decode(audio_data_base64)
-            
             # Set up Deepgram API request
-            url = "https://api.deepgram.com/v1/listen"
-            headers = {
-                "Authorization": f"Token {self.deepgram_api_key}",
-                "Content-Type": "audio/wav"  # Adjust based on your audio format
-            }
+            url = self.deepgram_url
+            headers = {"Authorization": f"Token {self.deepgram_api_key}"}
             params = {
                 "model": self.deepgram_config.model_name,
                 "language": self.deepgram_config.language,
@@ -150,9 +343,18 @@ class EnhancedConversation:
                 "punctuate": True,
                 "diarize": False
             }
+            if bytes(audio_data[:4]) == b"RIFF":
+                headers["Content-Type"] = "audio/wav"
+            else:
+                # Headerless audio is described by the transcriber config
+                headers["Content-Type"] = "application/octet-stream"
+                params["encoding"] = self.deepgram_config.audio_encoding
+                params["sample_rate"] = self.deepgram_config.sampling_rate
             
-            # Make the API request
-            response = requests.post(url, headers=headers, params=params, data=audio_data)
+            # Make the API request over the shared keep-alive pool
+            with stage_metrics.span(self.call_sid, "stt"):
+                async with deepgram_limiter.slot():
+                    response = await get_http_client().post(url, headers=headers, params=params, content=audio_data)
             response.raise_for_status()
             
             # Parse the response
@@ -169,11 +371,17 @@ class EnhancedConversation:
             print(f"Error transcribing with Deepgram: {e}")
             return ""
     
-    async def synthesize_with_elevenlabs(self, text):
-        """Synthesize speech using ElevenLabs API directly."""
+    async def open_transcriber(self, encoding=None, sample_rate=None):
+        """Open a live Deepgram transcription socket for this call."""
+        transcriber = DeepgramStreamingTranscriber(self.deepgram_config, encoding=encoding, sample_rate=sample_rate)
+        await transcriber.connect()
+        return transcriber
+    
+    async def _request_elevenlabs(self, text, output_format=None):
+        """Request speech for the given text from the ElevenLabs API."""
         try:
             # Set up ElevenLabs API request
-            url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.elevenlabs_voice_id}"
+            url = f"{self.elevenlabs_url}/text-to-speech/{self.elevenlabs_voice_id}"
             headers = {
                 "xi-api-key": self.elevenlabs_api_key,
                 "Content-Type": "application/json"
@@ -181,63 +389,142 @@ class EnhancedConversation:
             data = {
                 "text": text,
                 "model_id": self.elevenlabs_model_id,
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.75
-                }
+                "voice_settings": self.voice_settings
             }
             
-            # Make the API request
-            response = requests.post(url, headers=headers, json=data)
+            # ElevenLabs returns MP3 unless another format (e.g. pcm_22050 for phone clips) is requested
+            params = {"output_format": output_format} if output_format else None
+            
+            # Make the API request over the shared keep-alive pool
+            with stage_metrics.span(self.call_sid, "tts"):
+                async with elevenlabs_limiter.slot():
+                    response = await get_http_client().post(url, headers=headers, params=params, json=data)
             response.raise_for_status()
             
             # Get the audio data
-            audio_data = response.content
-            
-            # Return as base64
-            return base64.b64encode(audio_data).decode('utf-8')
+            return response.content
         
         except Exception as e:
             print(f"Error synthesizing with ElevenLabs: {e}")
             return None
     
-    async def get_response(self, user_input):
+    async def _render_telephony(self, text):
+        """Request PCM from ElevenLabs and convert it to a phone-ready 8 kHz mu-law WAV clip."""
+        sample_rate = self.elevenlabs_config.sampling_rate
+        pcm = await self._request_elevenlabs(text, f"pcm_{sample_rate}")
+        if not pcm:
+            return None
+        # Converted once here, so neither Twilio nor the media stream transcodes on playback
+        mulaw = await asyncio.to_thread(to_telephony, pcm, sample_rate)
+        return mulaw_wav(mulaw)
+    
+    def tts_cache_key(self, text, output_format=TELEPHONY_FORMAT):
+        """Return the cache key for this conversation's voice saying the given text."""
+        return TTSCache.make_key(text, self.elevenlabs_voice_id, self.elevenlabs_model_id, self.voice_settings, output_format=output_format)
+    
+    async def synthesize_audio(self, text, output_format=TELEPHONY_FORMAT):
+        """Synthesize speech, reusing any clip already rendered for the same text, voice and format.
+        
+        By default clips are 8 kHz mu-law WAV (TELEPHONY_FORMAT); any other
+        output_format is passed through to ElevenLabs.
+        """
+        text = normalize_text(text)
+        if output_format == TELEPHONY_FORMAT:
+            render = lambda: self._render_telephony(text)
+        else:
+            render = lambda: self._request_elevenlabs(text, output_format)
+        if not self.tts_cache:
+            return await render()
+        return await self.tts_cache.get_or_synthesize(self.tts_cache_key(text, output_format), render)
+    
+    async def synthesize_clip(self, text):
+        """Make sure the given text is in the TTS cache and return its clip filename."""
+        audio = await self.synthesize_audio(text)
+        if not audio or not self.tts_cache:
+            return None
+        return self.tts_cache.filename(self.tts_cache_key(normalize_text(text)))
+    
+    def cached_clip(self, text):
+        """Return the clip filename for text if it has already been synthesized."""
+        if not self.tts_cache:
+            return None
+        key = self.tts_cache_key(normalize_text(text))
+        return self.tts_cache.filename(key) if self.tts_cache.contains(key) else None
+    
+    async def get_response(self, user_input, is_interrupt=False):
         """Get a response from the agent for the given user input."""
         full_response = ""
-        async for chunk in self.agent.respond(user_input, self.call_sid):
+        async for chunk in self.agent.respond(user_input, self.call_sid, is_interrupt=is_interrupt):
             full_response += chunk
         return full_response
     
-    async def process_speech_input(self, audio_data_base64):
+    async def stream_response(self, user_input):
+        """Yield cached response clips in order while the agent is still generating."""
+        turn = await self.pipeline.submit(transcript=user_input)
+        try:
+            async for segment in turn.segments():
+                yield {"index": segment["index"], "text": segment["text"], "clip": segment["audio"]}
+        finally:
+            await self.save_state()
+    
+    async def respond_to_transcripts(self, results, is_interrupt=False, stream=False):
+        """Answer the next utterance from a stream of interim/final transcript results.
+
+        The response may be generated speculatively from an interim transcript;
+        see SpeculativeResponder. With stream, the reply is returned while it
+        is still being generated and the caller saves the state once it is done.
+        """
+        responder = SpeculativeResponder(
+            lambda text: self.agent.respond(text, self.call_sid, is_interrupt=is_interrupt),
+            checkpoint=self.agent.checkpoint,
+            rollback=self.agent.rollback,
+            amend=self.agent.amend_last_input,
+            threshold=self.speculation_threshold,
+            enabled=self.speculative_responses
+        )
+        if stream:
+            return await responder.respond(results, stream=True)
+        try:
+            return await responder.respond(results)
+        finally:
+            await self.save_state()
+    
+    async def process_speech_input(self, audio_data):
         """Process speech input: transcribe, get response, and synthesize."""
-        # Step 1: Transcribe with Deepgram
-        transcript = await self.transcribe_with_deepgram(audio_data_base64)
+        # Step 1: Transcribe with Deepgram, in the pipeline's STT stage
+        turn = await self.pipeline.submit(audio=audio_data)
+        transcript = await turn.transcribed
         
         if not transcript:
             # If transcription failed, return a default response
             return {
                 "success": False,
                 "transcript": "",
-                "response_text": "I'm sorry, I couldn't understand that. Could you please try again?",
-                "response_audio": None
+                "response_text": NOT_UNDERSTOOD_MESSAGE,
+                "response_clips": []
             }
         
-        # Step 2: Get response from agent
-        response_text = await self.get_response(transcript)
-        
-        # Step 3: Synthesize speech with ElevenLabs
-        response_audio = await self.synthesize_with_elevenlabs(response_text)
+        # Steps 2 and 3: Stream the agent's response into ElevenLabs phrase by phrase
+        segments = [
+            {"index": segment["index"], "text": segment["text"], "clip": segment["audio"]}
+            async for segment in turn.segments()
+        ]
+        response_text = "".join(segment["text"] for segment in segments)
+        await self.save_state()
         
+        # The clips are already in the TTS cache; callers fetch them by name instead of receiving the audio
         return {
             "success": True,
             "transcript": transcript,
             "response_text": response_text,
-            "response_audio": response_audio
+            "response_clips": [segment["clip"] for segment in segments if segment["clip"]],
+            "response_segments": segments
         }
     
     def terminate(self):
         """Terminate the conversation."""
         self.is_active = False
+        self.pipeline.close()
         self.agent.reset()
     
     # Add these attributes to mimic the expected interface
@@ -258,12 +545,17 @@ class EnhancedConversation:
         # Get initial message from agent
         initial_message = None
         try:
-            initial_message = asyncio.run(self.agent.get_initial_message())
+            initial_message = run_async(self.agent.get_initial_message())
         except:
             pass
         
-        # Add a simple greeting message
-        response.say(initial_message or "Hello! Welcome to Jivus AI. How can I assist you today?")
+        # Play the pre-rendered greeting when warmup has cached it
+        greeting = initial_message or DEFAULT_GREETING
+        clip = self.cached_clip(greeting)
+        if clip:
+            response.play(f"/twilio/audio/{clip}")
+        else:
+            response.say(greeting)
         
         # Add a gather to capture user input
         gather = response.gather(
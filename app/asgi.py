@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from app.event_bus import KEEPALIVE_SECONDS, events
+from app.http_client import close_http_client
+from app.media_stream import MEDIA_STREAM_PATH, MediaStreamSession
+from app.runtime import runtime
+from app.twilio_server import agent, app as flask_app, audio_assets, audio_collector, campaigns, live_event_frame, logger, warm_up_speech
+
+AUDIO_PATH_PREFIX = "/twilio/audio/"
+
+
+class VoiceAgentApp:
+    """ASGI application serving the Flask routes on one long-lived event loop.
+
+    Route handlers run on a thread pool, while all provider I/O they start
+    (Groq, Deepgram, ElevenLabs) is multiplexed on the server's event loop,
+    so concurrent calls no longer serialize on per-request loops.
+    """
+
+    def __init__(self, wsgi_app, threads: int):
+        self.http_app = WSGIMiddleware(wsgi_app, workers=threads)
+        self.warmup = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] == "websocket":
+            await self.websocket(scope, receive, send)
+            return
+        if scope["type"] == "http" and scope["path"] == "/events":
+            await self.stream_events(receive, send)
+            return
+        if scope["type"] == "http" and scope["path"].startswith(AUDIO_PATH_PREFIX) and scope["method"] in ("GET", "HEAD"):
+            await self.serve_audio(scope, send)
+            return
+        await self.http_app(scope, receive, send)
+
+    async def serve_audio(self, scope, send):
+        """Serve clips through the loop rather than a handler thread, zero-copy where the server supports it."""
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        # The stat, the first ETag's digest and opening the file all wait on the disk, so keep them off the loop
+        asset = await asyncio.to_thread(audio_assets.respond, scope["path"][len(AUDIO_PATH_PREFIX):], headers)
+        body_file, body = None, b""
+        if asset.path is not None and scope["method"] != "HEAD":
+            # Open the file before the headers go out: the collector may delete it in between
+            try:
+                if "http.response.zerocopysend" in scope.get("extensions", {}):
+                    body_file = await asyncio.to_thread(open, asset.path, "rb")
+                else:
+                    # Clips are small, so one read is cheaper than streaming chunks
+                    body = await asyncio.to_thread(asset.read)
+            except OSError:
+                asset = audio_assets.vanished(asset)
+
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": asset.status,
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in asset.headers],
+            })
+            if body_file is not None:
+                await send({"type": "http.response.zerocopysend", "file": body_file.fileno(), "offset": asset.offset, "count": asset.length})
+            else:
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            if body_file is not None:
+                body_file.close()
+
+    async def stream_events(self, receive, send):
+        """Serve the dashboard event stream on the loop, so open tabs don't each hold a worker thread."""
+        subscription = events.subscribe(asyncio.get_running_loop())
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+            while not disconnected.done():
+                event = await subscription.next(timeout=KEEPALIVE_SECONDS)
+                await send({"type": "http.response.body", "body": live_event_frame(event).encode(), "more_body": True})
+        finally:
+            disconnected.cancel()
+            subscription.close()
+
+    async def websocket(self, scope, receive, send):
+        """Serve Twilio Media Streams sockets on the loop; no other WebSocket paths exist."""
+        if (await receive())["type"] != "websocket.connect":
+            return
+        if scope["path"] != MEDIA_STREAM_PATH:
+            await send({"type": "websocket.close", "code": 1008})
+            return
+        await send({"type": "websocket.accept"})
+
+        async def send_message(message):
+            await send({"type": "websocket.send", "text": json.dumps(message)})
+
+        async def messages():
+            while True:
+                message = await receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                yield json.loads(message.get("text") or message["bytes"])
+
+        try:
+            await MediaStreamSession(agent, logger, send_message).run(messages())
+        except Exception as e:
+            print(f"Error handling media stream: {e}")
+        try:
+            await send({"type": "websocket.close", "code": 1000})
+        except Exception:
+            # Twilio already closed the socket
+            pass
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def lifespan(self, receive, send):
+        """Bind the shared runtime to the server's loop for the lifetime of the worker."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                runtime.bind(asyncio.get_running_loop())
+                # Render fixed phrases in the background; until then calls fall back to <Say>
+                self.warmup = asyncio.ensure_future(warm_up_speech())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.warmup.cancel()
+                await close_http_client()
+                audio_collector.stop()
+                await asyncio.to_thread(campaigns.stop)
+                # Flush transcript records still queued in the write-behind logger
+                await asyncio.to_thread(logger.close)
+                runtime.unbind()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+# Threads only wait on the event loop while provider calls are in flight, so a
+# large pool is cheap and lets one worker hold hundreds of concurrent calls
+application = VoiceAgentApp(flask_app, threads=int(os.getenv("WSGI_THREADS", 200)))
@@ -0,0 +1,83 @@
+import struct
+from typing import Union
+
+import numpy as np
+
+# Phone audio: 8 kHz mono G.711 mu-law, what Twilio plays and streams without transcoding
+TELEPHONY_SAMPLE_RATE = 8000
+# Cache/output format name for clips rendered by to_telephony() and wrapped by mulaw_wav()
+TELEPHONY_FORMAT = "wav_mulaw_8000"
+WAVE_FORMAT_MULAW = 7
+# RIFF + fmt (18-byte body, as non-PCM formats require) + fact + data chunk headers
+WAV_HEADER_BYTES = 12 + 26 + 12 + 8
+
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+# Taps of the anti-aliasing filter applied before downsampling
+RESAMPLE_TAPS = 63
+
+AudioBuffer = Union[bytes, bytearray, memoryview]
+
+
+def pcm16_samples(pcm: AudioBuffer) -> np.ndarray:
+    """View little-endian 16-bit PCM as an int16 array without copying it."""
+    return np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+
+
+def _lowpass(cutoff: float) -> np.ndarray:
+    """Windowed-sinc low-pass filter; cutoff is a fraction of the input sample rate."""
+    n = np.arange(RESAMPLE_TAPS) - (RESAMPLE_TAPS - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.blackman(RESAMPLE_TAPS)
+    return taps / taps.sum()
+
+
+def resample(samples: np.ndarray, from_rate: int, to_rate: int) -> np.ndarray:
+    """Resample a mono signal to to_rate, low-pass filtering first when downsampling."""
+    samples = samples.astype(np.float32)
+    if from_rate == to_rate or not len(samples):
+        return samples
+    if to_rate < from_rate:
+        # Keep content above the new Nyquist frequency from aliasing into the speech band
+        samples = np.convolve(samples, _lowpass(0.5 * to_rate / from_rate), mode="same").astype(np.float32)
+    positions = np.arange(int(len(samples) * to_rate / from_rate)) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def mulaw_encode(samples: np.ndarray) -> bytes:
+    """Encode 16-bit-range samples as G.711 mu-law bytes."""
+    samples = np.clip(np.round(samples), -32768, 32767).astype(np.int32)
+    sign = np.where(samples < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(samples), MULAW_CLIP) + MULAW_BIAS
+    exponent = np.floor(np.log2(magnitude)).astype(np.int32) - 7
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def mulaw_decode(mulaw: AudioBuffer) -> np.ndarray:
+    """Decode G.711 mu-law bytes to int16 samples."""
+    codes = ~np.frombuffer(mulaw, dtype=np.uint8).astype(np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    magnitude = (((codes & 0x0F) << 3) + MULAW_BIAS) << exponent
+    return np.where(codes & 0x80, MULAW_BIAS - magnitude, magnitude - MULAW_BIAS).astype(np.int16)
+
+
+def to_telephony(pcm: AudioBuffer, sample_rate: int) -> bytes:
+    """Convert 16-bit PCM at any rate to 8 kHz mu-law."""
+    return mulaw_encode(resample(pcm16_samples(pcm), sample_rate, TELEPHONY_SAMPLE_RATE))
+
+
+def mulaw_wav(mulaw: AudioBuffer) -> bytes:
+    """Wrap 8 kHz mu-law in a WAV container that Twilio's <Play> accepts as is."""
+    size = len(mulaw)
+    header = b"".join([
+        b"RIFF", struct.pack("<I", WAV_HEADER_BYTES - 8 + size), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHHH", 18, WAVE_FORMAT_MULAW, 1, TELEPHONY_SAMPLE_RATE, TELEPHONY_SAMPLE_RATE, 1, 8, 0),
+        b"fact", struct.pack("<II", 4, size),
+        b"data", struct.pack("<I", size)
+    ])
+    return header + mulaw
+
+
+def wav_payload(wav: AudioBuffer) -> memoryview:
+    """The raw mu-law inside a clip made by mulaw_wav(), without copying it."""
+    return memoryview(wav)[WAV_HEADER_BYTES:]
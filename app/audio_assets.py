@@ -0,0 +1,325 @@
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .tts_cache import KEY_PATTERN, TTSCache
+
+# TTS cache clips are named by a hash of everything that determines their audio, so a URL never changes meaning
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Other files in the directory (e.g. written before the cache existed) may be replaced
+MUTABLE_MAX_AGE = 3600
+
+# Twilio expects these over the x- variants mimetypes may guess
+CONTENT_TYPES = {".wav": "audio/wav", ".mp3": "audio/mpeg"}
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into an inclusive (start, end).
+
+    Returns None when the header should be ignored (malformed, or several
+    ranges) and the whole file served; start >= size means unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return start, start
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class AssetResponse:
+    """What to send for one audio request: a status, headers, and which bytes of which file."""
+
+    def __init__(self, status: int, headers: List[Tuple[str, str]], path: Optional[str] = None, offset: int = 0, length: int = 0):
+        self.status = status
+        self.headers = headers
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def read(self) -> bytes:
+        """Read the body's bytes, for servers that can't send a file region directly."""
+        if self.path is None or self.length == 0:
+            return b""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            return f.read(self.length)
+
+
+class AudioAssets:
+    """HTTP semantics for serving synthesized clips, independent of the web framework.
+
+    Clips get a strong ETag (a digest of their bytes, computed once per file
+    version), Last-Modified, long-lived immutable Cache-Control, 304 answers
+    to conditional requests and single byte ranges. The caller gets back
+    the file region to send, so servers that support it can send it with
+    sendfile instead of copying it through Python.
+    """
+
+    def __init__(self, directory: str, tts_cache: Optional[TTSCache] = None):
+        self.directory = directory
+        self.tts_cache = tts_cache
+        self._lock = threading.Lock()
+        # path -> (mtime_ns, size, etag)
+        self._etags: Dict[str, Tuple[int, int, str]] = {}
+        if tts_cache is not None:
+            # Clips the cache deletes itself (LRU eviction, discard) are never requested through forget() otherwise
+            tts_cache.on_evict = self.forget
+
+        self.responses = {200: 0, 206: 0, 304: 0, 404: 0, 416: 0}
+        self.bytes_sent = 0
+
+    def resolve(self, filename: str) -> Optional[Tuple[str, bool]]:
+        """Return (path, immutable) for a requested clip, or None if there is no such file."""
+        # basename() keeps requests inside the audio directory
+        safe_filename = os.path.basename(filename)
+        key, _ = os.path.splitext(safe_filename)
+        if self.tts_cache is not None and KEY_PATTERN.match(key) and safe_filename == self.tts_cache.filename(key):
+            path = self.tts_cache.locate(key)
+            if path is not None:
+                return path, True
+        path = os.path.join(self.directory, safe_filename)
+        if safe_filename.endswith(".tmp") or not os.path.isfile(path):
+            return None
+        return path, False
+
+    def etag(self, path: str, stat: os.stat_result) -> str:
+        with self._lock:
+            cached = self._etags.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(block)
+        etag = f'"{digest.hexdigest()[:32]}"'
+        with self._lock:
+            self._etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+        return etag
+
+    def forget(self, path: str):
+        """Drop the remembered ETag of a deleted file."""
+        with self._lock:
+            self._etags.pop(path, None)
+
+    def respond(self, filename: str, headers: Mapping[str, str]) -> AssetResponse:
+        """Decide the response to a GET or HEAD for filename, given lower-cased request headers."""
+        resolved = self.resolve(filename)
+        try:
+            if resolved is None:
+                raise FileNotFoundError(filename)
+            path, immutable = resolved
+            stat = os.stat(path)
+            etag = self.etag(path, stat)
+        except OSError:
+            if resolved is not None:
+                self.forget(resolved[0])
+            self._count(404)
+            return AssetResponse(404, [("Content-Length", "0")])
+
+        size = stat.st_size
+        response_headers = [
+            ("Content-Type", CONTENT_TYPES.get(os.path.splitext(path)[1]) or mimetypes.guess_type(path)[0] or "application/octet-stream"),
+            ("ETag", etag),
+            ("Last-Modified", formatdate(stat.st_mtime, usegmt=True)),
+            ("Accept-Ranges", "bytes"),
+            ("Cache-Control", f"public, max-age={IMMUTABLE_MAX_AGE}, immutable" if immutable else f"public, max-age={MUTABLE_MAX_AGE}")
+        ]
+
+        if self._not_modified(headers, etag, stat.st_mtime):
+            self._count(304)
+            return AssetResponse(304, response_headers)
+
+        byte_range = None
+        if "range" in headers and headers.get("if-range", etag) == etag:
+            byte_range = parse_byte_range(headers["range"], size)
+        if byte_range is None:
+            self._count(200, size)
+            return AssetResponse(200, response_headers + [("Content-Length", str(size))], path, 0, size)
+
+        start, end = byte_range
+        if start >= size:
+            self._count(416)
+            return AssetResponse(416, response_headers + [("Content-Range", f"bytes */{size}"), ("Content-Length", "0")])
+        length = end - start + 1
+        self._count(206, length)
+        return AssetResponse(206, response_headers + [
+            ("Content-Range", f"bytes {start}-{end}/{size}"),
+            ("Content-Length", str(length))
+        ], path, start, length)
+
+    def vanished(self, asset: AssetResponse) -> AssetResponse:
+        """The 404 to send instead of asset when its file was deleted (e.g. by the collector) after respond()."""
+        self.forget(asset.path)
+        with self._lock:
+            self.responses[asset.status] -= 1
+            self.bytes_sent -= asset.length
+        self._count(404)
+        return AssetResponse(404, [("Content-Length", "0")])
+
+    def _count(self, status: int, body_bytes: int = 0):
+        with self._lock:
+            self.responses[status] += 1
+            self.bytes_sent += body_bytes
+
+    @staticmethod
+    def _not_modified(headers: Mapping[str, str], etag: str, mtime: float) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison, as RFC 9110 requires for If-None-Match
+            candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+            return "*" in candidates or etag in candidates
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "responses": dict(self.responses),
+                "bytes_sent": self.bytes_sent,
+                "etags_cached": len(self._etags)
+            }
+
+
+class AudioCollector:
+    """Background sweeper that keeps the audio directory within size and age quotas.
+
+    Each sweep deletes temp files left by interrupted writes, then the oldest
+    files until none is older than max_age_seconds and the directory fits in
+    max_bytes. TTS cache clips are aged by when the cache last used them
+    (served clips are not read, so their mtime goes stale) and removed
+    through the cache so its index stays in step; clips hot in its memory
+    tier are kept.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        tts_cache: Optional[TTSCache] = None,
+        assets: Optional[AudioAssets] = None,
+        max_bytes: int = 1024 * 1024 * 1024,
+        max_age_seconds: float = 30 * 24 * 3600,
+        interval_seconds: float = 600,
+        temp_grace_seconds: float = 600
+    ):
+        self.directory = directory
+        self.tts_cache = tts_cache
+        self.assets = assets
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.interval_seconds = interval_seconds
+        self.temp_grace_seconds = temp_grace_seconds
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.sweeps = 0
+        self.deleted_files = 0
+        self.deleted_bytes = 0
+        self.directory_bytes = 0
+        self.last_sweep_seconds = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audio-collector", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Error collecting audio files: {e}")
+
+    def _delete(self, filename: str) -> bool:
+        key, _ = os.path.splitext(filename)
+        path = os.path.join(self.directory, filename)
+        if self.tts_cache is not None and KEY_PATTERN.match(key) and filename == self.tts_cache.filename(key):
+            deleted = self.tts_cache.discard(key)
+        else:
+            try:
+                os.remove(path)
+                deleted = True
+            except FileNotFoundError:
+                deleted = False
+        if deleted and self.assets is not None:
+            self.assets.forget(path)
+        return deleted
+
+    def _last_used(self, filename: str, mtime: float) -> float:
+        key, _ = os.path.splitext(filename)
+        if self.tts_cache is not None and KEY_PATTERN.match(key) and filename == self.tts_cache.filename(key):
+            return max(mtime, self.tts_cache.last_used(key) or 0)
+        return mtime
+
+    def collect(self) -> Dict:
+        """Run one sweep; returns how many files and bytes it deleted."""
+        started = time.perf_counter()
+        now = time.time()
+        files = []
+        deleted_files = deleted_bytes = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith(".tmp"):
+                    if now - stat.st_mtime > self.temp_grace_seconds and self._delete(entry.name):
+                        deleted_files += 1
+                        deleted_bytes += stat.st_size
+                    continue
+                files.append((self._last_used(entry.name, stat.st_mtime), entry.name, stat.st_size))
+
+        total = sum(size for _, _, size in files)
+        # Oldest first: once a file is within the age quota and the total fits, so is everything after it
+        for mtime, filename, size in sorted(files):
+            if now - mtime <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            if self._delete(filename):
+                total -= size
+                deleted_files += 1
+                deleted_bytes += size
+
+        self.sweeps += 1
+        self.deleted_files += deleted_files
+        self.deleted_bytes += deleted_bytes
+        self.directory_bytes = total
+        self.last_sweep_seconds = round(time.perf_counter() - started, 4)
+        return {"deleted_files": deleted_files, "deleted_bytes": deleted_bytes, "directory_bytes": total}
+
+    def stats(self) -> Dict:
+        return {
+            "sweeps": self.sweeps,
+            "deleted_files": self.deleted_files,
+            "deleted_bytes": self.deleted_bytes,
+            "directory_bytes": self.directory_bytes,
+            "last_sweep_seconds": self.last_sweep_seconds
+        }
@@ -0,0 +1,424 @@
+import argparse
+import base64
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from .transcript_archive import TranscriptArchive
+from .transcript_writer import read_call_log, replay_records
+
+DEFAULT_INDEX_PATH = os.path.join('logs', 'call_index.db')
+
+# Search ranks at most this many of the newest matching utterances, so very common terms stay fast
+SEARCH_RANK_WINDOW = 5000
+
+# Marks matched terms in search snippets; replaced by <mark> once the text is escaped
+_MATCH_START, _MATCH_END = "\x02", "\x03"
+
+
+class CallIndex:
+    """Persistent aggregate index of call summaries, backed by SQLite.
+
+    The conversation logger updates it as calls start and end so that the
+    dashboard can read its counters and recent calls without touching the
+    individual log files. Each logged utterance is also added to an FTS5
+    full-text index, so calls can be searched by what was said.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # One connection shared by all request threads, serialized by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        """Create the index tables if they don't exist yet."""
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS calls (
+                    call_sid TEXT PRIMARY KEY,
+                    customer_number TEXT,
+                    start_time TEXT NOT NULL,
+                    start_date TEXT NOT NULL,
+                    end_time TEXT,
+                    status TEXT,
+                    duration_seconds REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_calls_start_time ON calls (start_time, call_sid);
+                CREATE INDEX IF NOT EXISTS idx_calls_status ON calls (status, start_time, call_sid);
+                CREATE INDEX IF NOT EXISTS idx_calls_number ON calls (customer_number, start_time, call_sid);
+                -- Indexes written before in-progress calls carried an explicit status
+                UPDATE calls SET status = 'in-progress' WHERE status IS NULL AND end_time IS NULL;
+
+                CREATE TABLE IF NOT EXISTS call_totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    total_calls INTEGER NOT NULL,
+                    ended_calls INTEGER NOT NULL,
+                    duration_sum REAL NOT NULL
+                );
+                INSERT OR IGNORE INTO call_totals VALUES (0, 0, 0, 0.0);
+
+                CREATE TABLE IF NOT EXISTS daily_calls (
+                    day TEXT PRIMARY KEY,
+                    calls INTEGER NOT NULL
+                );
+
+                -- One row per utterance; porter stemming lets "cancel" match "cancelled"
+                CREATE VIRTUAL TABLE IF NOT EXISTS utterances USING fts5(
+                    call_sid UNINDEXED,
+                    timestamp UNINDEXED,
+                    speaker UNINDEXED,
+                    text,
+                    tokenize = 'porter unicode61'
+                );
+            """)
+
+    def _insert_start(self, call_sid: str, number: str, start_time: str) -> bool:
+        """Insert a new call row and bump the counters. Caller must hold the lock."""
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO calls (call_sid, customer_number, start_time, start_date, status) "
+            "VALUES (?, ?, ?, ?, 'in-progress')",
+            (call_sid, number, start_time, start_time[:10])
+        )
+        if cursor.rowcount == 0:
+            return False
+
+        self._conn.execute("UPDATE call_totals SET total_calls = total_calls + 1 WHERE id = 0")
+        self._conn.execute(
+            "INSERT INTO daily_calls (day, calls) VALUES (?, 1) "
+            "ON CONFLICT(day) DO UPDATE SET calls = calls + 1",
+            (start_time[:10],)
+        )
+        return True
+
+    def _apply_end(self, call_sid: str, end_time: str, status: str):
+        """Record the end of a call and fold its duration into the totals. Caller must hold the lock."""
+        row = self._conn.execute(
+            "SELECT start_time, duration_seconds FROM calls WHERE call_sid = ?", (call_sid,)
+        ).fetchone()
+        if row is None:
+            return
+
+        duration = (datetime.fromisoformat(end_time) - datetime.fromisoformat(row["start_time"])).total_seconds()
+        self._conn.execute(
+            "UPDATE calls SET end_time = ?, status = ?, duration_seconds = ? WHERE call_sid = ?",
+            (end_time, status, duration, call_sid)
+        )
+
+        if row["duration_seconds"] is None:
+            self._conn.execute(
+                "UPDATE call_totals SET ended_calls = ended_calls + 1, "
+                "duration_sum = duration_sum + ? WHERE id = 0",
+                (duration,)
+            )
+        else:
+            # The call was already ended once; replace its old duration
+            self._conn.execute(
+                "UPDATE call_totals SET duration_sum = duration_sum + ? WHERE id = 0",
+                (duration - row["duration_seconds"],)
+            )
+
+    def _insert_turn(self, call_sid: str, timestamp: str, user: str, agent: str):
+        """Add a turn's utterances to the full-text index. Caller must hold the lock."""
+        self._conn.executemany(
+            "INSERT INTO utterances (call_sid, timestamp, speaker, text) VALUES (?, ?, ?, ?)",
+            [(call_sid, timestamp, speaker, text) for speaker, text in (("user", user), ("agent", agent)) if text]
+        )
+
+    def record_start(self, call_sid: str, number: str, start_time: str):
+        """Add a call to the index when it starts."""
+        try:
+            with self._lock, self._conn:
+                if not self._insert_start(call_sid, number, start_time):
+                    # Already indexed (e.g. implicitly started); keep the real number
+                    self._conn.execute(
+                        "UPDATE calls SET customer_number = ? WHERE call_sid = ? AND customer_number = 'unknown'",
+                        (number, call_sid)
+                    )
+        except sqlite3.Error as e:
+            print(f"Error indexing call start for {call_sid}: {e}")
+
+    def record_end(self, call_sid: str, start_time: str, end_time: str, status: str, number: str = "unknown"):
+        """Mark a call as ended in the index, indexing its start first if needed."""
+        try:
+            with self._lock, self._conn:
+                self._insert_start(call_sid, number, start_time)
+                self._apply_end(call_sid, end_time, status)
+        except sqlite3.Error as e:
+            print(f"Error indexing call end for {call_sid}: {e}")
+
+    def record_turn(self, call_sid: str, timestamp: str, user: str, agent: str):
+        """Make a logged turn searchable."""
+        try:
+            with self._lock, self._conn:
+                self._insert_turn(call_sid, timestamp, user, agent)
+        except sqlite3.Error as e:
+            print(f"Error indexing turn for {call_sid}: {e}")
+
+    def get_stats(self) -> Dict:
+        """Return total calls, today's calls and average duration (minutes)."""
+        today = datetime.now().date().isoformat()
+        with self._lock:
+            totals = self._conn.execute(
+                "SELECT total_calls, ended_calls, duration_sum FROM call_totals WHERE id = 0"
+            ).fetchone()
+            daily = self._conn.execute("SELECT calls FROM daily_calls WHERE day = ?", (today,)).fetchone()
+
+        ended_calls = totals["ended_calls"]
+        return {
+            "total_calls": totals["total_calls"],
+            "today_calls": daily["calls"] if daily else 0,
+            "avg_duration": (totals["duration_sum"] / ended_calls / 60) if ended_calls else 0
+        }
+
+    def list_calls(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        number: Optional[str] = None,
+        start_from: Optional[str] = None,
+        start_to: Optional[str] = None
+    ) -> Dict:
+        """Return one page of calls, newest first, with a cursor for the next page.
+
+        Pages are read by keyset on (start_time, call_sid), so the cost depends on
+        the page size rather than on the number of calls. start_from/start_to are
+        ISO dates or datetimes; a bare date for start_to includes that whole day.
+        """
+        conditions = []
+        params: List = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if number:
+            conditions.append("customer_number = ?")
+            params.append(number)
+        if start_from:
+            conditions.append("start_time >= ?")
+            params.append(start_from)
+        if start_to:
+            conditions.append("start_time <= ?")
+            params.append(f"{start_to}T99" if len(start_to) == 10 else start_to)
+        if cursor:
+            cursor_time, cursor_sid = decode_cursor(cursor)
+            conditions.append("(start_time < ? OR (start_time = ? AND call_sid < ?))")
+            params.extend([cursor_time, cursor_time, cursor_sid])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT call_sid, customer_number, start_time, end_time, status, duration_seconds "
+                f"FROM calls {where} ORDER BY start_time DESC, call_sid DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+
+        calls = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(calls[-1]["start_time"], calls[-1]["call_sid"])
+        return {"calls": calls, "next_cursor": next_cursor}
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        status: Optional[str] = None,
+        start_from: Optional[str] = None,
+        start_to: Optional[str] = None,
+        speaker: Optional[str] = None
+    ) -> Dict:
+        """Return calls whose utterances match query, best match first.
+
+        The query is made of terms and "quoted phrases", all of which must
+        appear in one utterance; a trailing * makes a term a prefix, and OR
+        between two parts matches either. Calls are ranked by the BM25 score
+        of their best matching utterance, which is returned as a snippet.
+        Only the newest SEARCH_RANK_WINDOW matches (after filtering) are
+        ranked, which bounds the cost of terms that appear everywhere.
+        Filters are as for list_calls, plus speaker ("user" or "agent").
+        """
+        match = fts_query(query)
+        conditions = ["utterances MATCH ?"]
+        params: List = [match]
+        if speaker:
+            conditions.append("u.speaker = ?")
+            params.append(speaker)
+        if status:
+            conditions.append("c.status = ?")
+            params.append(status)
+        if start_from:
+            conditions.append("c.start_time >= ?")
+            params.append(start_from)
+        if start_to:
+            conditions.append("c.start_time <= ?")
+            params.append(f"{start_to}T99" if len(start_to) == 10 else start_to)
+
+        started = time.perf_counter()
+        with self._lock:
+            # FTS5 walks matches newest first and stops at the window; MIN() makes SQLite
+            # take the bare id from each call's best matching utterance
+            rows = self._conn.execute(
+                "SELECT m.call_sid, c.customer_number, c.start_time, c.status, "
+                "m.id, MIN(m.score) AS score, COUNT(*) AS matches "
+                "FROM (SELECT u.rowid AS id, u.call_sid, u.rank AS score "
+                "      FROM utterances u JOIN calls c ON c.call_sid = u.call_sid "
+                f"     WHERE {' AND '.join(conditions)} ORDER BY u.rowid DESC LIMIT ?) m "
+                "JOIN calls c ON c.call_sid = m.call_sid "
+                "GROUP BY m.call_sid ORDER BY score, c.start_time DESC LIMIT ? OFFSET ?",
+                (*params, SEARCH_RANK_WINDOW, limit + 1, offset)
+            ).fetchall()
+            page = [dict(row) for row in rows[:limit]]
+            ids = [row["id"] for row in page]
+            snippets = {
+                row["id"]: row for row in self._conn.execute(
+                    "SELECT rowid AS id, speaker, timestamp, "
+                    f"snippet(utterances, 3, '{_MATCH_START}', '{_MATCH_END}', '…', 16) AS snippet "
+                    f"FROM utterances WHERE utterances MATCH ? AND rowid IN ({', '.join('?' * len(ids))})",
+                    (match, *ids)
+                )
+            } if ids else {}
+        took = time.perf_counter() - started
+
+        results = []
+        for result in page:
+            utterance = snippets[result.pop("id")]
+            marked = utterance["snippet"]
+            result.update(
+                speaker=utterance["speaker"],
+                timestamp=utterance["timestamp"],
+                score=round(-result["score"], 4),
+                snippet=marked.replace(_MATCH_START, "").replace(_MATCH_END, ""),
+                snippet_html=html.escape(marked).replace(_MATCH_START, "<mark>").replace(_MATCH_END, "</mark>")
+            )
+            results.append(result)
+        return {
+            "results": results,
+            "next_offset": offset + limit if len(rows) > limit else None,
+            "took_ms": round(took * 1000, 2)
+        }
+
+    def _index_call(self, call_sid: str, call_data: Dict):
+        """Add a replayed call log to the index. Caller must hold the lock."""
+        self._insert_start(call_sid, call_data.get('customer_number', 'unknown'), call_data['start_time'])
+        for entry in call_data.get('transcript', []):
+            self._insert_turn(call_sid, entry.get('timestamp'), entry.get('user'), entry.get('agent'))
+        if 'end_time' in call_data:
+            self._apply_end(call_sid, call_data['end_time'], call_data.get('status', 'completed'))
+
+    def rebuild(self, logs_dir: str = 'logs', archive: Optional[TranscriptArchive] = None) -> int:
+        """Rebuild the whole index from the call logs (JSONL or legacy JSON) in logs_dir and the archive, if given."""
+        indexed = 0
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM calls")
+            self._conn.execute("DELETE FROM daily_calls")
+            self._conn.execute("DELETE FROM utterances")
+            self._conn.execute(
+                "UPDATE call_totals SET total_calls = 0, ended_calls = 0, duration_sum = 0.0 WHERE id = 0"
+            )
+
+            archived = set()
+            if archive is not None:
+                for call_sid, records in archive.iter_calls():
+                    archived.add(call_sid)
+                    try:
+                        self._index_call(call_sid, replay_records(records))
+                        indexed += 1
+                    except (KeyError, ValueError) as e:
+                        print(f"Error indexing archived call {call_sid}: {e}")
+
+            for filename in sorted(os.listdir(logs_dir)):
+                call_sid, ext = os.path.splitext(filename)
+                # Loose records of an archived call (logged after compaction) don't change its summary
+                if ext not in ('.json', '.jsonl') or call_sid in archived:
+                    continue
+                try:
+                    call_data = read_call_log(os.path.join(logs_dir, filename))
+                    if not call_data:
+                        continue
+                    self._index_call(call_sid, call_data)
+                    indexed += 1
+                except (OSError, json.JSONDecodeError, KeyError, ValueError) as e:
+                    print(f"Error indexing {filename}: {e}")
+        return indexed
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def encode_cursor(start_time: str, call_sid: str) -> str:
+    """Encode a page position as an opaque URL-safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps([start_time, call_sid]).encode()).decode()
+
+
+def fts_query(query: str) -> str:
+    """Translate a search box query into an FTS5 MATCH expression; raises ValueError if it has no terms.
+
+    Every term is quoted, so user input can never be parsed as FTS5 syntax.
+    """
+    parts = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if word == "OR":
+            if parts and parts[-1] != "OR":
+                parts.append("OR")
+            continue
+        text = phrase if phrase else word
+        prefix = not phrase and text.endswith("*")
+        text = " ".join(re.findall(r"\w+", text))
+        if text:
+            parts.append('"' + text + '"' + ("*" if prefix else ""))
+    while parts and parts[-1] == "OR":
+        parts.pop()
+    if not parts:
+        raise ValueError("Search query has no terms")
+    return " ".join(parts)
+
+
+def decode_cursor(cursor: str):
+    """Decode a cursor produced by encode_cursor; raises ValueError if it is malformed."""
+    try:
+        start_time, call_sid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(start_time), str(call_sid)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: python -m app.call_index rebuild [--logs-dir logs]."""
+    parser = argparse.ArgumentParser(description="Maintain the call statistics index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Rebuild the index from existing log files")
+    rebuild_parser.add_argument("--logs-dir", default="logs", help="Directory containing <call_sid>.jsonl/.json logs")
+    rebuild_parser.add_argument("--db", default=None, help="Index database path (default: <logs-dir>/call_index.db)")
+    rebuild_parser.add_argument("--archive-dir", default=None, help="Transcript archive to include (default: <logs-dir>/archive)")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        index = CallIndex(args.db or os.path.join(args.logs_dir, 'call_index.db'))
+        archive_dir = args.archive_dir or os.path.join(args.logs_dir, 'archive')
+        archive = TranscriptArchive(archive_dir) if os.path.exists(os.path.join(archive_dir, 'index.db')) else None
+        count = index.rebuild(args.logs_dir, archive)
+        index.close()
+        if archive is not None:
+            archive.close()
+        print(f"Indexed {count} calls from {args.logs_dir}")
+
+
+if __name__ == "__main__":
+    main()
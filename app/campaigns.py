@@ -0,0 +1,483 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from .conversation_registry import OutboundCallError, RegistryFullError
+
+# Seconds to wait before each retry of a number, by the outcome of its previous attempt
+DEFAULT_RETRY_SCHEDULE = {"busy": [300, 900], "no-answer": [1800, 7200]}
+
+# Outcomes a retry schedule can name
+RETRYABLE_OUTCOMES = {"busy", "no-answer", "failed"}
+
+# Terminal Twilio call statuses and the attempt outcome each one means
+CALL_OUTCOMES = {"completed": "completed", "busy": "busy", "no-answer": "no-answer", "failed": "failed", "canceled": "failed"}
+
+# States a number stays in until its campaign is done with it
+OPEN_STATES = ("pending", "dialing", "live", "retrying")
+
+# Final statuses kept for calls not yet known, because their status callback beat calls.create's response
+EARLY_STATUS_LIMIT = 1000
+
+# How often to look again while live calls are at the cap and no status callback has freed a slot
+CAPACITY_POLL_SECONDS = 0.5
+
+
+class CampaignContact:
+    """One number on a campaign's dial list and how far it has got."""
+
+    def __init__(self, number: str):
+        self.number = number
+        # pending, dialing, live, retrying, then completed, failed, unreached or cancelled
+        self.state = "pending"
+        self.attempts = 0
+        self.outcomes: List[str] = []
+        self.call_sid: Optional[str] = None
+        self.next_attempt_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "number": self.number,
+            "state": self.state,
+            "attempts": self.attempts,
+            "outcomes": list(self.outcomes),
+            "call_sid": self.call_sid,
+            "next_attempt_at": datetime.fromtimestamp(self.next_attempt_at).isoformat() if self.next_attempt_at else None
+        }
+
+
+class Campaign:
+    """A dial list with its caller ID, webhook host, retry schedule and progress."""
+
+    def __init__(
+        self,
+        campaign_id: str,
+        numbers: List[str],
+        from_phone: str,
+        webhook_base_url: str,
+        name: str = "",
+        retry_schedule: Optional[Dict[str, List[float]]] = None
+    ):
+        self.id = campaign_id
+        self.name = name or campaign_id
+        self.from_phone = from_phone
+        self.webhook_base_url = webhook_base_url
+        self.retry_schedule = DEFAULT_RETRY_SCHEDULE if retry_schedule is None else retry_schedule
+        # Duplicates are dialed once
+        self.contacts = [CampaignContact(number) for number in dict.fromkeys(numbers)]
+        # running, paused, cancelled or finished
+        self.state = "running"
+        self.created_at = datetime.now().isoformat()
+        self.finished_at: Optional[str] = None
+        # Numbers that came due while paused
+        self.parked: List[CampaignContact] = []
+
+        self.dials = 0
+        self.retries = 0
+        self.first_dial: Optional[float] = None
+        self.last_dial: Optional[float] = None
+
+    def stats(self, include_contacts: bool = False) -> Dict:
+        states = Counter(contact.state for contact in self.contacts)
+        outcomes = Counter(outcome for contact in self.contacts for outcome in contact.outcomes)
+        done = sum(count for state, count in states.items() if state not in OPEN_STATES)
+        dial_seconds = (self.last_dial - self.first_dial) if self.dials > 1 else 0
+        stats = {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "from_phone": self.from_phone,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "numbers": len(self.contacts),
+            "done": done,
+            "progress": round(done / len(self.contacts), 3) if self.contacts else 1.0,
+            "states": {state: states.get(state, 0) for state in (*OPEN_STATES, "completed", "failed", "unreached", "cancelled")},
+            "outcomes": dict(outcomes),
+            "dials": self.dials,
+            "retries": self.retries,
+            "dials_per_second": round((self.dials - 1) / dial_seconds, 2) if dial_seconds else 0.0
+        }
+        if include_contacts:
+            stats["contacts"] = [contact.to_dict() for contact in self.contacts]
+        return stats
+
+
+class CampaignEngine:
+    """Dials campaign lists through the agent's shared Twilio client, paced and capped.
+
+    One dispatcher thread takes numbers in the order they come due, spaces
+    dials calls_per_second apart across every campaign (Twilio's limit is
+    per account), and holds off while the agent's live conversations plus
+    dials in flight are at max_live_calls. The API requests run on a small
+    thread pool, so a slow response does not stall the pacing. Outcomes come
+    from the call status callback (record_status); busy and no-answer are
+    retried on the campaign's schedule.
+
+    Campaigns are kept in this process, so their calls' status callbacks
+    must reach the worker that dials them.
+    """
+
+    def __init__(
+        self,
+        agent,
+        calls_per_second: float = 1.0,
+        max_live_calls: int = 50,
+        dial_workers: int = 8,
+        keep_finished: int = 100,
+        on_dial: Optional[Callable[[str, str, Campaign], None]] = None
+    ):
+        if calls_per_second <= 0:
+            raise ValueError("calls_per_second must be positive")
+        self.agent = agent
+        self.calls_per_second = calls_per_second
+        self.max_live_calls = max_live_calls
+        self.dial_workers = dial_workers
+        self.keep_finished = keep_finished
+        self.on_dial = on_dial
+
+        self._cond = threading.Condition()
+        self._campaigns: Dict[str, Campaign] = {}
+        # Finished and cancelled campaigns in the order they ended; the dispatcher forgets all but keep_finished
+        self._ended: "OrderedDict[str, Campaign]" = OrderedDict()
+        # (due, sequence, campaign, contact), on the monotonic clock
+        self._queue: List = []
+        self._sequence = itertools.count()
+        # call_sid -> (campaign, contact) for calls waiting on their final status
+        self._calls: Dict[str, tuple] = {}
+        # call_sid -> final status that arrived while its dial was still in flight
+        self._early_statuses: "OrderedDict[str, str]" = OrderedDict()
+        self._dialing = 0
+        self._next_dial_at = 0.0
+        self._stalled = False
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.dials = 0
+        self.dial_errors = 0
+        self.early_statuses = 0
+        self.lost_calls = 0
+        self.capacity_stalls = 0
+        self.max_live_seen = 0
+        self.pruned_campaigns = 0
+
+    @classmethod
+    def from_env(cls, agent, **kwargs) -> "CampaignEngine":
+        """Build an engine configured by CAMPAIGN_CALLS_PER_SECOND, CAMPAIGN_MAX_LIVE_CALLS, CAMPAIGN_DIAL_WORKERS and CAMPAIGN_KEEP_FINISHED."""
+        return cls(
+            agent,
+            calls_per_second=float(os.getenv("CAMPAIGN_CALLS_PER_SECOND", 1)),
+            max_live_calls=int(os.getenv("CAMPAIGN_MAX_LIVE_CALLS", 50)),
+            dial_workers=int(os.getenv("CAMPAIGN_DIAL_WORKERS", 8)),
+            keep_finished=int(os.getenv("CAMPAIGN_KEEP_FINISHED", 100)),
+            **kwargs
+        )
+
+    # Lifecycle
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.dial_workers, thread_name_prefix="campaign-dial")
+            self._thread = threading.Thread(target=self._run, name="campaign-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop dialing; calls already placed are left to finish."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # Campaigns
+
+    def create(
+        self,
+        numbers: List[str],
+        from_phone: str,
+        webhook_base_url: str,
+        name: str = "",
+        retry_schedule: Optional[Dict[str, List[float]]] = None
+    ) -> Campaign:
+        """Queue a dial list; its numbers are dialed as the pace and the live call cap allow."""
+        if retry_schedule is not None:
+            unknown = set(retry_schedule) - RETRYABLE_OUTCOMES
+            if unknown:
+                raise ValueError(f"Retry schedule outcomes must be among {', '.join(sorted(RETRYABLE_OUTCOMES))}")
+            if any(not isinstance(delay, (int, float)) or delay < 0 for delays in retry_schedule.values() for delay in delays):
+                raise ValueError("Retry delays must be non-negative numbers of seconds")
+        campaign = Campaign(uuid.uuid4().hex[:12], numbers, from_phone, webhook_base_url, name, retry_schedule)
+        now = time.monotonic()
+        with self._cond:
+            self._campaigns[campaign.id] = campaign
+            for contact in campaign.contacts:
+                self._push(now, campaign, contact)
+            self._check_finished(campaign)
+            self._cond.notify_all()
+        return campaign
+
+    def get(self, campaign_id: str) -> Optional[Campaign]:
+        with self._cond:
+            return self._campaigns.get(campaign_id)
+
+    def list_campaigns(self) -> List[Campaign]:
+        with self._cond:
+            return list(self._campaigns.values())
+
+    def pause(self, campaign_id: str) -> Optional[Campaign]:
+        """Stop dialing a campaign's numbers; calls in progress carry on."""
+        with self._cond:
+            campaign = self._campaigns.get(campaign_id)
+            if campaign is not None and campaign.state == "running":
+                campaign.state = "paused"
+            return campaign
+
+    def resume(self, campaign_id: str) -> Optional[Campaign]:
+        with self._cond:
+            campaign = self._campaigns.get(campaign_id)
+            if campaign is not None and campaign.state == "paused":
+                campaign.state = "running"
+                now = time.monotonic()
+                for contact in campaign.parked:
+                    self._push(now, campaign, contact)
+                campaign.parked = []
+                self._cond.notify_all()
+            return campaign
+
+    def cancel(self, campaign_id: str) -> Optional[Campaign]:
+        """Drop a campaign's numbers that have not been dialed yet; calls in progress carry on."""
+        with self._cond:
+            campaign = self._campaigns.get(campaign_id)
+            if campaign is not None and campaign.state in ("running", "paused"):
+                campaign.state = "cancelled"
+                campaign.parked = []
+                for contact in campaign.contacts:
+                    if contact.state in ("pending", "retrying"):
+                        contact.state = "cancelled"
+                        contact.next_attempt_at = None
+                self._check_finished(campaign)
+            return campaign
+
+    def record_status(self, call_sid: str, status: str) -> bool:
+        """Apply a call status callback; returns whether the call belongs to a campaign."""
+        with self._cond:
+            entry = self._calls.get(call_sid)
+            if entry is None:
+                # Possibly one of the dials in flight; _dial applies it once it knows the call_sid
+                if self._dialing and status in CALL_OUTCOMES:
+                    self._early_statuses[call_sid] = status
+                    while len(self._early_statuses) > EARLY_STATUS_LIMIT:
+                        self._early_statuses.popitem(last=False)
+                return False
+            outcome = CALL_OUTCOMES.get(status)
+            if outcome is not None:
+                del self._calls[call_sid]
+                campaign, contact = entry
+                self._finish_attempt(campaign, contact, outcome)
+                # A live call has ended, so there may be room for the next dial
+                self._cond.notify_all()
+            return True
+
+    def abandon(self, call_sid: str, reason: str) -> bool:
+        """Give up on a campaign call whose final status will not arrive, e.g. one the registry reaped."""
+        with self._cond:
+            entry = self._calls.pop(call_sid, None)
+            if entry is None:
+                return False
+            print(f"Giving up on campaign call {call_sid} ({reason})")
+            self.lost_calls += 1
+            self._finish_attempt(*entry, "lost")
+            self._cond.notify_all()
+            return True
+
+    # Dispatching
+
+    def live_calls(self) -> int:
+        """Conversations held by the agent plus dials whose API request has not returned yet."""
+        return len(self.agent.active_conversations) + self._dialing
+
+    def _push(self, due: float, campaign: Campaign, contact: CampaignContact):
+        """Queue a number to be dialed at due. Caller must hold the lock."""
+        heapq.heappush(self._queue, (due, next(self._sequence), campaign, contact))
+
+    def _next_contact(self):
+        """Wait until a number is due, the pace allows a dial and a live call slot is free. Caller must hold the lock."""
+        while not self._stopping:
+            self._prune()
+            now = time.monotonic()
+            if not self._queue:
+                self._cond.wait()
+                continue
+            due = max(self._queue[0][0], self._next_dial_at)
+            if due > now:
+                self._cond.wait(due - now)
+                continue
+            live = self.live_calls()
+            self.max_live_seen = max(self.max_live_seen, live)
+            if live >= self.max_live_calls:
+                if not self._stalled:
+                    self._stalled = True
+                    self.capacity_stalls += 1
+                self._cond.wait(CAPACITY_POLL_SECONDS)
+                continue
+            self._stalled = False
+
+            _, _, campaign, contact = heapq.heappop(self._queue)
+            if campaign.state == "paused":
+                campaign.parked.append(contact)
+                continue
+            if contact.state not in ("pending", "retrying"):
+                # Cancelled while queued
+                continue
+            # Keep the pace from now, without making up for idle time with a burst
+            self._next_dial_at = max(self._next_dial_at, now) + 1 / self.calls_per_second
+            return campaign, contact
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                picked = self._next_contact()
+                if picked is None:
+                    return
+                campaign, contact = picked
+                contact.state = "dialing"
+                contact.attempts += 1
+                contact.next_attempt_at = None
+                self._dialing += 1
+                campaign.dials += 1
+                campaign.last_dial = time.monotonic()
+                if campaign.first_dial is None:
+                    campaign.first_dial = campaign.last_dial
+            try:
+                self._executor.submit(self._dial, campaign, contact)
+            except RuntimeError:
+                # The executor was shut down by stop()
+                return
+
+    def _dial(self, campaign: Campaign, contact: CampaignContact):
+        """Place one call through the agent, on a dial worker thread."""
+        try:
+            conversation = self.agent.make_outbound_call(
+                contact.number, campaign.from_phone, campaign.webhook_base_url, {"campaign_id": campaign.id}
+            )
+        except RegistryFullError:
+            # Raised before dialing, so nothing was placed: dial it again once a live call ends
+            with self._cond:
+                self._dialing -= 1
+                contact.attempts -= 1
+                campaign.dials -= 1
+                contact.state = "pending"
+                self._push(time.monotonic() + CAPACITY_POLL_SECONDS, campaign, contact)
+                self._cond.notify_all()
+            return
+        except OutboundCallError as e:
+            # The call is live, so it is never dialed again; its status callback settles the attempt
+            print(f"Error dialing {contact.number} for campaign {campaign.id}: {e}")
+            with self._cond:
+                self.dial_errors += 1
+            call_sid = e.call_sid
+        except Exception as e:
+            print(f"Error dialing {contact.number} for campaign {campaign.id}: {e}")
+            with self._cond:
+                self._dialing -= 1
+                self.dial_errors += 1
+                self._finish_attempt(campaign, contact, "failed")
+                self._cond.notify_all()
+            return
+        else:
+            call_sid = conversation.call_sid
+
+        with self._cond:
+            self._dialing -= 1
+            self.dials += 1
+            early_status = self._early_statuses.pop(call_sid, None)
+            if early_status is None:
+                contact.call_sid = call_sid
+                contact.state = "live"
+                self._calls[call_sid] = (campaign, contact)
+            else:
+                self.early_statuses += 1
+                self._finish_attempt(campaign, contact, CALL_OUTCOMES[early_status])
+                self._cond.notify_all()
+        if early_status is not None:
+            # The status callback already ended the call (before this conversation existed)
+            self.agent.end_conversation(call_sid)
+            return
+        if self.on_dial:
+            try:
+                self.on_dial(call_sid, contact.number, campaign)
+            except Exception as e:
+                print(f"Error recording campaign call {call_sid}: {e}")
+
+    def _finish_attempt(self, campaign: Campaign, contact: CampaignContact, outcome: str):
+        """Record an attempt's outcome and retry the number or settle it. Caller must hold the lock."""
+        contact.outcomes.append(outcome)
+        contact.call_sid = None
+        schedule = campaign.retry_schedule.get(outcome, [])
+        # The nth busy (or no-answer) waits for the nth delay of its schedule
+        retry = contact.outcomes.count(outcome) - 1
+        if outcome != "completed" and retry < len(schedule) and campaign.state in ("running", "paused"):
+            delay = schedule[retry]
+            contact.state = "retrying"
+            contact.next_attempt_at = time.time() + delay
+            campaign.retries += 1
+            self._push(time.monotonic() + delay, campaign, contact)
+        elif outcome == "completed":
+            contact.state = "completed"
+        elif outcome in campaign.retry_schedule:
+            contact.state = "unreached"
+        else:
+            contact.state = "failed"
+        self._check_finished(campaign)
+
+    def _check_finished(self, campaign: Campaign):
+        """Mark a campaign finished once none of its numbers is open. Caller must hold the lock."""
+        if campaign.state in ("running", "cancelled") and campaign.finished_at is None:
+            if not any(contact.state in OPEN_STATES for contact in campaign.contacts):
+                campaign.finished_at = datetime.now().isoformat()
+                if campaign.state == "running":
+                    campaign.state = "finished"
+                self._ended[campaign.id] = campaign
+                # Wake the dispatcher to prune
+                self._cond.notify_all()
+
+    def _prune(self):
+        """Forget the campaigns that ended longest ago, beyond keep_finished. Caller must hold the lock."""
+        while len(self._ended) > self.keep_finished:
+            campaign_id, _ = self._ended.popitem(last=False)
+            self._campaigns.pop(campaign_id, None)
+            self.pruned_campaigns += 1
+
+    def stats(self) -> Dict:
+        with self._cond:
+            states = Counter(campaign.state for campaign in self._campaigns.values())
+            return {
+                "calls_per_second": self.calls_per_second,
+                "max_live_calls": self.max_live_calls,
+                "live_calls": self.live_calls(),
+                "max_live_seen": self.max_live_seen,
+                "dialing": self._dialing,
+                "queued": len(self._queue),
+                "awaiting_status": len(self._calls),
+                "dials": self.dials,
+                "dial_errors": self.dial_errors,
+                "early_statuses": self.early_statuses,
+                "lost_calls": self.lost_calls,
+                "capacity_stalls": self.capacity_stalls,
+                "pruned_campaigns": self.pruned_campaigns,
+                "campaigns": {state: states.get(state, 0) for state in ("running", "paused", "cancelled", "finished")}
+            }
@@ -0,0 +1,129 @@
+import math
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Rough per-message cost of the chat template (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text offline (about four characters per token)."""
+    if not text:
+        return 0
+    return max(1, math.ceil(len(text) / 4))
+
+
+def message_tokens(message: Dict) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def extractive_summary(previous_summary: str, dropped: List[Dict], max_tokens: int) -> str:
+    """Fold dropped messages into the rolling summary, keeping the first sentence of each.
+
+    The oldest summary lines are discarded once the summary exceeds max_tokens.
+    """
+    lines = [line for line in previous_summary.split("\n") if line]
+    for message in dropped:
+        first_sentence = re.split(r'(?<=[.!?])\s', message["content"].strip(), maxsplit=1)[0]
+        speaker = "Customer" if message["role"] == "user" else "Agent"
+        lines.append(f"{speaker}: {first_sentence[:160]}")
+
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def cut_off(spoken: str) -> str:
+    """Mark text as interrupted; the trailing ellipsis tells the model its reply was cut off."""
+    spoken = spoken.strip().rstrip(" .,;:")
+    return f"{spoken}..." if spoken else ""
+
+
+class ConversationContext:
+    """Bounded prompt history: recent turns verbatim, older turns in a rolling summary."""
+
+    def __init__(
+        self,
+        token_budget: int = 1024,
+        keep_turns: int = 6,
+        summary_tokens: int = 200,
+        summarizer: Optional[Callable[[str, List[Dict], int], str]] = None
+    ):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or extractive_summary
+        self.messages: List[Dict] = []
+        self.summary = ""
+        self.prompt_token_counts: List[int] = []
+
+    def add(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+
+    def _summary_message(self) -> Optional[Dict]:
+        if not self.summary:
+            return None
+        return {"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}
+
+    def _prompt_tokens(self, system_message: Dict) -> int:
+        total = message_tokens(system_message) + sum(message_tokens(m) for m in self.messages)
+        summary_message = self._summary_message()
+        if summary_message:
+            total += message_tokens(summary_message)
+        return total
+
+    def _compact(self, system_message: Dict):
+        """Move the oldest messages into the summary until the prompt fits the budget."""
+        while len(self.messages) > 1 and (
+            len(self.messages) > self.keep_turns * 2
+            or self._prompt_tokens(system_message) > self.token_budget
+        ):
+            dropped = [self.messages.pop(0)]
+            # Never leave an assistant reply at the head of the window without its question
+            if len(self.messages) > 1 and self.messages[0]["role"] == "assistant":
+                dropped.append(self.messages.pop(0))
+            self.summary = self.summarizer(self.summary, dropped, self.summary_tokens)
+
+    def build_messages(self, system_prompt: str) -> List[Dict]:
+        """Return the prompt for the next completion and record its token count."""
+        system_message = {"role": "system", "content": system_prompt}
+        self._compact(system_message)
+
+        messages = [system_message]
+        summary_message = self._summary_message()
+        if summary_message:
+            messages.append(summary_message)
+        messages.extend(self.messages)
+
+        self.prompt_token_counts.append(sum(message_tokens(m) for m in messages))
+        return messages
+
+    def snapshot(self) -> Tuple:
+        """Capture the history so a cancelled turn can be undone with restore()."""
+        return list(self.messages), self.summary, len(self.prompt_token_counts)
+
+    def restore(self, snapshot: Tuple):
+        self.messages = list(snapshot[0])
+        self.summary = snapshot[1]
+        del self.prompt_token_counts[snapshot[2]:]
+
+    def replace_last(self, role: str, content: str):
+        """Rewrite the most recent message from role, e.g. to amend a transcript."""
+        for message in reversed(self.messages):
+            if message["role"] == role:
+                message["content"] = content
+                return
+
+    def truncate_reply(self, spoken: str):
+        """Cut the latest assistant message down to the part that was spoken, or drop it if none was."""
+        if not self.messages or self.messages[-1]["role"] != "assistant":
+            return
+        if spoken.strip():
+            self.messages[-1]["content"] = cut_off(spoken)
+        else:
+            self.messages.pop()
+
+    def reset(self):
+        self.messages = []
+        self.summary = ""
+        self.prompt_token_counts = []
@@ -1,8 +1,13 @@
 
-import json
+import atexit
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
+from .call_index import CallIndex
+from .event_bus import events
+from .metrics import stage_metrics
+from .transcript_archive import TranscriptArchive
+from .transcript_writer import TranscriptWriter, read_call_log, read_records, replay_records
 
 class ConversationLogger:
     def __init__(self):
@@ -10,6 +15,26 @@ class ConversationLogger:
         # Ensure logs directory exists
         if not os.path.exists('logs'):
             os.makedirs('logs')
+        # Aggregate index used by the dashboard instead of re-reading every log
+        self.index = CallIndex(os.path.join('logs', 'call_index.db'))
+        # In archive mode, finished calls move from logs/<call_sid>.jsonl into compressed daily segments
+        self.archive: Optional[TranscriptArchive] = None
+        if os.getenv("TRANSCRIPT_ARCHIVE", "0") == "1":
+            self.archive = TranscriptArchive(
+                os.getenv("TRANSCRIPT_ARCHIVE_DIR", os.path.join('logs', 'archive')),
+                max_segment_bytes=int(os.getenv("TRANSCRIPT_ARCHIVE_SEGMENT_MB", 64)) * 1024 * 1024
+            )
+        # Records are appended to logs/<call_sid>.jsonl by a background writer
+        self.writer = TranscriptWriter(
+            'logs',
+            flush_interval=int(os.getenv("TRANSCRIPT_FLUSH_MS", 200)) / 1000,
+            max_batch=int(os.getenv("TRANSCRIPT_BATCH_SIZE", 256)),
+            durability=os.getenv("TRANSCRIPT_DURABILITY", "async"),
+            on_call_end=self._archive_call if self.archive else None,
+            # Timed where the file is written, not where the record is queued
+            on_write=lambda call_sid, seconds: stage_metrics.record(call_sid, "disk_write", seconds)
+        )
+        atexit.register(self.close)
         
     def log_call_start(self, call_sid: str, number: str):
         """Log the start of a new call."""
@@ -18,11 +43,22 @@ class ConversationLogger:
             "customer_number": number,
             "transcript": []
         }
-        # Save immediately to capture the call even if the server crashes
-        self._save_to_file(call_sid)
+        # Queue immediately to capture the call even if the server crashes
+        self.writer.append(call_sid, {
+            "type": "start",
+            "start_time": self.conversations[call_sid]["start_time"],
+            "customer_number": number
+        })
+        self.index.record_start(call_sid, number, self.conversations[call_sid]["start_time"])
+        events.publish(
+            "call_start",
+            call_sid=call_sid,
+            number=number,
+            start_time=self.conversations[call_sid]["start_time"]
+        )
         
-    def log_interaction(self, call_sid: str, user_input: str, ai_response: str):
-        """Log a single interaction between the user and the AI agent."""
+    def log_interaction(self, call_sid: str, user_input: str, ai_response: str, timings: Optional[Dict[str, float]] = None):
+        """Log a single interaction between the user and the AI agent, with the turn's stage timings if given."""
         if call_sid not in self.conversations:
             # If the call wasn't properly started, initialize it now
             self.conversations[call_sid] = {
@@ -30,16 +66,27 @@ class ConversationLogger:
                 "customer_number": "unknown",
                 "transcript": []
             }
+            self.index.record_start(call_sid, "unknown", self.conversations[call_sid]["start_time"])
+            events.publish(
+                "call_start",
+                call_sid=call_sid,
+                number="unknown",
+                start_time=self.conversations[call_sid]["start_time"]
+            )
             
         entry = {
             "timestamp": datetime.now().isoformat(),
             "user": user_input,
             "agent": ai_response
         }
+        if timings:
+            entry["timings"] = {stage: round(seconds, 4) for stage, seconds in timings.items()}
         self.conversations[call_sid]["transcript"].append(entry)
         
-        # Save after each interaction to preserve data
-        self._save_to_file(call_sid)
+        # Queue after each interaction to preserve data; the writer records the disk_write stage
+        self.writer.append(call_sid, {"type": "turn", **entry})
+        self.index.record_turn(call_sid, entry["timestamp"], user_input, ai_response)
+        events.publish("call_turn", call_sid=call_sid, **entry)
         
     def log_call_end(self, call_sid: str, status: str):
         """Log the end of a call with its final status."""
@@ -53,60 +100,91 @@ class ConversationLogger:
             
         self.conversations[call_sid]["end_time"] = datetime.now().isoformat()
         self.conversations[call_sid]["status"] = status
-        self._save_to_file(call_sid)
+        self.writer.append(call_sid, {
+            "type": "end",
+            "end_time": self.conversations[call_sid]["end_time"],
+            "status": status
+        })
+        # Commit the finished call promptly without waiting on the disk here
+        self.writer.flush(wait=False)
+        self.index.record_end(
+            call_sid,
+            self.conversations[call_sid]["start_time"],
+            self.conversations[call_sid]["end_time"],
+            status,
+            self.conversations[call_sid]["customer_number"]
+        )
+        start_time = datetime.fromisoformat(self.conversations[call_sid]["start_time"])
+        end_time = datetime.fromisoformat(self.conversations[call_sid]["end_time"])
+        events.publish(
+            "call_end",
+            call_sid=call_sid,
+            number=self.conversations[call_sid]["customer_number"],
+            start_time=self.conversations[call_sid]["start_time"],
+            end_time=self.conversations[call_sid]["end_time"],
+            status=status,
+            duration_seconds=(end_time - start_time).total_seconds()
+        )
         
         # Remove from memory after saving
         if call_sid in self.conversations:
             del self.conversations[call_sid]
         
-    def _save_to_file(self, call_sid: str):
-        """Save the conversation to a JSON file."""
-        filename = f"logs/{call_sid}.json"
-        try:
-            with open(filename, "w") as f:
-                json.dump(self.conversations[call_sid], f, indent=2)
-        except Exception as e:
-            print(f"Error saving conversation log for {call_sid}: {e}")
-            
+    def _archive_call(self, call_sid: str):
+        """Compact a finished call's log files into the archive (runs on the writer thread)."""
+        self.archive.compact(call_sid, [f"logs/{call_sid}.json", self.writer.path(call_sid)])
+        
+    def close(self):
+        """Flush queued log records to disk, e.g. on shutdown."""
+        self.writer.close()
+        if self.archive is not None:
+            self.archive.close()
+        
     def get_transcript(self, call_sid: str) -> Optional[Dict]:
         """Get the transcript for a specific call."""
         # First check if it's in memory
         if call_sid in self.conversations:
             return self.conversations[call_sid]
             
-        # If not in memory, try to load from file
-        filename = f"logs/{call_sid}.json"
-        if os.path.exists(filename):
+        # Archived calls can still have records that arrived after compaction in a loose file
+        archived = None
+        if self.archive is not None:
+            try:
+                archived = self.archive.read(call_sid)
+            except Exception as e:
+                print(f"Error loading archived transcript for {call_sid}: {e}")
+        if archived:
+            loose = f"logs/{call_sid}.jsonl"
             try:
-                with open(filename, "r") as f:
-                    return json.load(f)
+                return replay_records(archived + (read_records(loose) if os.path.exists(loose) else []))
             except Exception as e:
                 print(f"Error loading transcript for {call_sid}: {e}")
+                return replay_records(archived)
+            
+        # If not in memory, try to load from file (JSONL records, or a legacy JSON log)
+        for filename in (f"logs/{call_sid}.jsonl", f"logs/{call_sid}.json"):
+            if os.path.exists(filename):
+                try:
+                    return read_call_log(filename)
+                except Exception as e:
+                    print(f"Error loading transcript for {call_sid}: {e}")
                 
         return None
         
-    def get_all_calls(self, limit: int = 100) -> List[Dict]:
-        """Get details for all calls, sorted by start time (newest first)."""
-        calls = []
+    def list_calls(self, limit: int = 20, cursor: Optional[str] = None, **filters) -> Dict:
+        """Get one page of call summaries from the index (see CallIndex.list_calls)."""
+        return self.index.list_calls(limit=limit, cursor=cursor, **filters)
         
-        # Get calls from log files
-        if os.path.exists('logs'):
-            for filename in os.listdir('logs'):
-                if filename.endswith('.json'):
-                    try:
-                        call_sid = filename.replace('.json', '')
-                        call_data = self.get_transcript(call_sid)
-                        
-                        if call_data:
-                            # Add call_sid to the data
-                            call_data['call_sid'] = call_sid
-                            calls.append(call_data)
-                    except Exception as e:
-                        print(f"Error processing log file {filename}: {e}")
+    def get_all_calls(self, limit: int = 100, cursor: Optional[str] = None, **filters) -> List[Dict]:
+        """Get details for calls, sorted by start time (newest first)."""
+        calls = []
         
-        # Sort by start time (newest first)
-        calls.sort(key=lambda x: x.get('start_time', ''), reverse=True)
+        # The index picks the page; only those calls' logs are loaded
+        for summary in self.list_calls(limit=limit, cursor=cursor, **filters)['calls']:
+            call_data = self.get_transcript(summary['call_sid'])
+            if call_data:
+                # Add call_sid to the data
+                call_data = dict(call_data, call_sid=summary['call_sid'])
+                calls.append(call_data)
         
-        # Return only the requested number
-        return calls[:limit]
-
+        return calls
@@ -0,0 +1,211 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+OVERFLOW_POLICIES = ("evict_oldest", "reject")
+
+
+class RegistryFullError(Exception):
+    """Raised when the registry is at capacity and its overflow policy is 'reject'."""
+
+
+class OutboundCallError(Exception):
+    """Raised when a call was placed but its conversation could not be set up."""
+
+    def __init__(self, call_sid: str, message: str):
+        super().__init__(message)
+        self.call_sid = call_sid
+
+
+class ConversationRegistry:
+    """Live conversations keyed by call SID, with idle reaping and a hard size cap.
+
+    Behaves like the dict it replaces. Entries are ordered by last activity so
+    both TTL reaping and oldest-first eviction only look at the head.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 600,
+        max_live: int = 500,
+        overflow_policy: str = "evict_oldest",
+        reap_interval: float = 30,
+        on_evict: Optional[Callable[[str, object, str], None]] = None
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {', '.join(OVERFLOW_POLICIES)}")
+
+        self.ttl_seconds = ttl_seconds
+        self.max_live = max_live
+        self.overflow_policy = overflow_policy
+        self.reap_interval = reap_interval
+        self.on_evict = on_evict
+
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, Tuple[object, float]]" = OrderedDict()
+        # Slots held for conversations that don't exist yet, e.g. calls being dialed
+        self._reserved = 0
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+        self.removed = 0
+        self.evicted = 0
+        self.leaked = 0
+        self.rejected = 0
+
+    # Dict interface
+
+    def __contains__(self, call_sid) -> bool:
+        with self._lock:
+            return call_sid in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __getitem__(self, call_sid):
+        conversation = self.get(call_sid)
+        if conversation is None:
+            raise KeyError(call_sid)
+        return conversation
+
+    def __setitem__(self, call_sid, conversation):
+        self.add(call_sid, conversation)
+
+    def __delitem__(self, call_sid):
+        if self.pop(call_sid) is None:
+            raise KeyError(call_sid)
+
+    def get(self, call_sid, default=None):
+        """Return a conversation and mark it as active."""
+        with self._lock:
+            entry = self._entries.get(call_sid)
+            if entry is None:
+                return default
+            self._entries[call_sid] = (entry[0], time.monotonic())
+            self._entries.move_to_end(call_sid)
+            return entry[0]
+
+    def touch(self, call_sid) -> bool:
+        """Mark a conversation as active without fetching it; returns False if it is gone."""
+        return self.get(call_sid) is not None
+
+    def pop(self, call_sid, default=None):
+        """Remove a conversation that ended normally."""
+        with self._lock:
+            entry = self._entries.pop(call_sid, None)
+            if entry is None:
+                return default
+            self.removed += 1
+            return entry[0]
+
+    def items(self) -> List[Tuple[str, object]]:
+        with self._lock:
+            return [(call_sid, entry[0]) for call_sid, entry in self._entries.items()]
+
+    # Capacity and eviction
+
+    def check_capacity(self):
+        """Raise RegistryFullError if a new conversation would be rejected."""
+        with self._lock:
+            if self.overflow_policy == "reject" and len(self._entries) + self._reserved >= self.max_live:
+                self.rejected += 1
+                raise RegistryFullError(f"Too many live conversations ({self.max_live})")
+
+    def reserve(self):
+        """Hold a slot for a conversation that will exist shortly; add(reserved=True) fills it, release() gives it back."""
+        with self._lock:
+            self.check_capacity()
+            self._reserved += 1
+
+    def release(self):
+        """Give back a slot taken with reserve()."""
+        with self._lock:
+            self._reserved = max(0, self._reserved - 1)
+
+    def add(self, call_sid, conversation, reserved: bool = False):
+        """Register a conversation, applying the overflow policy when at capacity.
+
+        With reserved, the conversation takes the slot held by an earlier reserve() and is never rejected.
+        """
+        evicted = []
+        with self._lock:
+            if reserved:
+                self.release()
+            if call_sid not in self._entries:
+                if not reserved:
+                    self.check_capacity()
+                while self._entries and len(self._entries) + self._reserved >= self.max_live:
+                    oldest_sid, (oldest, _) = self._entries.popitem(last=False)
+                    self.evicted += 1
+                    evicted.append((oldest_sid, oldest, "evicted"))
+            self._entries[call_sid] = (conversation, time.monotonic())
+            self._entries.move_to_end(call_sid)
+
+        for entry in evicted:
+            self._release(*entry)
+
+    def reap(self) -> int:
+        """Evict conversations idle for longer than the TTL; returns how many were reaped."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = []
+        with self._lock:
+            while self._entries:
+                call_sid, (conversation, last_active) = next(iter(self._entries.items()))
+                if last_active > cutoff:
+                    break
+                del self._entries[call_sid]
+                # No terminal status callback ever arrived for these calls
+                self.leaked += 1
+                expired.append((call_sid, conversation, "expired"))
+
+        for entry in expired:
+            self._release(*entry)
+        return len(expired)
+
+    def _release(self, call_sid, conversation, reason):
+        """Free an evicted conversation's resources and notify the owner."""
+        try:
+            conversation.terminate()
+            if self.on_evict:
+                self.on_evict(call_sid, conversation, reason)
+        except Exception as e:
+            print(f"Error releasing conversation {call_sid}: {e}")
+
+    # Background reaper
+
+    def start_reaper(self):
+        """Start the background thread that reaps idle conversations."""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stop.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, name="conversation-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join(timeout=5)
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            reaped = self.reap()
+            if reaped:
+                print(f"Reaped {reaped} idle conversations")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "live": len(self._entries),
+                "max_live": self.max_live,
+                "reserved": self._reserved,
+                "removed": self.removed,
+                "evicted": self.evicted,
+                "leaked": self.leaked,
+                "rejected": self.rejected
+            }
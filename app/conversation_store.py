@@ -0,0 +1,292 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+# Serialized states at least this large are zlib-compressed
+COMPRESS_MIN_BYTES = 512
+
+# Roles are stored as one letter
+ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+CODE_ROLES = {code: role for role, code in ROLE_CODES.items()}
+
+
+class VersionConflictError(Exception):
+    """Raised when a conversation was saved by someone else since it was loaded."""
+
+
+class ConversationState:
+    """Everything needed to continue a call on another worker: history, summary and call metadata.
+
+    version is the store version the state was loaded at (0 for a call the
+    store has never seen); saving succeeds only if it is still current.
+    """
+
+    def __init__(
+        self,
+        call_sid: str,
+        messages: Optional[List[Dict]] = None,
+        summary: str = "",
+        metadata: Optional[Dict] = None,
+        version: int = 0,
+        updated_at: Optional[float] = None
+    ):
+        self.call_sid = call_sid
+        self.messages = messages if messages is not None else []
+        self.summary = summary
+        self.metadata = metadata if metadata is not None else {}
+        self.version = version
+        self.updated_at = updated_at if updated_at is not None else time.time()
+
+
+def encode_state(state: ConversationState) -> bytes:
+    """Serialize a state compactly: short keys, one-letter roles, and zlib above COMPRESS_MIN_BYTES."""
+    payload = json.dumps({
+        "m": [[ROLE_CODES.get(message["role"], message["role"]), message["content"]] for message in state.messages],
+        "s": state.summary,
+        "d": state.metadata,
+        "t": round(state.updated_at, 3)
+    }, separators=(',', ':'), ensure_ascii=False).encode()
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(payload)
+    return b"j" + payload
+
+
+def decode_state(call_sid: str, data: bytes, version: int) -> ConversationState:
+    payload = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    fields = json.loads(payload)
+    return ConversationState(
+        call_sid,
+        messages=[{"role": CODE_ROLES.get(role, role), "content": content} for role, content in fields["m"]],
+        summary=fields["s"],
+        metadata=fields["d"],
+        version=version,
+        updated_at=fields["t"]
+    )
+
+
+class ConversationStore(ABC):
+    """Versioned store of conversation states, shared by every worker that can receive a call's webhooks.
+
+    Subclasses implement _read, _write and delete. _write must store the
+    data only if the stored version still equals expected (0: absent).
+    """
+
+    # Whether other processes can see the states, so workers need to refresh from it
+    shared = False
+
+    def __init__(self, ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self.loads = 0
+        self.saves = 0
+        self.conflicts = 0
+        self.bytes_written = 0
+
+    def load(self, call_sid: str) -> Optional[ConversationState]:
+        """Return the call's latest state, or None if it has none (or it expired)."""
+        self.loads += 1
+        found = self._read(call_sid)
+        if found is None:
+            return None
+        data, version = found
+        return decode_state(call_sid, data, version)
+
+    def save(self, state: ConversationState) -> ConversationState:
+        """Store state as the next version; raises VersionConflictError if state.version is stale."""
+        saved = ConversationState(state.call_sid, state.messages, state.summary, state.metadata, state.version + 1)
+        data = encode_state(saved)
+        if not self._write(state.call_sid, data, state.version):
+            self.conflicts += 1
+            raise VersionConflictError(f"Conversation {state.call_sid} changed since version {state.version}")
+        self.saves += 1
+        self.bytes_written += len(data)
+        return saved
+
+    @abstractmethod
+    def delete(self, call_sid: str):
+        """Forget a call's state."""
+
+    @abstractmethod
+    def _read(self, call_sid: str):
+        """Return (data, version) for a live state, or None."""
+
+    @abstractmethod
+    def _write(self, call_sid: str, data: bytes, expected: int) -> bool:
+        """Store data as version expected + 1 if the stored version is still expected."""
+
+    def stats(self) -> Dict:
+        return {
+            "backend": type(self).__name__,
+            "loads": self.loads,
+            "saves": self.saves,
+            "conflicts": self.conflicts,
+            "avg_state_bytes": round(self.bytes_written / self.saves) if self.saves else 0
+        }
+
+
+class MemoryConversationStore(ConversationStore):
+    """States kept in this process; the default for a single worker, and a stand-in for tests."""
+
+    def __init__(self, ttl_seconds: float = 3600):
+        super().__init__(ttl_seconds)
+        self._lock = threading.Lock()
+        # call_sid -> (data, version, expires_at)
+        self._states: Dict[str, tuple] = {}
+        self._writes = 0
+
+    def _read(self, call_sid: str):
+        with self._lock:
+            entry = self._states.get(call_sid)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._states[call_sid]
+                return None
+            return entry[0], entry[1]
+
+    def _write(self, call_sid: str, data: bytes, expected: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._states.get(call_sid)
+            current = entry[1] if entry is not None and entry[2] >= now else 0
+            if current != expected:
+                return False
+            self._states[call_sid] = (data, expected + 1, now + self.ttl_seconds)
+            # Calls that never ended normally are not read or deleted again, so sweep them out
+            self._writes += 1
+            if self._writes % 100 == 0:
+                for expired in [sid for sid, (_, _, expires_at) in self._states.items() if expires_at < now]:
+                    del self._states[expired]
+            return True
+
+    def delete(self, call_sid: str):
+        with self._lock:
+            self._states.pop(call_sid, None)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """States in an SQLite database, shared by every worker on the host."""
+
+    shared = True
+
+    def __init__(self, path: str, ttl_seconds: float = 3600):
+        super().__init__(ttl_seconds)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_states (
+                    call_sid TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+        self._writes = 0
+
+    def _read(self, call_sid: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version FROM conversation_states WHERE call_sid = ? AND expires_at >= ?",
+                (call_sid, time.time())
+            ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def _write(self, call_sid: str, data: bytes, expected: int) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            if expected == 0:
+                # Also takes over an expired row of the same call
+                cursor = self._conn.execute(
+                    "INSERT INTO conversation_states VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT(call_sid) DO UPDATE SET version = 1, data = excluded.data, expires_at = excluded.expires_at "
+                    "WHERE conversation_states.expires_at < ?",
+                    (call_sid, data, now + self.ttl_seconds, now)
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE conversation_states SET version = version + 1, data = ?, expires_at = ? "
+                    "WHERE call_sid = ? AND version = ? AND expires_at >= ?",
+                    (data, now + self.ttl_seconds, call_sid, expected, now)
+                )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._conn.execute("DELETE FROM conversation_states WHERE expires_at < ?", (now,))
+            return cursor.rowcount == 1
+
+    def delete(self, call_sid: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversation_states WHERE call_sid = ?", (call_sid,))
+
+
+class RedisConversationStore(ConversationStore):
+    """States in Redis (or any server speaking its protocol), shared across hosts.
+
+    Each call is one hash {version, data} with the TTL as its expiry, and
+    saves are WATCH/MULTI transactions. Pass client to use an existing
+    client or a local stand-in such as fakeredis.
+    """
+
+    shared = True
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl_seconds: float = 3600, client=None, prefix: str = "conversation:"):
+        super().__init__(ttl_seconds)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("The Redis conversation store needs the redis package (pip install redis)") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _read(self, call_sid: str):
+        version, data = self.client.hmget(self.prefix + call_sid, "version", "data")
+        if data is None:
+            return None
+        return bytes(data), int(version)
+
+    def _write(self, call_sid: str, data: bytes, expected: int) -> bool:
+        from redis.exceptions import WatchError
+
+        key = self.prefix + call_sid
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.hget(key, "version")
+                if (int(current) if current is not None else 0) != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.hset(key, mapping={"version": expected + 1, "data": data})
+                pipe.expire(key, int(self.ttl_seconds))
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def delete(self, call_sid: str):
+        self.client.delete(self.prefix + call_sid)
+
+
+def create_state_store(url: Optional[str] = None, ttl_seconds: Optional[float] = None) -> ConversationStore:
+    """Build the store named by url (default $CONVERSATION_STORE): memory, sqlite:///<path> or redis://..."""
+    url = url or os.getenv("CONVERSATION_STORE", "memory")
+    if ttl_seconds is None:
+        ttl_seconds = float(os.getenv("CONVERSATION_STATE_TTL_SECONDS", 3600))
+    if url == "memory":
+        return MemoryConversationStore(ttl_seconds)
+    if url.startswith("sqlite:///"):
+        return SQLiteConversationStore(url[len("sqlite:///"):], ttl_seconds)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisConversationStore(url, ttl_seconds)
+    raise ValueError(f"Unknown conversation store: {url}")
@@ -0,0 +1,244 @@
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+from vocode.streaming.models.transcriber import DeepgramTranscriberConfig
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+# Overridden by the DEEPGRAM_STREAM_URL environment variable (e.g. benchmarks/deepgram_stub.py)
+DEEPGRAM_STREAM_URL = "wss://api.deepgram.com/v1/listen"
+# Deepgram closes a socket that has had no audio for about 10 seconds
+KEEPALIVE_SECONDS = 5
+CLOSE_TIMEOUT_SECONDS = 2
+# Raw bytes per sample for the encodings telephony audio arrives in
+BYTES_PER_SAMPLE = {"linear16": 2, "mulaw": 1, "alaw": 1}
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class StreamingMetrics:
+    """Counters for live Deepgram sockets, shared by every call."""
+
+    def __init__(self, window: int = 1000):
+        self.connections = 0
+        self.reconnects = 0
+        self.chunks_sent = 0
+        self.results = 0
+        # Seconds from sending a chunk to receiving the result that covers its audio
+        self.chunk_latencies: Deque[float] = collections.deque(maxlen=window)
+
+    def to_dict(self) -> Dict:
+        latencies = list(self.chunk_latencies)
+        return {
+            "connections": self.connections,
+            "reconnects": self.reconnects,
+            "chunks_sent": self.chunks_sent,
+            "results": self.results,
+            "chunk_latency_p50": round(percentile(latencies, 0.5), 4),
+            "chunk_latency_p95": round(percentile(latencies, 0.95), 4)
+        }
+
+
+streaming_metrics = StreamingMetrics()
+
+
+class DeepgramStreamingTranscriber:
+    """One Deepgram live-transcription socket, open for the duration of a call.
+
+    Audio pushed with send() is forwarded in chunk_size pieces (from the
+    DeepgramTranscriberConfig); results() yields {"transcript", "is_final"}
+    dicts, where interim results carry the utterance so far and is_final
+    marks the end of the utterance (Deepgram's endpointing). Final results
+    also carry the latency of the last chunk they cover. A dropped socket
+    is reopened with backoff, up to max_reconnects times in a row.
+    """
+
+    def __init__(
+        self,
+        config: DeepgramTranscriberConfig,
+        encoding: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        endpointing_ms: int = 300,
+        url: Optional[str] = None,
+        max_reconnects: int = 5,
+        metrics: Optional[StreamingMetrics] = None
+    ):
+        self.config = config
+        self.encoding = encoding or config.audio_encoding
+        self.sample_rate = sample_rate or config.sampling_rate
+        self.chunk_size = config.chunk_size
+        self.endpointing_ms = endpointing_ms
+        self.base_url = url or os.getenv("DEEPGRAM_STREAM_URL", DEEPGRAM_STREAM_URL)
+        self.max_reconnects = max_reconnects
+        self.metrics = metrics or streaming_metrics
+
+        self._socket = None
+        self._reconnect_lock = asyncio.Lock()
+        self._keepalive: Optional[asyncio.Task] = None
+        self._closed = False
+        self._buffer = bytearray()
+        self._final_parts = []
+        self._last_sent = 0.0
+        # Audio seconds sent on the current socket, and (audio end, send time) of unanswered chunks
+        self._audio_sent = 0.0
+        self._in_flight: Deque[Tuple[float, float]] = collections.deque()
+        self.chunk_latencies: Deque[float] = collections.deque(maxlen=1000)
+        self._last_latency: Optional[float] = None
+
+    @property
+    def url(self) -> str:
+        params = {
+            "model": self.config.model_name,
+            "language": self.config.language,
+            "tier": self.config.tier,
+            "encoding": self.encoding,
+            "sample_rate": self.sample_rate,
+            "channels": 1,
+            "punctuate": "true",
+            "interim_results": "true",
+            "endpointing": self.endpointing_ms,
+            "utterance_end_ms": 1000
+        }
+        return f"{self.base_url}?{urlencode(params)}"
+
+    @property
+    def bytes_per_second(self) -> int:
+        return self.sample_rate * BYTES_PER_SAMPLE.get(self.encoding, 2)
+
+    async def connect(self):
+        self._socket = await connect(self.url, additional_headers={"Authorization": f"Token {self.config.api_key}"})
+        # Deepgram's timestamps restart on every socket
+        self._audio_sent = 0.0
+        self._in_flight.clear()
+        self.metrics.connections += 1
+        if self._keepalive is None:
+            self._keepalive = asyncio.ensure_future(self._send_keepalives())
+
+    async def _reconnect(self, failed_socket):
+        """Replace a dropped socket, unless another task already has."""
+        async with self._reconnect_lock:
+            if self._socket is not failed_socket or self._closed:
+                return
+            for attempt in range(self.max_reconnects):
+                await asyncio.sleep(min(2.0, 0.1 * 2 ** attempt) * random.uniform(0.5, 1.0))
+                try:
+                    await self.connect()
+                    self.metrics.reconnects += 1
+                    return
+                except (OSError, ConnectionClosed) as e:
+                    print(f"Error reconnecting to Deepgram: {e}")
+            raise ConnectionError(f"Deepgram socket lost after {self.max_reconnects} reconnect attempts")
+
+    async def send(self, audio: bytes):
+        """Queue caller audio and push every complete chunk_size chunk to Deepgram."""
+        self._buffer += audio
+        while len(self._buffer) >= self.chunk_size:
+            chunk = bytes(self._buffer[:self.chunk_size])
+            del self._buffer[:self.chunk_size]
+            await self._send_chunk(chunk)
+
+    async def _send_chunk(self, chunk: bytes):
+        while True:
+            socket = self._socket
+            try:
+                await socket.send(chunk)
+                break
+            except ConnectionClosed:
+                await self._reconnect(socket)
+        now = time.monotonic()
+        self._last_sent = now
+        self._audio_sent += len(chunk) / self.bytes_per_second
+        self._in_flight.append((self._audio_sent, now))
+        self.metrics.chunks_sent += 1
+
+    async def _send_keepalives(self):
+        """Keep the socket open through stretches without audio (e.g. on hold)."""
+        while not self._closed:
+            await asyncio.sleep(KEEPALIVE_SECONDS)
+            if time.monotonic() - self._last_sent >= KEEPALIVE_SECONDS:
+                try:
+                    await self._socket.send(json.dumps({"type": "KeepAlive"}))
+                except ConnectionClosed:
+                    pass
+
+    def _record_latency(self, audio_end: float):
+        """Time the chunks whose audio this result has now covered."""
+        now = time.monotonic()
+        while self._in_flight and self._in_flight[0][0] <= audio_end + 1e-6:
+            _, sent_at = self._in_flight.popleft()
+            self._last_latency = now - sent_at
+            self.chunk_latencies.append(self._last_latency)
+            self.metrics.chunk_latencies.append(self._last_latency)
+
+    def _utterance(self, current: str = "") -> str:
+        return " ".join(part for part in self._final_parts + [current] if part)
+
+    async def results(self) -> AsyncIterator[Dict]:
+        """Yield interim and final transcripts until the transcriber is closed."""
+        while not self._closed:
+            socket = self._socket
+            try:
+                async for message in socket:
+                    data = json.loads(message)
+                    if data.get("type") == "UtteranceEnd":
+                        # Sent when endpointing missed the end of speech (e.g. background noise)
+                        if self._final_parts:
+                            yield {"transcript": self._utterance(), "is_final": True, "latency": self._last_latency}
+                            self._final_parts = []
+                        continue
+                    if data.get("type") != "Results":
+                        continue
+
+                    self.metrics.results += 1
+                    self._record_latency(data.get("start", 0.0) + data.get("duration", 0.0))
+                    text = data["channel"]["alternatives"][0]["transcript"]
+                    if data.get("is_final"):
+                        # Deepgram finalizes an utterance in segments; the utterance ends at speech_final
+                        if text:
+                            self._final_parts.append(text)
+                        if data.get("speech_final") and self._final_parts:
+                            yield {"transcript": self._utterance(), "is_final": True, "latency": self._last_latency}
+                            self._final_parts = []
+                    elif text:
+                        yield {"transcript": self._utterance(text), "is_final": False}
+            except ConnectionClosed:
+                pass
+            if not self._closed:
+                await self._reconnect(socket)
+
+    def stats(self) -> Dict:
+        latencies = list(self.chunk_latencies)
+        return {
+            "chunks_in_flight": len(self._in_flight),
+            "chunk_latency_p50": percentile(latencies, 0.5),
+            "chunk_latency_p95": percentile(latencies, 0.95)
+        }
+
+    async def close(self):
+        """Send the last partial chunk, flush the final results and close the socket."""
+        if self._socket is None or self._closed:
+            return
+        self._closed = True
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+        try:
+            if self._buffer:
+                await self._socket.send(bytes(self._buffer))
+                self._buffer.clear()
+            await self._socket.send(json.dumps({"type": "CloseStream"}))
+            # Deepgram sends its last results and then closes the socket itself
+            await asyncio.wait_for(self._socket.wait_closed(), CLOSE_TIMEOUT_SECONDS)
+        except (ConnectionClosed, asyncio.TimeoutError):
+            pass
+        await self._socket.close()
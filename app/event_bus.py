@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import json
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+# Idle event streams send a comment this often so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+
+# Sent to a subscriber that fell behind and lost events, so it can reload its state once
+RESYNC_EVENT = "resync"
+
+
+class Subscription:
+    """One subscriber's bounded queue of pending events.
+
+    Thread subscribers read with get(); subscribers on an event loop read with
+    next() and are fed through loop.call_soon_threadsafe, so publishers never
+    block on a slow reader. A subscriber more than max_pending events behind
+    drops its oldest events and receives a resync event instead.
+    """
+
+    def __init__(self, bus: "EventBus", max_pending: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.bus = bus
+        self.loop = loop
+        self.overflowed = False
+        # Publishers on different threads offer to the same queue; only readers may act between a drop and its put
+        self._offer_lock = threading.Lock()
+        self._queue = asyncio.Queue(max_pending) if loop is not None else queue.Queue(max_pending)
+
+    def _deliver(self, event: Dict):
+        """Hand an event to this subscriber from the publishing thread."""
+        if self.loop is None:
+            self._offer(event)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            # The subscriber's loop has closed
+            self.close()
+
+    def _offer(self, event: Dict):
+        """Queue an event, dropping the oldest one if the subscriber is full."""
+        with self._offer_lock:
+            try:
+                self._queue.put_nowait(event)
+            except (queue.Full, asyncio.QueueFull):
+                try:
+                    self._queue.get_nowait()
+                except (queue.Empty, asyncio.QueueEmpty):
+                    pass
+                self.overflowed = True
+                self.bus.dropped += 1
+                self._queue.put_nowait(event)
+
+    def _take_resync(self) -> Optional[Dict]:
+        if not self.overflowed:
+            return None
+        self.overflowed = False
+        # Whatever is still queued predates the resync, so discard it
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        return {"id": None, "type": RESYNC_EVENT, "time": time.time(), "data": {}}
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Wait for the next event from a thread; returns None on timeout."""
+        resync = self._take_resync()
+        if resync is not None:
+            return resync
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Wait for the next event on the subscriber's loop; returns None on timeout."""
+        resync = self._take_resync()
+        if resync is not None:
+            return resync
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        """Stop receiving events."""
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """In-process publish/subscribe bus for live call events.
+
+    The conversation logger and the Twilio status webhook publish events as
+    calls start, take turns and end; each open dashboard holds one
+    subscription and receives only those deltas.
+    """
+
+    def __init__(self, max_pending: int = 256):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        """Start receiving events, on the given event loop or (by default) from a thread."""
+        subscription = Subscription(self, self.max_pending, loop)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, **data) -> Dict:
+        """Send an event to every current subscriber, from any thread."""
+        with self._lock:
+            event = {"id": next(self._ids), "type": event_type, "time": time.time(), "data": data}
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            subscription._deliver(event)
+        return event
+
+    def stats(self) -> Dict:
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {"subscribers": subscribers, "published": self.published, "dropped": self.dropped}
+
+
+def format_sse(event: Optional[Dict]) -> str:
+    """Encode an event as a Server-Sent Events frame; None encodes a keep-alive comment."""
+    if event is None:
+        return ": keep-alive\n\n"
+    frame = f"event: {event['type']}\n"
+    if event["id"] is not None:
+        frame += f"id: {event['id']}\n"
+    return frame + f"data: {json.dumps(event['data'])}\n\n"
+
+
+# Process-wide bus shared by the logger, the webhooks and the event stream endpoints
+events = EventBus()
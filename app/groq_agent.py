@@ -1,64 +1,133 @@
-from os import getenv
-from groq import Groq
+import asyncio
+import time
+from groq import AsyncGroq
 from vocode.streaming.agent.base_agent import BaseAgent
 from vocode.streaming.models.agent import AgentConfig
 from typing import Optional, AsyncGenerator, List
 from pydantic import Field
 from vocode.streaming.models.message import BaseMessage
+from .llm_client import get_llm_client
+from .context_window import ConversationContext
+from .metrics import stage_metrics
+from .provider_limits import groq_limiter
 
 class GroqAgentConfig(AgentConfig):
     model_name: str = Field(default="mixtral-8x7b-32768")
     temperature: float = Field(default=0.3)
     prompt_preamble: str = Field(default="You are a professional sales agent")
+    # Prompt size cap; older turns beyond it are folded into a rolling summary
+    context_token_budget: int = Field(default=1024)
+    context_keep_turns: int = Field(default=6)
+    context_summary_tokens: int = Field(default=200)
 
-class GroqSalesAgent(BaseAgent):
-    def __init__(self, config: GroqAgentConfig):
-        super().__init__(config)
-        self.groq_client = Groq(api_key=getenv("GROQ_API_KEY"))
-        self.model_name = config.model_name
-        self.temperature = config.temperature
-        self.conversation_history = []
-        self.initial_message = config.initial_message
-        self.prompt_preamble = """Act as a concise and efficient sales representative. Your key goals are:
+SALES_PROMPT_PREAMBLE = """Act as a concise and efficient sales representative. Your key goals are:
         1. Ask targeted, brief questions to understand customer needs
         2. Listen more than you speak
         3. Provide very brief, value-focused responses
         4. Guide the conversation with short, impactful statements
         5. Aim to speak no more than 15-20 words per response
         6. Encourage the customer to share more about their requirements"""
+
+# Added to the prompt (not the history) when the customer talked over the previous reply
+INTERRUPT_NOTE = "\nThe customer just interrupted your previous reply. Respond to what they said; do not repeat yourself."
+
+class GroqSalesAgent(BaseAgent):
+    """Per-call agent: holds the conversation history and borrows the shared Groq client."""
+    
+    def __init__(self, config: GroqAgentConfig, llm_client: Optional[AsyncGroq] = None):
+        super().__init__(config)
+        # Injected client (e.g. a stub); otherwise the process-wide client is used
+        self.llm_client = llm_client
+        self.model_name = config.model_name
+        self.temperature = config.temperature
+        self.context = ConversationContext(
+            token_budget=config.context_token_budget,
+            keep_turns=config.context_keep_turns,
+            summary_tokens=config.context_summary_tokens
+        )
+        self.initial_message = config.initial_message
+        self.prompt_preamble = SALES_PROMPT_PREAMBLE
     
     async def respond(
         self, human_input: str, conversation_id: str = None, is_interrupt: bool = False
     ) -> AsyncGenerator[str, None]:
-        """Generate a concise response to the human input."""
+        """Generate a concise response to the human input.
+
+        is_interrupt marks input the customer spoke over the previous reply,
+        which should already have been cut down with truncate_last_response.
+        """
         # Add human message to conversation history
-        self.conversation_history.append({"role": "user", "content": human_input})
-        
-        # Prepare system message with prompt preamble
-        system_message = {"role": "system", "content": self.prompt_preamble}
+        self.context.add("user", human_input)
         
-        # Combine system message with conversation history
-        messages = [system_message] + self.conversation_history
-        
-        # Generate response from Groq
-        completion = self.groq_client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=50,  # Limit response length
-            stream=True
-        )
+        # System prompt, summary of older turns and the most recent turns, within the token budget
+        preamble = self.prompt_preamble + INTERRUPT_NOTE if is_interrupt else self.prompt_preamble
+        messages = self.context.build_messages(preamble)
         
-        # Process the streamed response
+        # Generate response from Groq. The completion is drained into a queue, so the Groq slot is
+        # released once it has been received rather than held while a slow consumer (e.g. speech
+        # synthesis under backpressure) works through it
+        chunks: asyncio.Queue = asyncio.Queue()
+        receiver = asyncio.ensure_future(self._receive(messages, conversation_id, chunks))
         full_response = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                content = chunk.choices[0].delta.content
+        try:
+            while True:
+                content = await chunks.get()
+                if content is None:
+                    break
                 full_response += content
                 yield content
-        
-        # Add assistant response to conversation history
-        self.conversation_history.append({"role": "assistant", "content": full_response})
+            # Raise whatever ended the stream
+            await receiver
+        finally:
+            if not receiver.done():
+                # The consumer stopped early (e.g. a barge-in): close the stream and return its connection to the pool
+                receiver.cancel()
+                await asyncio.wait([receiver])
+            # Add assistant response to conversation history, as far as it was generated
+            if full_response:
+                self.context.add("assistant", full_response)
+    
+    async def _receive(self, messages: List[dict], conversation_id: Optional[str], chunks: asyncio.Queue):
+        """Stream a completion into chunks, ended by None, holding a Groq slot until it is fully received."""
+        started = time.perf_counter()
+        received = False
+        try:
+            async with groq_limiter.slot():
+                completion = await self.groq_client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=50,  # Limit response length
+                    stream=True
+                )
+                try:
+                    async for chunk in completion:
+                        content = chunk.choices[0].delta.content
+                        if content:
+                            if not received:
+                                stage_metrics.record(conversation_id, "llm_first_token", time.perf_counter() - started)
+                                received = True
+                            chunks.put_nowait(content)
+                    stage_metrics.record(conversation_id, "llm_total", time.perf_counter() - started)
+                finally:
+                    await completion.close()
+        finally:
+            chunks.put_nowait(None)
+    
+    @property
+    def conversation_history(self) -> List[dict]:
+        """The turns currently sent verbatim to the model."""
+        return self.context.messages
+    
+    @property
+    def prompt_token_counts(self) -> List[int]:
+        """Estimated prompt tokens sent on each turn so far."""
+        return self.context.prompt_token_counts
+    
+    @property
+    def groq_client(self) -> AsyncGroq:
+        """The Groq client shared by every conversation."""
+        return self.llm_client or get_llm_client()
     
     async def get_initial_message(self) -> Optional[str]:
         """Return a very brief initial message to start the conversation."""
@@ -67,6 +136,22 @@ class GroqSalesAgent(BaseAgent):
             return self.initial_message.text[:50] + "..."
         return "Hello! I'd like to understand how I can help you today."
         
+    def checkpoint(self):
+        """Snapshot the conversation history before a turn that may be abandoned."""
+        return self.context.snapshot()
+    
+    def rollback(self, checkpoint):
+        """Undo every turn added since checkpoint() was taken."""
+        self.context.restore(checkpoint)
+    
+    def truncate_last_response(self, spoken_text: str):
+        """Keep only the part of the latest reply the caller heard before interrupting."""
+        self.context.truncate_reply(spoken_text)
+    
+    def amend_last_input(self, human_input: str):
+        """Replace the latest customer message, e.g. with the final transcript."""
+        self.context.replace_last("user", human_input)
+        
     def reset(self):
         """Reset the conversation history."""
-        self.conversation_history = []
\ No newline at end of file
+        self.context.reset()
\ No newline at end of file
@@ -0,0 +1,207 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Dict
+
+import httpx
+
+# Responses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PoolMetrics:
+    """Process-wide counters for the shared HTTP connection pools."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.retries = 0
+        self.failures = 0
+        self.host_wait_seconds = 0.0
+        self.in_flight: Dict[str, int] = {}
+
+    def increment(self, name: str, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def track_in_flight(self, host: str, delta: int):
+        with self._lock:
+            self.in_flight[host] = self.in_flight.get(host, 0) + delta
+
+    @property
+    def reused_connections(self) -> int:
+        """Requests that were served on an already-open keep-alive connection."""
+        return max(self.requests - self.new_connections, 0)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "pool_hit_ratio": round(self.reused_connections / self.requests, 3) if self.requests else 0.0,
+                "retries": self.retries,
+                "failures": self.failures,
+                "host_wait_seconds": round(self.host_wait_seconds, 3),
+                "in_flight": dict(self.in_flight)
+            }
+
+
+metrics = PoolMetrics()
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that frees the per-host slot once the body is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _PooledTransport(httpx.AsyncBaseTransport):
+    """Keep-alive transport that enforces per-host concurrency and records pool metrics."""
+
+    def __init__(self, per_host_limit: int, **transport_kwargs):
+        self._transport = httpx.AsyncHTTPTransport(**transport_kwargs)
+        self._per_host_limit = per_host_limit
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def _trace(self, event_name, info):
+        # httpcore only connects when no idle keep-alive connection was available
+        if event_name == "connection.connect_tcp.complete":
+            metrics.increment("new_connections")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        limiter = self._host_limits.setdefault(host, asyncio.Semaphore(self._per_host_limit))
+
+        wait_started = time.perf_counter()
+        await limiter.acquire()
+        metrics.increment("host_wait_seconds", time.perf_counter() - wait_started)
+        metrics.increment("requests")
+        metrics.track_in_flight(host, 1)
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                metrics.track_in_flight(host, -1)
+                limiter.release()
+
+        request.extensions = {**request.extensions, "trace": self._trace}
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class PooledHTTPClient:
+    """Shared async HTTP client with keep-alive pooling, per-host limits, timeouts and retries."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        per_host_limit: int = 20,
+        timeout: float = 15.0,
+        connect_timeout: float = 5.0,
+        retries: int = 2,
+        backoff: float = 0.25
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = _PooledTransport(
+            per_host_limit,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            )
+        )
+        self.client = httpx.AsyncClient(
+            transport=self.transport,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout)
+        )
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request, retrying transient failures with jittered exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+            except (httpx.TimeoutException, httpx.NetworkError):
+                if attempt >= self.retries:
+                    metrics.increment("failures")
+                    raise
+
+            attempt += 1
+            metrics.increment("retries")
+            await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# Connections are bound to the event loop that opened them, so each loop gets its own pool
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PooledHTTPClient]" = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> PooledHTTPClient:
+    """Return the shared pooled HTTP client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = PooledHTTPClient(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", 20)),
+            per_host_limit=int(os.getenv("HTTP_PER_HOST_LIMIT", 20)),
+            timeout=float(os.getenv("HTTP_TIMEOUT", 15.0)),
+            retries=int(os.getenv("HTTP_RETRIES", 2))
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_http_client():
+    """Close the shared client for the running event loop, if one was created."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def get_pool_metrics() -> Dict:
+    """Return connection pool metrics for all shared clients."""
+    return metrics.to_dict()
@@ -0,0 +1,24 @@
+import weakref
+from os import getenv
+
+from groq import AsyncGroq
+
+from .http_client import PooledHTTPClient, get_http_client
+
+# One Groq client per shared HTTP pool (in practice, one per process)
+_clients: "weakref.WeakKeyDictionary[PooledHTTPClient, AsyncGroq]" = weakref.WeakKeyDictionary()
+
+
+def get_llm_client() -> AsyncGroq:
+    """Return the process-wide Groq client, which sends its requests through the shared HTTP pool."""
+    http_client = get_http_client()
+    client = _clients.get(http_client)
+    if client is None:
+        client = AsyncGroq(
+            api_key=getenv("GROQ_API_KEY"),
+            base_url=getenv("GROQ_BASE_URL") or None,
+            http_client=http_client.client,
+            max_retries=http_client.retries
+        )
+        _clients[http_client] = client
+    return client
@@ -0,0 +1,329 @@
+import asyncio
+import base64
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .audio import wav_payload
+from .context_window import cut_off
+from .metrics import stage_metrics
+from .speculation import ReplyStream
+from .speech_pipeline import stream_speech
+
+# Twilio Media Streams carry 8 kHz mono mu-law in both directions
+MEDIA_ENCODING = "mulaw"
+MEDIA_SAMPLE_RATE = 8000
+MEDIA_STREAM_PATH = "/twilio/media-stream"
+
+
+async def _single(text: str):
+    yield text
+
+
+class _QueueIterator:
+    """Async iterator over a queue of results, ended by None.
+
+    Unlike an async generator it survives a cancelled read, so each turn can
+    pick up where a barged-in turn left off.
+    """
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is None:
+            # Leave the end marker for any later reader
+            self.queue.put_nowait(None)
+            raise StopAsyncIteration
+        return item
+
+
+class BargeInMetrics:
+    """Counters for replies cut short by the caller (or by an error), shared by every media stream."""
+
+    def __init__(self):
+        self.barge_ins = 0
+        self.generation_cancelled = 0
+        self.unspoken_chars = 0
+        self.failed_turns = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "barge_ins": self.barge_ins,
+            "generation_cancelled": self.generation_cancelled,
+            "unspoken_chars": self.unspoken_chars,
+            "failed_turns": self.failed_turns
+        }
+
+
+barge_in_metrics = BargeInMetrics()
+
+
+class MediaStreamSession:
+    """One Twilio Media Streams WebSocket: caller audio in, agent speech out on the same socket.
+
+    Caller audio is forwarded to a live Deepgram socket; each utterance is
+    answered through EnhancedConversation (with speculative responses) and
+    its phrases are synthesized as 8 kHz mu-law clips and sent back as media messages,
+    each followed by a mark so Twilio reports when it has been played.
+
+    If the caller starts speaking while a reply is being generated or played
+    (barge-in), the reply is cancelled along with its Groq stream and
+    ElevenLabs requests, Twilio's buffered audio is cleared, and the agent's
+    history keeps only the phrases the caller actually heard.
+    """
+
+    def __init__(self, agent, logger, send_message: Callable[[Dict], Awaitable[None]]):
+        self.agent = agent
+        self.logger = logger
+        self.send_message = send_message
+        self.call_sid: Optional[str] = None
+        self.stream_sid: Optional[str] = None
+        self.conversation = None
+        self.transcriber = None
+        self.metrics = barge_in_metrics
+
+        # Transcripts flow from the listener to the turn being answered
+        self._results: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._turn: Optional[asyncio.Task] = None
+        # A reply is under way from its final transcript until its last mark comes back
+        self._replying = False
+        self._sending = False
+        self._reply_text = ""
+        # The turn's reply while it is generated; its text so far stands in for _reply_text
+        self._reply: Optional[ReplyStream] = None
+        # Mark names carry the reply's id, so a mark Twilio echoes after a clear can't match a later reply
+        self._reply_id = 0
+        self._pending_marks: Dict[str, str] = {}
+        self._spoken: List[str] = []
+        self._unlogged_turn: Optional[Dict] = None
+        self._interrupted = False
+        self._closing = False
+        # A media stream gets no webhooks, so its frames keep the call's registry entry from expiring
+        self._touched_at = 0.0
+        self._touch_interval = 1.0
+
+    async def run(self, messages: AsyncIterator[Dict]):
+        """Handle Twilio's messages until the stream stops or the socket closes."""
+        try:
+            async for message in messages:
+                event = message.get("event")
+                if event == "start":
+                    await self.start(message["start"])
+                elif event == "media" and self.transcriber is not None:
+                    self.keep_alive()
+                    await self.transcriber.send(base64.b64decode(message["media"]["payload"]))
+                elif event == "mark":
+                    self.keep_alive()
+                    self.played(message["mark"]["name"])
+                elif event == "stop":
+                    break
+        finally:
+            await self.close()
+
+    async def start(self, start: Dict):
+        """Attach the stream to the call's conversation and greet the caller."""
+        self.call_sid = start["callSid"]
+        self.stream_sid = start["streamSid"]
+        # May raise RegistryFullError, which closes the socket
+        self.conversation = self.agent.get_conversation(self.call_sid)
+        self.conversation.call_sid = self.call_sid
+        self._touched_at = time.monotonic()
+        self._touch_interval = min(1.0, self.agent.active_conversations.ttl_seconds / 4)
+        self.transcriber = await self.conversation.open_transcriber(MEDIA_ENCODING, MEDIA_SAMPLE_RATE)
+        self._tasks = [asyncio.ensure_future(self.listen()), asyncio.ensure_future(self.converse())]
+
+    def keep_alive(self):
+        """Mark the call as active in the registry, at most every _touch_interval seconds."""
+        now = time.monotonic()
+        if now - self._touched_at >= self._touch_interval:
+            self._touched_at = now
+            self.agent.active_conversations.touch(self.call_sid)
+
+    async def listen(self):
+        """Pass transcripts on to the current turn, interrupting the reply if the caller talks over it."""
+        try:
+            async for result in self.transcriber.results():
+                if result["transcript"] and self._replying:
+                    await self.interrupt()
+                await self._results.put(result)
+                if result["is_final"] and result["transcript"]:
+                    # The reply to this utterance starts now, while it is still being generated
+                    self._begin_reply()
+                    if result.get("latency") is not None:
+                        stage_metrics.record(self.call_sid, "stt", result["latency"])
+        finally:
+            await self._results.put(None)
+
+    async def converse(self):
+        """Greet the caller, then answer utterances one turn at a time for the lifetime of the stream."""
+        self._turn = asyncio.ensure_future(self.greet())
+        await self._wait_for_turn()
+
+        transcripts = _QueueIterator(self._results)
+        while True:
+            self._turn = asyncio.ensure_future(self.take_turn(transcripts))
+            if await self._wait_for_turn() is False:
+                return
+
+    async def _wait_for_turn(self) -> Optional[bool]:
+        """Wait for the current turn; returns None if a barge-in cancelled it or it failed."""
+        try:
+            return await self._turn
+        except asyncio.CancelledError:
+            if self._closing:
+                raise
+            return None
+        except Exception as e:
+            # One failed reply (e.g. a Groq or ElevenLabs error) must not leave the rest of the call silent
+            await self.turn_failed(e)
+            return None
+
+    async def turn_failed(self, error: Exception):
+        """Give up on a reply that raised; what was already sent still plays, and the next utterance is answered."""
+        self.metrics.failed_turns += 1
+        print(f"Error in media stream turn for {self.call_sid}: {error}")
+        if self._reply is not None:
+            await self._reply.aclose()
+            # The caller hears the phrases sent before the error, and no more
+            heard = "".join(self._spoken) + "".join(self._pending_marks.values())
+            if heard.split() != self._reply.text.split():
+                self.conversation.agent.truncate_last_response(heard)
+                if self._unlogged_turn is not None:
+                    self.log_turn(self._unlogged_turn["transcript"], cut_off(heard))
+                    self._unlogged_turn = None
+            self._reply_text, self._reply = heard, None
+        self._reply_sent()
+        try:
+            await self.conversation.save_state()
+        except Exception as e:
+            print(f"Error saving conversation state for {self.call_sid}: {e}")
+
+    def _begin_reply(self, text: str = ""):
+        stage_metrics.begin_turn(self.call_sid)
+        self._reply_id += 1
+        self._replying = True
+        self._reply_text = text
+        self._reply = None
+        self._spoken = []
+
+    async def greet(self):
+        self._begin_reply(await self.conversation.agent.get_initial_message())
+        await self.speak(_single(self._reply_text))
+        self._reply_sent()
+
+    async def take_turn(self, transcripts) -> bool:
+        """Answer one utterance; returns False once the transcript stream has ended."""
+        is_interrupt, self._interrupted = self._interrupted, False
+        turn = await self.conversation.respond_to_transcripts(transcripts, is_interrupt=is_interrupt, stream=True)
+        if turn is None:
+            return False
+        self._reply = turn["reply"]
+        # Logged once the caller has heard it, or as much of it as they heard
+        self._unlogged_turn = turn
+        # The first phrase is synthesized and sent while the rest of the reply is still being generated
+        await self.speak(self._reply)
+        self._reply_sent()
+        await self.conversation.save_state()
+        return True
+
+    def _reply_sent(self):
+        """All of the reply has been sent; it is over once Twilio has played it."""
+        if not self._pending_marks:
+            self._reply_finished()
+
+    def _reply_finished(self):
+        self._replying = False
+        if self._unlogged_turn is not None:
+            self.log_turn(self._unlogged_turn["transcript"], self._unlogged_turn["reply"].text)
+            self._unlogged_turn = None
+
+    def log_turn(self, transcript: str, response: str):
+        # Logging may wait on the disk (sync durability), so keep it off the loop
+        timings = stage_metrics.current_turn(self.call_sid)
+        asyncio.get_running_loop().run_in_executor(
+            None, self.logger.log_interaction, self.call_sid, transcript, response, timings
+        )
+
+    async def speak(self, text_stream: AsyncIterator[str]):
+        """Synthesize streamed text phrase by phrase and send each phrase to the caller as it is ready."""
+        self._sending = True
+        # Cached clips are already 8 kHz mu-law, shared with <Play>; only the WAV header is skipped
+        synthesize = self.conversation.synthesize_audio
+        try:
+            async for segment in stream_speech(text_stream, synthesize):
+                if not segment["audio"]:
+                    continue
+                mark = f"r{self._reply_id}-seg-{segment['index']}"
+                self._pending_marks[mark] = segment["text"]
+                await self.send_message({
+                    "event": "media",
+                    "streamSid": self.stream_sid,
+                    "media": {"payload": base64.b64encode(wav_payload(segment["audio"])).decode("ascii")}
+                })
+                await self.send_message({"event": "mark", "streamSid": self.stream_sid, "mark": {"name": mark}})
+        finally:
+            self._sending = False
+
+    def played(self, mark: str):
+        """Twilio has played the audio up to this mark."""
+        text = self._pending_marks.pop(mark, None)
+        if text is None:
+            # From a reply that was cleared after a barge-in
+            return
+        self._spoken.append(text)
+        if not self._pending_marks and not self._sending:
+            self._reply_finished()
+
+    async def interrupt(self):
+        """The caller started talking over the reply: stop it and forget what they didn't hear."""
+        self._replying = False
+        self._interrupted = True
+        self.metrics.barge_ins += 1
+        if self._turn is not None and not self._turn.done():
+            self._turn.cancel()
+            try:
+                await self._turn
+            except (asyncio.CancelledError, Exception):
+                pass
+            if self._reply is None and not self._reply_text:
+                self.metrics.generation_cancelled += 1
+        if self._reply is not None:
+            if not self._reply.task.done():
+                self.metrics.generation_cancelled += 1
+            # The agent adds the partial reply to its history as generation stops; truncate after that
+            await self._reply.aclose()
+            self._reply_text = self._reply.text
+            self._reply = None
+
+        # Drop whatever audio Twilio has buffered but not played yet
+        await self.send_message({"event": "clear", "streamSid": self.stream_sid})
+        spoken = "".join(self._spoken)
+        self.metrics.unspoken_chars += max(0, len(self._reply_text) - len(spoken))
+        self.conversation.agent.truncate_last_response(spoken)
+        await self.conversation.save_state()
+        if self._unlogged_turn is not None:
+            self.log_turn(self._unlogged_turn["transcript"], cut_off(spoken))
+            self._unlogged_turn = None
+        self._pending_marks.clear()
+        self._reply_text = ""
+
+    async def close(self):
+        """Stop answering and release the Deepgram socket; the status callback ends the call."""
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._reply is not None:
+            await self._reply.aclose()
+            await self.conversation.save_state()
+        if self.transcriber is not None:
+            await self.transcriber.close()
@@ -0,0 +1,150 @@
+import bisect
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Stages of a turn, in the order they happen
+STAGES = ["webhook", "stt", "llm_first_token", "llm_total", "tts", "disk_write"]
+# Upper bounds in seconds, from cache hits up to a stalled provider
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations, like a Prometheus histogram."""
+
+    def __init__(self, buckets: List[float] = DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        # The last count is the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, fraction: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in (at most the last bound)."""
+        if not self.count:
+            return 0.0
+        target, seen = fraction * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+
+class StageMetrics:
+    """Timings for each stage of each turn, kept as histograms and per-call breakdowns.
+
+    Spans are keyed by call_sid. Every span is observed in the stage's
+    histogram and added to the call's current turn (begun by begin_turn()),
+    so a call's page can show where its latency went. Breakdowns are kept
+    for the most recent max_calls calls.
+    """
+
+    def __init__(self, max_calls: int = 1000, max_turns: int = 200):
+        self.max_calls = max_calls
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self._calls: "OrderedDict[str, List[Dict[str, float]]]" = OrderedDict()
+
+    def begin_turn(self, call_sid: str):
+        """Start a new turn for the call; later spans are attributed to it."""
+        with self._lock:
+            turns = self._turns(call_sid)
+            turns.append({})
+            del turns[:-self.max_turns]
+
+    def _turns(self, call_sid: str) -> List[Dict[str, float]]:
+        """The call's turns, most recently used last. Caller must hold the lock."""
+        turns = self._calls.get(call_sid)
+        if turns is None:
+            turns = self._calls[call_sid] = []
+            while len(self._calls) > self.max_calls:
+                self._calls.popitem(last=False)
+        else:
+            self._calls.move_to_end(call_sid)
+        return turns
+
+    def record(self, call_sid: Optional[str], stage: str, seconds: float):
+        """Record a stage duration; repeated stages in a turn (e.g. one TTS request per phrase) add up."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            if call_sid:
+                turns = self._turns(call_sid)
+                if not turns:
+                    turns.append({})
+                turns[-1][stage] = turns[-1].get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, call_sid: Optional[str], stage: str):
+        """Time the enclosed block as a stage of the call's current turn."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(call_sid, stage, time.perf_counter() - started)
+
+    def current_turn(self, call_sid: str) -> Dict[str, float]:
+        with self._lock:
+            turns = self._calls.get(call_sid)
+            return dict(turns[-1]) if turns else {}
+
+    def call_breakdown(self, call_sid: str) -> Optional[List[Dict[str, float]]]:
+        """Stage timings for each of the call's turns, or None if the call is not tracked."""
+        with self._lock:
+            turns = self._calls.get(call_sid)
+            return [dict(turn) for turn in turns] if turns is not None else None
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                stage: {
+                    "count": histogram.count,
+                    "avg": round(histogram.sum / histogram.count, 4) if histogram.count else 0.0,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95)
+                }
+                for stage, histogram in self._histograms.items()
+            }
+
+    def render_prometheus(self, prefix: str = "voice_turn_stage_seconds") -> str:
+        """The histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix} Duration of each stage of a conversation turn.",
+            f"# TYPE {prefix} histogram"
+        ]
+        with self._lock:
+            for stage, histogram in self._histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+stage_metrics = StageMetrics()
+
+
+def render_gauges(prefix: str, values: Dict) -> str:
+    """Render the numbers in a (nested) stats dict, such as /status sections, as Prometheus gauges."""
+    lines = []
+    for key, value in values.items():
+        name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}"
+        if isinstance(value, dict):
+            lines.append(render_gauges(name, value).rstrip("\n"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"{name} {value}")
+    return "\n".join(line for line in lines if line) + "\n"
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from .metrics import Histogram
+
+# Wait-time buckets in seconds; anything near the top means the limit is too low for the load
+WAIT_BUCKETS = [0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class ProviderLimiter:
+    """Caps concurrent requests to one external provider across every call in the process.
+
+    Requests over the limit wait their turn in FIFO order instead of tripping
+    the provider's rate limits. The limit is read from limit_env (falling back
+    to default) on first use, so values from .env apply.
+    """
+
+    def __init__(self, name: str, limit_env: str, default: int):
+        self.name = name
+        self.limit_env = limit_env
+        self.default = default
+        self._limit: Optional[int] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.waits = Histogram(WAIT_BUCKETS)
+
+    @property
+    def limit(self) -> int:
+        if self._limit is None:
+            self._limit = max(1, int(os.getenv(self.limit_env, self.default)))
+        return self._limit
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # The shared loop can be replaced (e.g. the dev server's background loop), and a semaphore belongs to one loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the provider's request slots for the duration of the block."""
+        semaphore = self._get_semaphore()
+        started = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.waits.observe(time.perf_counter() - started)
+        self.acquired += 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "acquired": self.acquired,
+            "avg_wait_seconds": round(self.waits.sum / self.waits.count, 4) if self.waits.count else 0.0,
+            "p95_wait_seconds": self.waits.quantile(0.95)
+        }
+
+
+groq_limiter = ProviderLimiter("groq", "GROQ_MAX_CONCURRENCY", 16)
+elevenlabs_limiter = ProviderLimiter("elevenlabs", "ELEVENLABS_MAX_CONCURRENCY", 8)
+deepgram_limiter = ProviderLimiter("deepgram", "DEEPGRAM_MAX_CONCURRENCY", 32)
+
+
+def provider_stats() -> Dict:
+    return {limiter.name: limiter.stats() for limiter in (groq_limiter, elevenlabs_limiter, deepgram_limiter)}
@@ -0,0 +1,71 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Optional
+
+
+class EventLoopRuntime:
+    """Owns the single long-lived event loop that every webhook handler shares.
+
+    Under the ASGI server the loop is the server's own loop, bound at startup.
+    Under the Flask development server a dedicated background thread runs it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Run all async work on an already running loop (e.g. the ASGI server's)."""
+        with self._lock:
+            self._loop = loop
+            self._thread = None
+
+    def unbind(self):
+        """Forget a bound loop, e.g. when the ASGI server shuts down."""
+        with self._lock:
+            if self._thread is None:
+                self._loop = None
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        """Return the shared loop, starting a background one if none is bound."""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="event-loop", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the shared loop from any thread."""
+        loop = self.get_loop()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("Cannot block on the event loop from its own thread; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the shared loop and wait for its result."""
+        return self.submit(coro).result(timeout)
+
+    def shutdown(self):
+        """Stop the background loop if this runtime started one."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if thread is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+
+
+runtime = EventLoopRuntime()
+
+
+def run_async(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the process-wide event loop from synchronous code."""
+    return runtime.run(coro, timeout)
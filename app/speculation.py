@@ -0,0 +1,243 @@
+import asyncio
+import difflib
+import re
+import time
+from typing import AsyncIterator, Callable, Dict, Optional
+
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase a transcript and strip punctuation so interim and final results compare fairly."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+def transcript_similarity(a: str, b: str) -> float:
+    """Similarity ratio (0..1) between two transcripts."""
+    return difflib.SequenceMatcher(None, normalize_transcript(a), normalize_transcript(b)).ratio()
+
+
+class SpeculationMetrics:
+    """Counters for speculative responses, shared by every conversation."""
+
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.diverged = 0
+        self.latency_saved_seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "diverged": self.diverged,
+            "hit_rate": self.hits / self.started if self.started else 0.0,
+            "latency_saved_seconds": round(self.latency_saved_seconds, 3),
+            "avg_latency_saved_seconds": self.latency_saved_seconds / self.hits if self.hits else 0.0
+        }
+
+
+speculation_metrics = SpeculationMetrics()
+
+_END = object()
+
+
+class ReplyStream:
+    """A reply generated in the background, readable chunk by chunk while it is generated.
+
+    Generation runs in its own task, so it goes on whether or not anyone is
+    reading yet. One reader iterates the chunks, including those generated
+    before it started; aclose() stops generation.
+    """
+
+    def __init__(self, chunks: AsyncIterator[str]):
+        self.text = ""
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.ensure_future(self._generate(chunks))
+
+    async def _generate(self, chunks: AsyncIterator[str]) -> str:
+        try:
+            async for chunk in chunks:
+                self.text += chunk
+                self._chunks.put_nowait(chunk)
+            return self.text
+        finally:
+            self._chunks.put_nowait(_END)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        chunk = await self._chunks.get()
+        if chunk is _END:
+            # Leave the end marker for any later read
+            self._chunks.put_nowait(_END)
+            await asyncio.wait([self.task])
+            if not self.task.cancelled() and self.task.exception() is not None:
+                raise self.task.exception()
+            raise StopAsyncIteration
+        return chunk
+
+    async def aclose(self):
+        """Stop generating (if still under way) and wait until the generator has cleaned up."""
+        self.task.cancel()
+        try:
+            await self.task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+class _Speculation:
+    def __init__(self, text: str, reply: ReplyStream, checkpoint):
+        self.text = text
+        self.reply = reply
+        self.task = reply.task
+        self.checkpoint = checkpoint
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.task.add_done_callback(self._finished)
+
+    def _finished(self, _):
+        self.finished_at = time.monotonic()
+
+
+class SpeculativeResponder:
+    """Start generating a response on a stable interim transcript, before the final one arrives.
+
+    An interim transcript is stable once Deepgram has returned it unchanged
+    stable_interims times in a row. When the final transcript arrives, a
+    speculative response generated from text within threshold similarity of
+    it is committed. Otherwise the speculation is cancelled, the agent's
+    history is rolled back to its checkpoint and the response is generated
+    again from the final transcript.
+
+    generate streams the reply to a transcript. With stream=True, respond()
+    returns as soon as the reply is chosen, with the reply still being
+    generated, so its first phrase can be spoken before the last is written.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], AsyncIterator[str]],
+        checkpoint: Optional[Callable[[], object]] = None,
+        rollback: Optional[Callable[[object], None]] = None,
+        amend: Optional[Callable[[str], None]] = None,
+        threshold: float = 0.9,
+        stable_interims: int = 2,
+        enabled: bool = True,
+        metrics: Optional[SpeculationMetrics] = None
+    ):
+        self.generate = generate
+        self.checkpoint = checkpoint or (lambda: None)
+        self.rollback = rollback or (lambda _: None)
+        # Replaces the speculated input in the agent's history with the final transcript
+        self.amend = amend or (lambda _: None)
+        self.threshold = threshold
+        self.stable_interims = stable_interims
+        self.enabled = enabled
+        self.metrics = metrics or speculation_metrics
+
+    def _start(self, text: str) -> _Speculation:
+        checkpoint = self.checkpoint()
+        self.metrics.started += 1
+        return _Speculation(text, ReplyStream(self.generate(text)), checkpoint)
+
+    async def _abandon(self, speculation: _Speculation, rollback: bool = True):
+        """Cancel a speculation and (by default) undo whatever it added to the agent's history."""
+        speculation.task.cancel()
+        try:
+            await speculation.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        if rollback:
+            self.rollback(speculation.checkpoint)
+
+    def _record_hit(self, committed: _Speculation, final_at: float):
+        self.metrics.hits += 1
+
+        def record(_=None):
+            if committed.task.cancelled():
+                return
+            # Without speculation the response would have been ready one generation time after the final
+            generation_time = committed.finished_at - committed.started_at
+            self.metrics.latency_saved_seconds += final_at + generation_time - max(final_at, committed.finished_at)
+
+        if committed.finished_at is not None:
+            record()
+        else:
+            committed.task.add_done_callback(record)
+
+    async def respond(self, results: AsyncIterator[Dict], stream: bool = False) -> Optional[Dict]:
+        """Answer the next utterance in a stream of {"transcript", "is_final"} results.
+
+        Returns {"transcript", "response", "speculative"}, or None if the stream
+        ends (or the utterance is empty) before a final transcript. With
+        stream, "reply" (a ReplyStream still being generated) replaces
+        "response"; the caller must read or aclose() it.
+        """
+        speculation: Optional[_Speculation] = None
+        committing = False
+        last_interim, repeats = "", 0
+        try:
+            while True:
+                try:
+                    result = await results.__anext__()
+                except StopAsyncIteration:
+                    return None
+
+                text = (result.get("transcript") or "").strip()
+                if result.get("is_final"):
+                    break
+                if not text or not self.enabled:
+                    continue
+
+                normalized = normalize_transcript(text)
+                repeats = repeats + 1 if normalized == last_interim else 1
+                last_interim = normalized
+
+                # The caller kept talking past the speculated text; start over from the newer interim
+                if speculation is not None and transcript_similarity(speculation.text, text) < self.threshold:
+                    self.metrics.diverged += 1
+                    await self._abandon(speculation)
+                    speculation = None
+                if speculation is None and repeats >= self.stable_interims:
+                    speculation = self._start(text)
+
+            final_at = time.monotonic()
+            if not text:
+                return None
+
+            if speculation is not None and transcript_similarity(speculation.text, text) >= self.threshold:
+                committing = True
+                task = speculation.task
+                if stream and not (task.done() and (task.cancelled() or task.exception() is not None)):
+                    committed, speculation = speculation, None
+                    self.amend(text)
+                    self._record_hit(committed, final_at)
+                    return {"transcript": text, "reply": committed.reply, "speculative": True}
+                try:
+                    response = await speculation.task
+                except Exception as e:
+                    print(f"Speculative response failed, regenerating: {e}")
+                    committing = False
+                else:
+                    committed, speculation = speculation, None
+                    self.amend(text)
+                    self._record_hit(committed, final_at)
+                    return {"transcript": text, "response": response, "speculative": True}
+
+            if speculation is not None:
+                self.metrics.misses += 1
+                await self._abandon(speculation)
+                speculation = None
+            reply = ReplyStream(self.generate(text))
+            if stream:
+                return {"transcript": text, "reply": reply, "speculative": False}
+            return {"transcript": text, "response": await reply.task, "speculative": False}
+        finally:
+            # Hang-ups and barge-ins cancel respond() itself; never leave a speculation running
+            if speculation is not None:
+                # Once the final transcript matched, the caller's words stay in the history like any other turn
+                await self._abandon(speculation, rollback=not committing)
+                if committing:
+                    self.amend(text)
@@ -0,0 +1,110 @@
+import asyncio
+import re
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# A sentence ends at terminal punctuation followed by whitespace, so "3.5" or a
+# half-streamed "Hello." is not split before the next chunk arrives
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s')
+# Clause breaks are only used once the pending phrase is long enough to be worth speaking
+CLAUSE_END = re.compile(r'[,;:]\s')
+
+
+class PhraseChunker:
+    """Split a stream of LLM text chunks into speakable phrases."""
+
+    def __init__(self, min_clause_chars: int = 30):
+        self.min_clause_chars = min_clause_chars
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return any phrases that are now complete."""
+        self.buffer += text
+        phrases = []
+        while True:
+            split_at = None
+
+            sentence = SENTENCE_END.search(self.buffer)
+            if sentence:
+                split_at = sentence.end()
+            else:
+                for clause in CLAUSE_END.finditer(self.buffer):
+                    if clause.end() >= self.min_clause_chars:
+                        split_at = clause.end()
+                        break
+
+            if split_at is None:
+                return phrases
+
+            phrases.append(self.buffer[:split_at])
+            self.buffer = self.buffer[split_at:]
+
+    def flush(self) -> Optional[str]:
+        """Return whatever text is left once the stream has finished."""
+        phrase, self.buffer = self.buffer, ""
+        return phrase if phrase.strip() else None
+
+
+async def stream_speech(
+    text_stream: AsyncIterator[str],
+    synthesize: Callable[[str], Awaitable[Optional[str]]],
+    chunker: Optional[PhraseChunker] = None,
+    max_in_flight: int = 3
+) -> AsyncGenerator[Dict, None]:
+    """Synthesize phrases as soon as the text stream completes them.
+
+    Yields {"index", "text", "audio"} segments in spoken order. Synthesis of a
+    phrase runs concurrently with generation of the following text, with the
+    number of phrases synthesized ahead of the consumer bounded by max_in_flight.
+    """
+    chunker = chunker or PhraseChunker()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_in_flight)
+    started = []
+    done = object()
+
+    def start_synthesis(phrase):
+        text = phrase.strip()
+        synthesis = asyncio.ensure_future(synthesize(text) if text else _no_audio())
+        started.append(synthesis)
+        return synthesis
+
+    async def produce():
+        try:
+            async for chunk in text_stream:
+                for phrase in chunker.feed(chunk):
+                    await queue.put((phrase, start_synthesis(phrase)))
+            phrase = chunker.flush()
+            if phrase:
+                await queue.put((phrase, start_synthesis(phrase)))
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            # Close the generator so an abandoned LLM stream releases its connection
+            aclose = getattr(text_stream, "aclose", None)
+            if aclose:
+                await aclose()
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        index = 0
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            phrase, synthesis = item
+            audio = await synthesis
+            yield {"index": index, "text": phrase, "audio": audio}
+            index += 1
+    finally:
+        # Stop generation and any outstanding synthesis if the consumer goes away early
+        producer.cancel()
+        for synthesis in started:
+            if not synthesis.done():
+                synthesis.cancel()
+
+
+async def _no_audio():
+    return None
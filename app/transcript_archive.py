@@ -0,0 +1,212 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .transcript_writer import read_records
+
+DEFAULT_ARCHIVE_DIR = os.path.join('logs', 'archive')
+
+
+class TranscriptArchive:
+    """Append-only, compressed archive of completed call logs.
+
+    Each call's JSONL records are written as one gzip member appended to a
+    daily segment file (<dir>/<YYYY-MM>/<YYYY-MM-DD>-<part>.jsonl.gz, rolled
+    over at max_segment_bytes), and a small SQLite index maps the call_sid to
+    the member's offset and length, so one call is read back with a single
+    seek. Concatenated gzip members are a valid gzip stream, so a whole
+    segment can still be read with zcat.
+    """
+
+    def __init__(self, directory: str = DEFAULT_ARCHIVE_DIR, max_segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS archived_calls (
+                    call_sid TEXT PRIMARY KEY,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    records INTEGER NOT NULL,
+                    archived_at TEXT NOT NULL
+                )
+            """)
+
+    def _segment_for(self, day: str) -> str:
+        """The segment (relative path) that new members for this day go to."""
+        month_dir = os.path.join(self.directory, day[:7])
+        os.makedirs(month_dir, exist_ok=True)
+        part = 0
+        while True:
+            segment = os.path.join(day[:7], f"{day}-{part:03d}.jsonl.gz")
+            path = os.path.join(self.directory, segment)
+            if not os.path.exists(path) or os.path.getsize(path) < self.max_segment_bytes:
+                return segment
+            part += 1
+
+    def _locate(self, call_sid: str) -> Optional[Tuple[str, int, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT segment, offset, length FROM archived_calls WHERE call_sid = ?", (call_sid,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def contains(self, call_sid: str) -> bool:
+        return self._locate(call_sid) is not None
+
+    def read(self, call_sid: str) -> Optional[List[Dict]]:
+        """Return an archived call's records, or None if it is not archived."""
+        location = self._locate(call_sid)
+        if location is None:
+            return None
+        segment, offset, length = location
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            data = gzip.decompress(f.read(length))
+        return [json.loads(line) for line in data.decode().splitlines() if line]
+
+    def append(self, call_sid: str, records: List[Dict]) -> int:
+        """Archive a call's records (merged with any already archived for it); returns the compressed size."""
+        if not records:
+            return 0
+        previous = self.read(call_sid) or []
+        records = previous + records
+        day = (records[0].get('start_time') or records[0].get('timestamp') or datetime.now().isoformat())[:10]
+        data = gzip.compress(
+            "".join(json.dumps(dict(record, call_sid=call_sid), separators=(',', ':')) + "\n" for record in records).encode()
+        )
+
+        with self._lock:
+            segment = self._segment_for(day)
+            # O_APPEND makes each member land whole at the end, even with another process appending
+            fd = os.open(os.path.join(self.directory, segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                offset = os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            # The member is on disk before the index points at it; a crash in between only leaves unreferenced bytes
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO archived_calls VALUES (?, ?, ?, ?, ?, ?)",
+                    (call_sid, segment, offset, len(data), len(records), datetime.now().isoformat())
+                )
+        return len(data)
+
+    def compact(self, call_sid: str, paths: List[str]) -> bool:
+        """Move a call's loose log files into the archive, deleting them once archived."""
+        records = []
+        for path in paths:
+            if os.path.exists(path):
+                records.extend(read_records(path))
+        if not records:
+            return False
+        self.append(call_sid, records)
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def iter_calls(self) -> Iterator[Tuple[str, List[Dict]]]:
+        """Yield (call_sid, records) for every archived call."""
+        with self._lock:
+            call_sids = [row[0] for row in self._conn.execute("SELECT call_sid FROM archived_calls")]
+        for call_sid in call_sids:
+            records = self.read(call_sid)
+            if records:
+                yield call_sid, records
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM archived_calls"
+            ).fetchone()
+        return {"calls": calls, "compressed_bytes": stored}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def loose_logs(logs_dir: str) -> Dict[str, List[str]]:
+    """Group the per-call .jsonl/.json logs in logs_dir by call_sid."""
+    calls: Dict[str, List[str]] = {}
+    with os.scandir(logs_dir) as entries:
+        for entry in entries:
+            call_sid, ext = os.path.splitext(entry.name)
+            if entry.is_file() and ext in ('.json', '.jsonl'):
+                calls.setdefault(call_sid, []).append(entry.path)
+    # Legacy JSON before JSONL, so records stay in order
+    return {call_sid: sorted(paths, key=lambda path: path.endswith('.jsonl')) for call_sid, paths in calls.items()}
+
+
+def migrate(logs_dir: str, archive: TranscriptArchive, include_open_after: Optional[timedelta] = None, dry_run: bool = False) -> Dict:
+    """Archive the completed calls among the loose logs in logs_dir.
+
+    Calls without an end record are left alone, unless their log has not
+    been touched for include_open_after (calls whose final status never
+    arrived).
+    """
+    result = {"archived": 0, "skipped_open": 0, "errors": 0, "bytes_before": 0, "bytes_after": 0}
+    now = time.time()
+    for call_sid, paths in loose_logs(logs_dir).items():
+        try:
+            records = [record for path in paths for record in read_records(path)]
+            # Records logged after a call was archived are merged into it like a finished call
+            ended = archive.contains(call_sid) or any(record.get('type') == 'end' for record in records)
+            idle = now - max(os.path.getmtime(path) for path in paths)
+            if not ended and (include_open_after is None or idle < include_open_after.total_seconds()):
+                result["skipped_open"] += 1
+                continue
+            result["bytes_before"] += sum(os.path.getsize(path) for path in paths)
+            if not dry_run:
+                archive.compact(call_sid, paths)
+            result["archived"] += 1
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error archiving {call_sid}: {e}")
+            result["errors"] += 1
+    result["bytes_after"] = archive.stats()["compressed_bytes"]
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: python -m app.transcript_archive migrate [--logs-dir logs]."""
+    parser = argparse.ArgumentParser(description="Maintain the compressed transcript archive.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Move completed calls' log files into the archive")
+    migrate_parser.add_argument("--logs-dir", default="logs", help="Directory containing <call_sid>.jsonl/.json logs")
+    migrate_parser.add_argument("--archive-dir", default=None, help="Archive directory (default: <logs-dir>/archive)")
+    migrate_parser.add_argument("--include-open-after-hours", type=float, default=None,
+                                help="Also archive calls with no end record whose log is idle this long")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Report what would be archived")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        archive = TranscriptArchive(args.archive_dir or os.path.join(args.logs_dir, 'archive'))
+        include_open_after = timedelta(hours=args.include_open_after_hours) if args.include_open_after_hours else None
+        result = migrate(args.logs_dir, archive, include_open_after, args.dry_run)
+        archive.close()
+        verb = "Would archive" if args.dry_run else "Archived"
+        print(f"{verb} {result['archived']} calls from {args.logs_dir} "
+              f"({result['skipped_open']} still open, {result['errors']} errors); "
+              f"{result['bytes_before']} bytes of logs, archive now {result['bytes_after']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+DURABILITY_MODES = ("async", "fsync", "sync")
+
+
+def replay_records(records: Iterable[Dict]) -> Optional[Dict]:
+    """Rebuild a call's log dict from its JSONL records."""
+    call_data = None
+    for record in records:
+        if call_data is None:
+            # Calls that were never explicitly started begin at their first record
+            call_data = {
+                "start_time": record.get("start_time") or record.get("timestamp") or record.get("end_time"),
+                "customer_number": "unknown",
+                "transcript": []
+            }
+
+        kind = record.get("type")
+        if kind == "start":
+            call_data["start_time"] = record["start_time"]
+            call_data["customer_number"] = record["customer_number"]
+        elif kind == "turn":
+            entry = {
+                "timestamp": record["timestamp"],
+                "user": record["user"],
+                "agent": record["agent"]
+            }
+            if "timings" in record:
+                entry["timings"] = record["timings"]
+            call_data["transcript"].append(entry)
+        elif kind == "end":
+            call_data["end_time"] = record["end_time"]
+            call_data["status"] = record["status"]
+    return call_data
+
+
+def call_records(call_data: Dict) -> List[Dict]:
+    """Turn a legacy call log dict back into the JSONL records that replay to it."""
+    records = [{
+        "type": "start",
+        "start_time": call_data.get("start_time"),
+        "customer_number": call_data.get("customer_number", "unknown")
+    }]
+    for entry in call_data.get("transcript", []):
+        records.append(dict(entry, type="turn"))
+    if "end_time" in call_data:
+        records.append({"type": "end", "end_time": call_data["end_time"], "status": call_data.get("status")})
+    return records
+
+
+def read_records(path: str) -> List[Dict]:
+    """Load the records of a JSONL record file or a legacy JSON file."""
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            # A torn final line (crash mid-write) is skipped rather than failing the whole call
+            records = []
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+            return records
+        return call_records(json.load(f))
+
+
+def read_call_log(path: str) -> Optional[Dict]:
+    """Load a call log from either a JSONL record file or a legacy JSON file."""
+    if path.endswith(".jsonl"):
+        return replay_records(read_records(path))
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class TranscriptWriter:
+    """Write-behind appender for per-call JSONL transcript records.
+
+    Records are queued by the request threads and written by one background
+    thread, which groups everything queued within flush_interval (or up to
+    max_batch records) into one append per call file.
+
+    Durability modes:
+      async - group commit into the OS page cache (default)
+      fsync - group commit followed by fsync of each touched file
+      sync  - like fsync, and append() waits until its record is committed
+    """
+
+    def __init__(
+        self,
+        logs_dir: str = 'logs',
+        flush_interval: float = 0.2,
+        max_batch: int = 256,
+        durability: str = "async",
+        on_call_end: Optional[Callable[[str], None]] = None,
+        on_write: Optional[Callable[[str, float], None]] = None
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_MODES)}")
+
+        self.logs_dir = logs_dir
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.durability = durability
+        # Called on the writer thread once a call's end record is in its file
+        self.on_call_end = on_call_end
+        # Called on the writer thread with each call written and the seconds its write (and fsync) took
+        self.on_write = on_write
+        os.makedirs(logs_dir, exist_ok=True)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+        self.records_written = 0
+        self.commits = 0
+
+    def path(self, call_sid: str) -> str:
+        return os.path.join(self.logs_dir, f"{call_sid}.jsonl")
+
+    def append(self, call_sid: str, record: Dict):
+        """Queue a record for the call's log file."""
+        if self._closed:
+            raise RuntimeError("TranscriptWriter is closed")
+        if self.durability == "sync":
+            committed = threading.Event()
+            self._queue.put((call_sid, record, committed))
+            committed.wait()
+        else:
+            self._queue.put((call_sid, record, None))
+
+    def flush(self, wait: bool = True, timeout: Optional[float] = None) -> bool:
+        """Commit everything queued so far, optionally waiting for it to reach the files."""
+        committed = threading.Event()
+        self._queue.put((None, None, committed))
+        return committed.wait(timeout) if wait else True
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Flush pending records and stop the writer thread."""
+        if self._closed:
+            return
+        self.flush(timeout=timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            # Group commit: gather whatever else arrives within the flush interval
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            # Someone is waiting on this batch, so commit it without waiting out the interval
+            waited_on = item[2] is not None
+            while len(batch) < self.max_batch and not waited_on:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                waited_on = item[2] is not None
+
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch: List):
+        """Append a batch of records to their call files and release any waiters."""
+        by_call: Dict[str, List[str]] = {}
+        ended = []
+        for call_sid, record, _ in batch:
+            if call_sid is not None:
+                by_call.setdefault(call_sid, []).append(json.dumps(record, separators=(',', ':')))
+                if record.get("type") == "end":
+                    ended.append(call_sid)
+
+        for call_sid, lines in by_call.items():
+            started = time.perf_counter()
+            try:
+                with open(self.path(call_sid), "a") as f:
+                    f.write("\n".join(lines) + "\n")
+                    if self.durability != "async":
+                        f.flush()
+                        os.fsync(f.fileno())
+                self.records_written += len(lines)
+            except Exception as e:
+                print(f"Error writing conversation log for {call_sid}: {e}")
+                continue
+            if self.on_write is not None:
+                try:
+                    self.on_write(call_sid, time.perf_counter() - started)
+                except Exception as e:
+                    print(f"Error recording conversation log write for {call_sid}: {e}")
+        self.commits += 1
+
+        if self.on_call_end is not None:
+            for call_sid in ended:
+                try:
+                    self.on_call_end(call_sid)
+                except Exception as e:
+                    print(f"Error finishing conversation log for {call_sid}: {e}")
+
+        for _, _, committed in batch:
+            if committed is not None:
+                committed.set()
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Cache entries are named <key>.<extension>; anything else in the directory is left alone
+KEY_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different spellings of a phrase share one clip."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+class TTSCache:
+    """Content-addressed cache of synthesized speech shared by all calls.
+
+    Clips are keyed by normalized text plus every synthesis parameter, kept on
+    disk under a size-bounded LRU, with a smaller in-memory LRU of hot clips
+    in front of it.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        extension: str = "mp3"
+    ):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.extension = extension
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # Wall-clock time each disk clip was last used, as its LRU position (files are served without being read here)
+        self._used_at: Dict[str, float] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Called with the path of every clip the cache deletes, e.g. to drop what a server remembers about it
+        self.on_evict: Optional[Callable[[str], None]] = None
+
+        self._load_disk_index()
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, model_id: str, voice_settings: Optional[Dict] = None, **params) -> str:
+        """Build the cache key for a phrase and the parameters it is synthesized with."""
+        payload = json.dumps({
+            "text": normalize_text(text),
+            "voice_id": voice_id,
+            "model_id": model_id,
+            "voice_settings": voice_settings or {},
+            **params
+        }, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def filename(self, key: str) -> str:
+        return f"{key}.{self.extension}"
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, self.filename(key))
+
+    def _load_disk_index(self):
+        """Rebuild the on-disk LRU from existing cache files, oldest first."""
+        entries = []
+        for filename in os.listdir(self.directory):
+            key, ext = os.path.splitext(filename)
+            if ext == f".{self.extension}" and KEY_PATTERN.match(key):
+                stat = os.stat(os.path.join(self.directory, filename))
+                entries.append((stat.st_mtime, key, stat.st_size))
+
+        for mtime, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+            self._used_at[key] = mtime
+        self._evict_disk()
+
+    def _remember(self, key: str, audio: bytes):
+        """Put a clip in the memory tier. Caller must hold the lock."""
+        if len(audio) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _touch(self, key: str):
+        """Mark a disk clip as just used. Caller must hold the lock."""
+        self._disk.move_to_end(key)
+        self._used_at[key] = time.time()
+
+    def _forget_disk(self, key: str):
+        """Drop a clip from the disk index. Caller must hold the lock."""
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+        self._used_at.pop(key, None)
+
+    def _evict_disk(self) -> List[str]:
+        """Delete least recently used clips until the disk tier fits its quota; returns their paths. Caller must hold the lock."""
+        evicted_paths = []
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._used_at.pop(key, None)
+            evicted = self._memory.pop(key, None)
+            if evicted is not None:
+                self._memory_bytes -= len(evicted)
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            self.evictions += 1
+            evicted_paths.append(self.path(key))
+        return evicted_paths
+
+    def _notify_evicted(self, paths: List[str]):
+        if self.on_evict is not None:
+            for path in paths:
+                self.on_evict(path)
+
+    def _lookup(self, key: str):
+        """Return (audio, tier) for a cached clip, or (None, None)."""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._touch(key)
+                return audio, "memory"
+            if key not in self._disk:
+                return None, None
+
+        try:
+            with open(self.path(key), "rb") as f:
+                audio = f.read()
+            # Keep the file's mtime in step with its LRU position across restarts
+            os.utime(self.path(key))
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)
+            return None, None
+
+        with self._lock:
+            if key in self._disk:
+                self._touch(key)
+            self._remember(key, audio)
+        return audio, "disk"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Look up a clip for synthesis, counting the hit or miss."""
+        audio, tier = self._lookup(key)
+        with self._lock:
+            if tier == "memory":
+                self.memory_hits += 1
+            elif tier == "disk":
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        return audio
+
+    def read(self, key: str) -> Optional[bytes]:
+        """Read a clip for playback without affecting the hit/miss counters."""
+        return self._lookup(key)[0]
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def locate(self, key: str) -> Optional[str]:
+        """Return the path of a cached clip so it can be served from the file, marking it recently used."""
+        with self._lock:
+            if key not in self._disk:
+                return None
+            self._touch(key)
+        return self.path(key)
+
+    def last_used(self, key: str) -> Optional[float]:
+        """When a disk clip was last used (time.time()), or None if it is not cached."""
+        with self._lock:
+            return self._used_at.get(key)
+
+    def discard(self, key: str, keep_hot: bool = True) -> bool:
+        """Delete a clip from both tiers; a clip in the memory tier is kept if keep_hot."""
+        with self._lock:
+            if keep_hot and key in self._memory:
+                return False
+            evicted = self._memory.pop(key, None)
+            if evicted is not None:
+                self._memory_bytes -= len(evicted)
+            self._forget_disk(key)
+            self.evictions += 1
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+        self._notify_evicted([self.path(key)])
+        return True
+
+    def put(self, key: str, audio: bytes) -> str:
+        """Store a synthesized clip and return its path."""
+        path = self.path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(audio)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._forget_disk(key)
+            self._disk[key] = len(audio)
+            self._disk_bytes += len(audio)
+            self._used_at[key] = time.time()
+            self._remember(key, audio)
+            evicted = self._evict_disk()
+        self._notify_evicted(evicted)
+        return path
+
+    async def get_or_synthesize(self, key: str, synthesize: Callable[[], Awaitable[Optional[bytes]]]) -> Optional[bytes]:
+        """Return a cached clip, synthesizing it once even if many calls ask at the same time."""
+        audio = self.get(key)
+        if audio is not None:
+            return audio
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            audio = await synthesize()
+            if audio:
+                await asyncio.to_thread(self.put, key, audio)
+            return audio
+        finally:
+            # Callers waiting on a failed or cancelled synthesis get no audio and fall back
+            if not future.done():
+                future.set_result(audio or None)
+            del self._in_flight[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_clips": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_clips": len(self._disk),
+                "disk_bytes": self._disk_bytes
+            }
@@ -0,0 +1,242 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .metrics import Histogram
+from .provider_limits import WAIT_BUCKETS
+from .speech_pipeline import stream_speech
+
+_END = object()
+
+
+class PipelineMetrics:
+    """Queue depths and waits of every call's turn pipeline."""
+
+    def __init__(self):
+        self.turns = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.queued = {"stt": 0, "llm": 0}
+        self.waits = {"stt": Histogram(WAIT_BUCKETS), "llm": Histogram(WAIT_BUCKETS)}
+
+    def to_dict(self) -> Dict:
+        return {
+            "turns": self.turns,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "queued": dict(self.queued),
+            "avg_wait_seconds": {
+                stage: round(histogram.sum / histogram.count, 4) if histogram.count else 0.0
+                for stage, histogram in self.waits.items()
+            },
+            "p95_wait_seconds": {stage: histogram.quantile(0.95) for stage, histogram in self.waits.items()}
+        }
+
+
+pipeline_metrics = PipelineMetrics()
+
+
+class Turn:
+    """One utterance moving through a TurnPipeline."""
+
+    def __init__(self, audio: Optional[bytes], transcript: Optional[str], max_segments: int, on_end: Callable = None):
+        self.audio = audio
+        self.transcript = transcript
+        self.transcribed: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.output: asyncio.Queue = asyncio.Queue(maxsize=max_segments)
+        self.task: Optional[asyncio.Task] = None
+        self.cancelled = False
+        self.finished = False
+        self.ended = False
+        self.queued_at = time.perf_counter()
+        self._on_end = on_end
+
+    async def segments(self) -> AsyncIterator[Dict]:
+        """Yield the reply's {"index", "text", "audio"} segments in spoken order."""
+        try:
+            while True:
+                item = await self.output.get()
+                if item is _END:
+                    self.finished = True
+                    return
+                if isinstance(item, BaseException):
+                    self.finished = True
+                    raise item
+                yield item
+        finally:
+            # A consumer that stops early (or is cancelled) abandons the rest of the turn
+            if not self.finished:
+                self.cancel()
+
+    def cancel(self):
+        self.cancelled = True
+        if not self.transcribed.done():
+            self.transcribed.cancel()
+        if self.task is not None:
+            self.task.cancel()
+
+    def end(self, error: Optional[BaseException] = None):
+        """Mark the reply complete; the consumer sees the error, if any, after the segments before it."""
+        if self.ended:
+            return
+        self.ended = True
+        if self._on_end is not None:
+            self._on_end(self)
+        if not self.transcribed.done():
+            self.transcribed.set_result(self.transcript or "")
+        try:
+            self.output.put_nowait(error or _END)
+        except asyncio.QueueFull:
+            # Only reachable once the consumer is gone, since the generator awaits each put
+            pass
+
+
+class TurnPipeline:
+    """Runs a call's turns through STT, LLM and TTS stages joined by bounded queues.
+
+    Each stage works on a different turn at once: the next utterance can be
+    transcribed while the previous reply is still being generated, and each
+    reply is synthesized phrase by phrase while it is generated. Turns keep
+    their order, so the agent's history stays consistent. Bounded queues make
+    a caller that outpaces the stages wait in submit() rather than pile up
+    work, and the provider limiters inside transcribe, respond and synthesize
+    share each API's capacity fairly between calls.
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[bytes], Awaitable[str]],
+        respond: Callable[[str], AsyncIterator[str]],
+        synthesize: Callable[[str], Awaitable[Optional[str]]],
+        max_pending_turns: int = 2,
+        max_phrases_ahead: int = 3,
+        metrics: Optional[PipelineMetrics] = None
+    ):
+        self.transcribe = transcribe
+        self.respond = respond
+        self.synthesize = synthesize
+        self.max_pending_turns = max_pending_turns
+        self.max_phrases_ahead = max_phrases_ahead
+        self.metrics = metrics or pipeline_metrics
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stt_queue: Optional[asyncio.Queue] = None
+        self._llm_queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Turns submitted but not yet ended, so close() can release their consumers
+        self._open_turns = set()
+        self._closed = False
+
+    def _start(self):
+        self._loop = asyncio.get_running_loop()
+        self._stt_queue = asyncio.Queue(maxsize=self.max_pending_turns)
+        self._llm_queue = asyncio.Queue(maxsize=self.max_pending_turns)
+        self._workers = [
+            asyncio.ensure_future(self._stt_worker()),
+            asyncio.ensure_future(self._llm_worker())
+        ]
+
+    async def submit(self, audio: Optional[bytes] = None, transcript: Optional[str] = None) -> Turn:
+        """Queue a turn from caller audio (or an existing transcript), waiting while the pipeline is full."""
+        if self._closed:
+            raise RuntimeError("Turn pipeline is closed")
+        if not self._workers:
+            self._start()
+        turn = Turn(audio, transcript, self.max_phrases_ahead, on_end=self._open_turns.discard)
+        self._open_turns.add(turn)
+        self.metrics.turns += 1
+        self.metrics.queued["stt"] += 1
+        try:
+            await self._stt_queue.put(turn)
+        except asyncio.CancelledError:
+            self.metrics.queued["stt"] -= 1
+            raise
+        return turn
+
+    async def _take(self, queue: asyncio.Queue, stage: str) -> Turn:
+        turn = await queue.get()
+        self.metrics.queued[stage] -= 1
+        self.metrics.waits[stage].observe(time.perf_counter() - turn.queued_at)
+        return turn
+
+    async def _stt_worker(self):
+        while True:
+            turn = await self._take(self._stt_queue, "stt")
+            if turn.cancelled:
+                self.metrics.cancelled += 1
+                turn.end()
+                continue
+            if turn.transcript is None:
+                try:
+                    turn.transcript = await self.transcribe(turn.audio)
+                except Exception as e:
+                    print(f"Error transcribing turn: {e}")
+                    turn.transcript = ""
+                # The audio is no longer needed once transcribed
+                turn.audio = None
+            if not turn.transcribed.done():
+                turn.transcribed.set_result(turn.transcript)
+            if not turn.transcript:
+                turn.end()
+                continue
+            turn.queued_at = time.perf_counter()
+            self.metrics.queued["llm"] += 1
+            await self._llm_queue.put(turn)
+
+    async def _llm_worker(self):
+        while True:
+            turn = await self._take(self._llm_queue, "llm")
+            if turn.cancelled:
+                self.metrics.cancelled += 1
+                turn.end()
+                continue
+            turn.task = asyncio.ensure_future(self._generate(turn))
+            try:
+                # Waits without propagating the turn's own cancellation to the worker
+                await asyncio.wait([turn.task])
+            except asyncio.CancelledError:
+                turn.task.cancel()
+                raise
+            if turn.task.cancelled():
+                self.metrics.cancelled += 1
+                turn.end()
+
+    async def _generate(self, turn: Turn):
+        """Generate and synthesize one reply, handing segments to the consumer as they are ready."""
+        try:
+            async for segment in stream_speech(self.respond(turn.transcript), self.synthesize, max_in_flight=self.max_phrases_ahead):
+                await turn.output.put(segment)
+            turn.end()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.metrics.failed += 1
+            turn.end(e)
+
+    def _cancel_all(self):
+        for worker in self._workers:
+            worker.cancel()
+        for queue, stage in ((self._stt_queue, "stt"), (self._llm_queue, "llm")):
+            while queue is not None and not queue.empty():
+                queue.get_nowait()
+                self.metrics.queued[stage] -= 1
+        # Anyone still waiting on a turn gets an error rather than waiting forever
+        for turn in list(self._open_turns):
+            turn.cancel()
+            turn.end(RuntimeError("Turn pipeline is closed"))
+
+    def close(self):
+        """Stop the stages and drop queued turns; safe to call from any thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._cancel_all()
+        else:
+            self._loop.call_soon_threadsafe(self._cancel_all)
@@ -1,107 +1,182 @@
 
-from flask import Flask, request, jsonify, render_template, redirect, url_for, send_file
+from flask import Flask, Response, request, jsonify, render_template, redirect, url_for
 from app.agent import SalesAgent
+from app.audio_assets import AudioAssets, AudioCollector
+from app.campaigns import CampaignEngine
 from app.conversation_logger import ConversationLogger
+from app.conversation_registry import OutboundCallError, RegistryFullError
+from app.event_bus import KEEPALIVE_SECONDS, events, format_sse
+from app.http_client import get_pool_metrics
+from app.deepgram_stream import streaming_metrics
+from app.media_stream import MEDIA_STREAM_PATH, barge_in_metrics
+from app.metrics import STAGES, render_gauges, stage_metrics
+from app.provider_limits import provider_stats
+from app.turn_pipeline import pipeline_metrics
+from app.speculation import speculation_metrics
+from app.runtime import run_async
 from datetime import datetime
 import os
 import json
 import asyncio
 import base64
+import functools
+import time
 import io
-import hashlib
+from werkzeug.wsgi import wrap_file
 from twilio.twiml.voice_response import VoiceResponse
 from dotenv import load_dotenv
 load_dotenv()
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-AUDIO_RESPONSES_DIR = os.path.join(PROJECT_ROOT, 'audio_responses')
+AUDIO_RESPONSES_DIR = os.getenv("AUDIO_RESPONSES_DIR") or os.path.join(PROJECT_ROOT, 'audio_responses')
 LOGS_DIR = os.path.join(PROJECT_ROOT, 'logs')
 app = Flask(__name__, template_folder='templates')
-agent = SalesAgent()
+agent = SalesAgent(audio_dir=AUDIO_RESPONSES_DIR)
 logger = ConversationLogger()
 
+def close_evicted_call(call_sid, conversation, reason):
+    """Close out the log of a call the registry evicted before its final status arrived."""
+    # With a shared state store only this worker's copy is gone: the call resumes from the store,
+    # and an idle copy here may just mean another worker is taking its turns
+    if agent.state_store.shared:
+        state = agent.state_store.load(call_sid)
+        if state is not None and (reason == "evicted" or time.time() - state.updated_at < agent.active_conversations.ttl_seconds):
+            return
+    # No final status is coming, so a campaign stops waiting on the call's outcome
+    campaigns.abandon(call_sid, reason)
+    logger.log_call_end(call_sid, reason)
+
+agent.active_conversations.on_evict = close_evicted_call
+
+# Twilio statuses after which a call will receive no more webhooks
+TERMINAL_CALL_STATUSES = ["completed", "busy", "failed", "no-answer", "canceled"]
+BUSY_MESSAGE = "Sorry, all of our agents are busy right now. Please call again later."
+
 
 os.makedirs(LOGS_DIR, exist_ok=True)
 os.makedirs(AUDIO_RESPONSES_DIR, exist_ok=True)
 
-def generate_audio_filename(call_sid, text):
-    """Generate a consistent filename for audio responses."""
-    # Use a hash of the call_sid and text to create a unique but consistent filename
-    filename_hash = hashlib.md5(f"{call_sid}_{text}".encode()).hexdigest()
-    return os.path.join(AUDIO_RESPONSES_DIR, f"{call_sid}_{filename_hash}.mp3")
+# Clips are served with validators and long-lived caching, and the directory is kept within its quotas
+audio_assets = AudioAssets(AUDIO_RESPONSES_DIR, agent.tts_cache)
+audio_collector = AudioCollector(
+    AUDIO_RESPONSES_DIR,
+    agent.tts_cache,
+    audio_assets,
+    max_bytes=int(os.getenv("AUDIO_DIR_MAX_MB", 1024)) * 1024 * 1024,
+    max_age_seconds=float(os.getenv("AUDIO_MAX_AGE_DAYS", 30)) * 24 * 3600,
+    interval_seconds=float(os.getenv("AUDIO_GC_INTERVAL_SECONDS", 600))
+)
+audio_collector.start()
+
+# Bulk dial lists, paced (CAMPAIGN_CALLS_PER_SECOND) and capped (CAMPAIGN_MAX_LIVE_CALLS) against the live conversations
+campaigns = CampaignEngine.from_env(agent, on_dial=lambda call_sid, number, campaign: logger.log_call_start(call_sid, number))
+campaigns.start()
+
+# Fixed phrases, pre-rendered with the agent's voice at startup
+NO_SPEECH_MESSAGE = "I'm sorry, I didn't hear anything. Could you please try again?"
+OUTBOUND_GREETING = "Hello! This is Jivus AI. How can I assist you today?"
+CONNECT_ERROR_MESSAGE = "Hello! There was an issue connecting the call."
+
+async def warm_up_speech():
+    """Synthesize the greeting and fallback phrases so calls can play them immediately."""
+    try:
+        phrases = [NO_SPEECH_MESSAGE, OUTBOUND_GREETING, CONNECT_ERROR_MESSAGE]
+        ready = await agent.warm_up(phrases)
+        print(f"Speech warmup complete: {ready} phrases pre-rendered")
+    except Exception as e:
+        print(f"Error during speech warmup: {e}")
+
+def say_or_play(response, text):
+    """Play the pre-rendered clip for text, falling back to Twilio's TTS."""
+    clip = agent.synthesizer.cached_clip(text)
+    if clip:
+        response.play(f"/twilio/audio/{clip}")
+    else:
+        response.say(text)
+
+def timed_turn(view):
+    """Start a new turn for the webhook's call and time the whole request as its webhook stage."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        call_sid = request.values.get("CallSid", "")
+        stage_metrics.begin_turn(call_sid)
+        with stage_metrics.span(call_sid, "webhook"):
+            return view(*args, **kwargs)
+    return wrapper
+
+def latency_breakdown(call_sid, transcript_entries):
+    """Per-turn stage timings in milliseconds, from this worker's metrics or else the transcript log."""
+    turns = stage_metrics.call_breakdown(call_sid)
+    if turns is None:
+        turns = [entry['timings'] for entry in transcript_entries if entry.get('timings')]
+    turns = [turn for turn in turns if turn]
+    rows = [{stage: round(turn[stage] * 1000) if stage in turn else None for stage in STAGES} for turn in turns]
+    averages = {}
+    for stage in STAGES:
+        values = [row[stage] for row in rows if row[stage] is not None]
+        averages[stage] = round(sum(values) / len(values)) if values else None
+    return {'stages': STAGES, 'turns': rows, 'averages': averages}
+
+def format_call_summary(call, default_status='unknown'):
+    """Format an indexed call row for the dashboard tables."""
+    start_time = datetime.fromisoformat(call['start_time'])
+    if call.get('end_time'):
+        duration_str = f"{call['duration_seconds'] / 60:.1f} min"
+    else:
+        duration_str = "In progress"
+
+    return {
+        'sid': call['call_sid'],
+        'number': call['customer_number'],
+        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration': duration_str,
+        'status': call.get('status') or default_status
+    }
+
+def reject_call(call_sid, error):
+    """TwiML that turns the caller away when there is no room for their conversation."""
+    print(f"Rejecting call {call_sid}: {error}")
+    response = VoiceResponse()
+    response.say(BUSY_MESSAGE)
+    response.hangup()
+    return str(response)
+
+async def generate_spoken_response(conversation, user_input):
+    """Stream the agent's response, collecting a cached audio clip for each phrase."""
+    segments = []
+    try:
+        async for segment in conversation.stream_response(user_input):
+            segments.append(segment)
+    except Exception as e:
+        print(f"Error generating speech: {e}")
+    return segments
 
 @app.route("/")
 def dashboard():
     """Render the dashboard page with call statistics."""
-    # Get call statistics
-    total_calls = 0
-    today_calls = 0
-    durations = []
-    recent_calls = []
-    
-    # Iterate through log files
-    if os.path.exists('logs'):
-        for filename in os.listdir('logs'):
-            if filename.endswith('.json'):
-                with open(os.path.join('logs', filename), 'r') as f:
-                    try:
-                        call_data = json.load(f)
-                        total_calls += 1
-                        
-                        # Check if call was today
-                        start_time = datetime.fromisoformat(call_data['start_time'])
-                        if start_time.date() == datetime.now().date():
-                            today_calls += 1
-                        
-                        # Calculate duration if available
-                        if 'end_time' in call_data:
-                            end_time = datetime.fromisoformat(call_data['end_time'])
-                            duration = (end_time - start_time).total_seconds() / 60  # in minutes
-                            durations.append(duration)
-                        
-                        # Add to recent calls
-                        if len(recent_calls) < 10:  # Just show the 10 most recent calls
-                            call_sid = os.path.splitext(filename)[0]
-                            status = call_data.get('status', 'unknown')
-                            
-                            # Format duration
-                            if 'end_time' in call_data:
-                                duration_str = f"{duration:.1f} min"
-                            else:
-                                duration_str = "In progress"
-                            
-                            recent_calls.append({
-                                'sid': call_sid,
-                                'number': call_data['customer_number'],
-                                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                                'duration': duration_str,
-                                'status': status
-                            })
-                    except (json.JSONDecodeError, KeyError) as e:
-                        print(f"Error parsing {filename}: {e}")
-    
-    # Calculate average duration
-    avg_duration = sum(durations) / len(durations) if durations else 0
+    # Counters and recent calls come from the aggregate index, not the log files
+    stats = logger.index.get_stats()
+    page = logger.list_calls(limit=10)
+    recent_calls = [format_call_summary(call) for call in page['calls']]
     
     # Count active calls
     active_now = len(agent.active_conversations)
     
-    # Sort recent calls by start time (newest first)
-    recent_calls.sort(key=lambda x: x['start_time'], reverse=True)
-    
     return render_template('dashboard.html', 
-                           total_calls=total_calls,
-                           today_calls=today_calls,
-                           avg_duration=f"{avg_duration:.1f}",
+                           total_calls=stats['total_calls'],
+                           today_calls=stats['today_calls'],
+                           avg_duration=f"{stats['avg_duration']:.1f}",
                            active_now=active_now,
-                           recent_calls=recent_calls)
+                           recent_calls=recent_calls,
+                           next_cursor=page['next_cursor'])
 
 @app.route("/transcript/<call_sid>")
 def view_transcript(call_sid):
     """Render the transcript page for a specific call."""
     try:
         # Load call data from logs
-        with open(f"logs/{call_sid}.json", 'r') as f:
-            call_data = json.load(f)
+        call_data = logger.get_transcript(call_sid)
+        if call_data is None:
+            raise FileNotFoundError(f"No log found for call {call_sid}")
         
         # Format data for template
         start_time = datetime.fromisoformat(call_data['start_time'])
@@ -130,7 +205,8 @@ def view_transcript(call_sid):
             'date': start_time.strftime('%Y-%m-%d %H:%M:%S'),
             'duration': duration_str,
             'status': status,
-            'transcript': transcript
+            'transcript': transcript,
+            'latency': latency_breakdown(call_sid, call_data.get('transcript', []))
         }
         
         return render_template('transcript.html', call=call)
@@ -148,63 +224,70 @@ def handle_inbound_call():
     logger.log_call_start(call_sid, from_number)
     
     # Get a conversation for this call
-    conversation = agent.get_conversation(call_sid)
+    try:
+        conversation = agent.get_conversation(call_sid, {"customer_number": from_number, "direction": "inbound"})
+    except RegistryFullError as e:
+        return reject_call(call_sid, e)
     
     # Generate response with TwiML
     return str(conversation.respond())
+
+@app.route("/twilio/inbound-stream", methods=["POST"])
+def handle_inbound_stream():
+    """Handle an inbound call over a bidirectional Media Stream (requires the ASGI server)."""
+    call_sid = request.values.get("CallSid", "")
+    from_number = request.values.get("From", "")
+    
+    # Log the call start
+    logger.log_call_start(call_sid, from_number)
+    
+    # Reserve the conversation now so a full server turns the caller away before streaming
+    try:
+        agent.get_conversation(call_sid, {"customer_number": from_number, "direction": "inbound"})
+    except RegistryFullError as e:
+        return reject_call(call_sid, e)
+    
+    # Audio flows over the socket both ways until the call ends; no more webhooks per turn
+    response = VoiceResponse()
+    connect = response.connect()
+    connect.stream(url=f"wss://{request.host}{MEDIA_STREAM_PATH}")
+    return str(response)
+
 @app.route("/twilio/user-input", methods=["POST"])
+@timed_turn
 def handle_user_input():
     """Handle user speech input from Twilio."""
     call_sid = request.values.get("CallSid", "")
     user_input = request.values.get("SpeechResult", "")
     
-    # Get the conversation
-    conversation = agent.get_conversation(call_sid)
-    
-    # Log the user input
-    logger.log_interaction(call_sid, user_input, "Processing...")
+    # Get the conversation; a call reaped while the server is full can't be resumed
+    try:
+        conversation = agent.get_conversation(call_sid)
+    except RegistryFullError as e:
+        return reject_call(call_sid, e)
     
     # Create a TwiML response
     response = VoiceResponse()
     
     if user_input:
-        # Get AI response (blocking for simplicity)
-        ai_response = asyncio.run(conversation.get_response(user_input))
+        # Stream the AI response into speech, phrase by phrase, on the shared event loop
+        segments = run_async(generate_spoken_response(conversation, user_input))
+        ai_response = "".join(segment["text"] for segment in segments)
         
         # Log the AI response
-        logger.log_interaction(call_sid, user_input, ai_response)
-        
-        # Generate a consistent audio filename
-        audio_file_path = generate_audio_filename(call_sid, ai_response)
-        
-        # Only generate audio if file doesn't exist
-        if not os.path.exists(audio_file_path):
-            try:
-                # Generate speech asynchronously
-                audio_base64 = asyncio.run(conversation.synthesize_with_elevenlabs(ai_response))
-                
-                if audio_base64:
-                    # Save the audio 
-                    with open(audio_file_path, "wb") as f:
-                        f.write(base64.b64decode(audio_base64))
-                else:
-                    # Fallback to Twilio's TTS
-                    response.say(ai_response)
-            except Exception as e:
-                print(f"Error generating speech: {e}")
+        logger.log_interaction(call_sid, user_input, ai_response, timings=stage_metrics.current_turn(call_sid))
+        
+        # Queue the segments for playback in order
+        for segment in segments:
+            if segment["clip"]:
+                # Clips are shared across calls through the TTS cache
+                response.play(f"/twilio/audio/{segment['clip']}")
+            elif segment["text"].strip():
                 # Fallback to Twilio's TTS
-                response.say(ai_response)
-        
-        # Play the audio if file exists
-        if os.path.exists(audio_file_path):
-            # Use relative path from audio_responses directory
-            response.play(f"/twilio/audio/{os.path.basename(audio_file_path)}")
-        else:
-            # Fallback to Twilio's TTS
-            response.say(ai_response)
+                response.say(segment["text"].strip())
     else:
         # No speech detected
-        response.say("I'm sorry, I didn't hear anything. Could you please try again?")
+        say_or_play(response, NO_SPEECH_MESSAGE)
     
     # Add another gather for continuous conversation
     gather = response.gather(
@@ -215,33 +298,31 @@ def handle_user_input():
     )
     
     return str(response)
-'''
-@app.route("/twilio/audio/<filename>")
-def serve_audio(filename):
-    """Serve synthesized audio files."""
-    try:
-        return send_file(f"audio_responses/{filename}", mimetype="audio/mpeg")
-    except Exception as e:
-        print(f"Error serving audio file: {e}")
-        return "", 404
-'''
-@app.route("/twilio/audio/<filename>")
+
+@app.route("/twilio/audio/<filename>", methods=["GET", "HEAD"])
 def serve_audio(filename):
-    """Serve synthesized audio files."""
+    """Serve synthesized audio files, with ETags, 304s and byte ranges (see AudioAssets)."""
     try:
-        # Validate filename to prevent directory traversal
-        safe_filename = os.path.basename(filename)
-        file_path = os.path.join(AUDIO_RESPONSES_DIR, safe_filename)
-        
-        if not os.path.exists(file_path):
-            print(f"Audio file not found: {file_path}")
-            return "", 404
-        
-        return send_file(file_path, mimetype="audio/mpeg")
+        asset = audio_assets.respond(filename, {key.lower(): value for key, value in request.headers.items()})
+        if asset.path is None or request.method == "HEAD":
+            return Response(status=asset.status, headers=asset.headers)
+        try:
+            if asset.status == 200:
+                # The server's wsgi.file_wrapper (sendfile under gunicorn) sends the whole file without copying it
+                body = wrap_file(request.environ, open(asset.path, "rb"))
+            else:
+                body = asset.read()
+        except OSError:
+            # Deleted (e.g. by the collector) since respond() looked at it
+            asset = audio_assets.vanished(asset)
+            return Response(status=asset.status, headers=asset.headers)
+        return Response(body, status=asset.status, headers=asset.headers, direct_passthrough=True)
     except Exception as e:
         print(f"Error serving audio file: {e}")
         return "", 404
+
 @app.route("/twilio/audio-webhook", methods=["POST"])
+@timed_turn
 def handle_audio_webhook():
     """Handle audio data from Twilio for processing with Deepgram."""
     try:
@@ -252,78 +333,130 @@ def handle_audio_webhook():
             return jsonify({"error": "Missing required parameters"}), 400
         
         # Get the conversation
-        if call_sid not in agent.active_conversations:
+        conversation = agent.active_conversations.get(call_sid)
+        if conversation is None:
             return jsonify({"error": "No active conversation found"}), 404
         
-        conversation = agent.active_conversations[call_sid]
-        
-        # Process the speech
-        result = asyncio.run(conversation.process_speech_input(audio_base64))
+        # Decode the form field once; the rest of the pipeline passes raw bytes
+        result = run_async(conversation.process_speech_input(base64.b64decode(audio_base64)))
         
         if not result["success"]:
             return jsonify({"error": "Failed to process speech"}), 500
         
         # Log the interaction
-        logger.log_interaction(call_sid, result["transcript"], result["response_text"])
+        logger.log_interaction(call_sid, result["transcript"], result["response_text"], timings=stage_metrics.current_turn(call_sid))
         
         # Return the response
         return jsonify({
             "success": True,
             "transcript": result["transcript"],
             "response_text": result["response_text"],
-            "response_audio": result["response_audio"]
+            # Phone-ready clips, served (and cached by Twilio) from /twilio/audio
+            "response_audio_urls": [f"/twilio/audio/{clip}" for clip in result["response_clips"]]
         })
     
     except Exception as e:
         print(f"Error handling audio webhook: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/search")
+def search_transcripts():
+    """Full-text search over call transcripts, best matching calls first."""
+    try:
+        found = logger.index.search(
+            request.args.get('q', ''),
+            limit=min(int(request.args.get('limit', 20)), 100),
+            offset=int(request.args.get('offset', 0)),
+            status=request.args.get('status'),
+            start_from=request.args.get('from'),
+            start_to=request.args.get('to'),
+            speaker=request.args.get('speaker')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(found)
+
 @app.route("/status")
 def get_status():
     """Get current status for dashboard updates."""
     active_calls = len(agent.active_conversations)
     
-    # Get recent calls for real-time updates
-    recent_calls = []
-    
-    if os.path.exists('logs'):
-        log_files = sorted(
-            [f for f in os.listdir('logs') if f.endswith('.json')],
-            key=lambda x: os.path.getmtime(os.path.join('logs', x)),
-            reverse=True
-        )[:10]  # Get 10 most recent logs
-        
-        for filename in log_files:
-            with open(os.path.join('logs', filename), 'r') as f:
-                try:
-                    call_data = json.load(f)
-                    call_sid = os.path.splitext(filename)[0]
-                    
-                    # Calculate duration if available
-                    start_time = datetime.fromisoformat(call_data['start_time'])
-                    if 'end_time' in call_data:
-                        end_time = datetime.fromisoformat(call_data['end_time'])
-                        duration = (end_time - start_time).total_seconds() / 60  # in minutes
-                        duration_str = f"{duration:.1f} min"
-                        status = call_data.get('status', 'completed')
-                    else:
-                        duration_str = "In progress"
-                        status = "in-progress"
-                    
-                    recent_calls.append({
-                        'sid': call_sid,
-                        'number': call_data['customer_number'],
-                        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                        'duration': duration_str,
-                        'status': status
-                    })
-                except (json.JSONDecodeError, KeyError) as e:
-                    print(f"Error parsing {filename}: {e}")
+    # Recent calls come from the index one page at a time, optionally filtered
+    try:
+        page = logger.list_calls(
+            limit=min(int(request.args.get('limit', 10)), 100),
+            cursor=request.args.get('cursor'),
+            status=request.args.get('status'),
+            number=request.args.get('number'),
+            start_from=request.args.get('from'),
+            start_to=request.args.get('to')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    recent_calls = [format_call_summary(call) for call in page['calls']]
     
     return jsonify({
         'active_calls': active_calls,
-        'recent_calls': recent_calls
+        'recent_calls': recent_calls,
+        'next_cursor': page['next_cursor'],
+        'http_pool': get_pool_metrics(),
+        'tts_cache': agent.tts_cache.stats(),
+        'conversations': agent.active_conversations.stats(),
+        'conversation_store': agent.state_store.stats(),
+        'event_stream': events.stats(),
+        'speculation': speculation_metrics.to_dict(),
+        'barge_in': barge_in_metrics.to_dict(),
+        'deepgram_stream': streaming_metrics.to_dict(),
+        'turn_stages': stage_metrics.to_dict(),
+        'turn_pipeline': pipeline_metrics.to_dict(),
+        'providers': provider_stats(),
+        'transcript_archive': logger.archive.stats() if logger.archive else None,
+        'audio_assets': audio_assets.stats(),
+        'audio_gc': audio_collector.stats(),
+        'campaigns': campaigns.stats()
+    })
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Expose turn stage histograms and the /status counters in the Prometheus text format."""
+    body = stage_metrics.render_prometheus() + render_gauges("voice", {
+        'active_calls': len(agent.active_conversations),
+        'http_pool': get_pool_metrics(),
+        'tts_cache': agent.tts_cache.stats(),
+        'conversations': agent.active_conversations.stats(),
+        'conversation_store': agent.state_store.stats(),
+        'event_stream': events.stats(),
+        'speculation': speculation_metrics.to_dict(),
+        'barge_in': barge_in_metrics.to_dict(),
+        'deepgram_stream': streaming_metrics.to_dict(),
+        'turn_pipeline': pipeline_metrics.to_dict(),
+        'providers': provider_stats(),
+        'campaigns': campaigns.stats()
     })
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+def live_event_frame(event):
+    """Encode a bus event for the dashboard, stamped with the current active call count."""
+    if event is not None and event['id'] is not None:
+        event = dict(event, data=dict(event['data'], active_calls=len(agent.active_conversations)))
+    return format_sse(event)
+
+@app.route("/events")
+def event_stream():
+    """Stream live call events to the dashboard as Server-Sent Events."""
+    # Under the ASGI server this path is served on the event loop instead (see app/asgi.py)
+    subscription = events.subscribe()
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                yield live_event_frame(subscription.get(timeout=KEEPALIVE_SECONDS))
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route("/outbound-call", methods=["POST"])
 def make_outbound_call():
@@ -372,6 +505,21 @@ def make_outbound_call():
         except ImportError:
             return jsonify({'success': False, 'error': 'Twilio library not installed'}), 500
         
+        except RegistryFullError as e:
+            return jsonify({'success': False, 'error': str(e)}), 503
+        
+        except OutboundCallError as e:
+            # The call was placed; its webhooks set the conversation up again when it connects
+            print(f"Error making outbound call: {e}")
+            logger.log_call_start(e.call_sid, to_phone)
+            return jsonify({
+                'success': True,
+                'call_sid': e.call_sid,
+                'to_phone': to_phone,
+                'from_phone': from_phone,
+                'warning': str(e)
+            })
+        
         except Exception as e:
             print(f"Error making outbound call: {e}")
             return jsonify({
@@ -388,6 +536,56 @@ def make_outbound_call():
             'details': str(e)
         }), 500
 
+@app.route("/campaigns", methods=["GET", "POST"])
+def campaign_list():
+    """List dialing campaigns, or start one from a JSON dial list."""
+    if request.method == "GET":
+        return jsonify({'campaigns': [campaign.stats() for campaign in campaigns.list_campaigns()],
+                        'engine': campaigns.stats()})
+    
+    data = request.get_json(silent=True) or {}
+    numbers = data.get('numbers')
+    from_phone = data.get('from_phone')
+    if not isinstance(numbers, list) or not numbers or not from_phone:
+        return jsonify({'success': False, 'error': 'from_phone and a non-empty numbers list are required'}), 400
+    invalid = [number for number in [from_phone, *numbers] if not (isinstance(number, str) and number.startswith('+'))]
+    if invalid:
+        return jsonify({'success': False, 'error': 'Phone numbers must be in E.164 format (e.g., +1234567890)',
+                        'invalid': invalid[:20]}), 400
+    if not (os.getenv("TWILIO_ACCOUNT_SID") and os.getenv("TWILIO_AUTH_TOKEN")):
+        return jsonify({'success': False, 'error': 'Twilio credentials are not configured'}), 500
+    
+    try:
+        campaign = campaigns.create(
+            numbers,
+            from_phone,
+            request.host_url.rstrip('/'),
+            name=data.get('name', ''),
+            retry_schedule=data.get('retry')
+        )
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(dict(campaign.stats(), success=True)), 201
+
+@app.route("/campaigns/<campaign_id>", methods=["GET"])
+def campaign_detail(campaign_id):
+    """Progress of one campaign, with per-number state when ?contacts=1."""
+    campaign = campaigns.get(campaign_id)
+    if campaign is None:
+        return jsonify({'error': 'Campaign not found'}), 404
+    return jsonify(campaign.stats(include_contacts=request.args.get('contacts') == '1'))
+
+@app.route("/campaigns/<campaign_id>/<action>", methods=["POST"])
+def campaign_action(campaign_id, action):
+    """Pause, resume or cancel a campaign; calls already in progress carry on."""
+    actions = {'pause': campaigns.pause, 'resume': campaigns.resume, 'cancel': campaigns.cancel}
+    if action not in actions:
+        return jsonify({'error': f'Unknown action: {action}'}), 404
+    campaign = actions[action](campaign_id)
+    if campaign is None:
+        return jsonify({'error': 'Campaign not found'}), 404
+    return jsonify(campaign.stats())
+
 @app.route("/twilio/outbound-connect", methods=["POST", "GET"])
 def handle_outbound_connect():
     """Handle when an outbound call is connected."""
@@ -401,10 +599,10 @@ def handle_outbound_connect():
         conversation = agent.get_conversation(call_sid)
         
         # Get the initial message from the agent
-        initial_message = asyncio.run(conversation.agent.get_initial_message())
+        initial_message = run_async(conversation.agent.get_initial_message())
         
         # Add initial message
-        response.say(initial_message or "Hello! This is Jivus AI. How can I assist you today?")
+        say_or_play(response, initial_message or OUTBOUND_GREETING)
         
         # Add gather to capture user input
         gather = response.gather(
@@ -413,9 +611,12 @@ def handle_outbound_connect():
             speech_timeout="auto"
         )
         
+    except RegistryFullError as e:
+        return reject_call(call_sid, e)
+    
     except Exception as e:
         print(f"Error in outbound connect: {e}")
-        response.say("Hello! There was an issue connecting the call.")
+        say_or_play(response, CONNECT_ERROR_MESSAGE)
     
     return str(response)
 
@@ -427,16 +628,14 @@ def handle_status_update():
         call_sid = request.values.get("CallSid", "")
         
         print(f"Call {call_sid} status updated to {status}")
+        events.publish("call_status", call_sid=call_sid, status=status)
+        
+        # Campaign calls that ended busy or unanswered are scheduled for another attempt
+        campaigns.record_status(call_sid, status)
         
-        if status in ["completed", "failed"]:
-            # End the conversation if it's active
-            if call_sid in agent.active_conversations:
-                # Terminate the conversation
-                conversation = agent.active_conversations[call_sid]
-                conversation.terminate()
-                
-                # Remove from active conversations
-                del agent.active_conversations[call_sid]
+        if status in TERMINAL_CALL_STATUSES:
+            # End the conversation here and drop its shared state
+            agent.end_conversation(call_sid)
             
             # Log the call end
             logger.log_call_end(call_sid, status)
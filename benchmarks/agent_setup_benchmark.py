@@ -0,0 +1,72 @@
+"""Measure per-call agent setup cost with a per-agent Groq client versus the shared one.
+
+No network access is needed; only client and agent construction is timed:
+
+    python -m benchmarks.agent_setup_benchmark --calls 200
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from groq import Groq
+from vocode.streaming.models.message import BaseMessage
+
+from app.groq_agent import GroqAgentConfig, GroqSalesAgent
+from app.llm_client import get_llm_client
+
+
+def make_config():
+    return GroqAgentConfig(
+        initial_message=BaseMessage(text="Hello! Welcome to Jivus AI. How can I assist you today?"),
+        model_name="llama3-70b-8192"
+    )
+
+
+def setup_per_agent_client(config):
+    """The previous behaviour: every call built its own Groq client and connection pool."""
+    agent = GroqSalesAgent(config)
+    return agent, Groq(api_key=os.environ["GROQ_API_KEY"])
+
+
+def setup_shared_client(config):
+    """Current behaviour: the agent only holds history and borrows the process-wide client."""
+    agent = GroqSalesAgent(config)
+    return agent, agent.groq_client
+
+
+def measure(label, setup, calls):
+    config = make_config()
+    tracemalloc.start()
+    started = time.perf_counter()
+    agents = [setup(config) for _ in range(calls)]
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    clients = len({id(client) for _, client in agents})
+    print(f"{label:>16}: {elapsed / calls * 1000:7.3f} ms/call  "
+          f"{peak / calls / 1024:8.1f} KiB/call  {clients} distinct clients")
+
+
+async def run(calls):
+    # Both setups run on the event loop, as they do when a webhook creates a conversation
+    measure("per-agent client", setup_per_agent_client, calls)
+    get_llm_client()  # the shared client is created once per process, outside the per-call cost
+    measure("shared client", setup_shared_client, calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+
+    # Construct a client once so first-use costs don't skew the first run
+    Groq(api_key=os.environ["GROQ_API_KEY"])
+    asyncio.run(run(args.calls))
+
+
+if __name__ == "__main__":
+    main()
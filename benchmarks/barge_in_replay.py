@@ -0,0 +1,262 @@
+"""Simulate a caller talking over the agent on a media stream, with fake providers.
+
+Deepgram, Groq, ElevenLabs and Twilio's playback are all faked in-process,
+so no network access is needed:
+
+    python -m benchmarks.barge_in_replay
+
+The script checks that a reply starts playing while it is still being
+generated, and that the barge-in stops generation and synthesis, clears
+Twilio's buffered audio and leaves only the spoken part of the reply in the
+agent's history.
+"""
+import argparse
+import asyncio
+import time
+
+from app.audio import mulaw_wav
+from app.context_window import ConversationContext
+from app.conversation_registry import ConversationRegistry
+from app.media_stream import BargeInMetrics, MediaStreamSession
+from app.speculation import SpeculativeResponder
+
+GREETING = "Hi!"
+REPLY = "Our plans start at ten dollars a seat. Enterprise adds single sign-on and audit logs. Annual billing saves twenty percent."
+FOLLOW_UP_REPLY = "Yes, we offer volume discounts above fifty seats."
+
+# [seconds after the stream starts, transcript, is_final]
+CALLER_SCRIPT = [
+    [1.0, "tell me about", False], [1.3, "tell me about your pricing", False],
+    [1.5, "tell me about your pricing", False], [1.8, "Tell me about your pricing.", True],
+    # Talks over the reply once its first sentence has played
+    [5.5, "wait", False], [5.8, "wait do you have discounts", False],
+    [6.0, "wait do you have discounts", False], [6.3, "Wait, do you have discounts?", True],
+]
+
+
+class FakeTranscriber:
+    def __init__(self, script):
+        self.script = script
+
+    async def send(self, audio):
+        pass
+
+    async def results(self):
+        started = time.monotonic()
+        for offset, transcript, is_final in self.script:
+            await asyncio.sleep(max(0.0, started + offset - time.monotonic()))
+            yield {"transcript": transcript, "is_final": is_final}
+        # Keep the socket open like Deepgram does until the call ends
+        await asyncio.sleep(3600)
+
+    async def close(self):
+        pass
+
+
+class FakeAgent:
+    """Streams canned replies word by word, recording history like GroqSalesAgent."""
+
+    def __init__(self, token_delay):
+        self.token_delay = token_delay
+        self.context = ConversationContext()
+        self.streams_cancelled = 0
+        self.finished_at = []
+        self.replies = iter([REPLY, FOLLOW_UP_REPLY])
+
+    async def get_initial_message(self):
+        return GREETING
+
+    async def respond(self, human_input, is_interrupt=False):
+        self.context.add("user", human_input)
+        generated = ""
+        try:
+            for word in next(self.replies).split(" "):
+                await asyncio.sleep(self.token_delay)
+                generated += ("" if not generated else " ") + word
+                yield word if generated == word else " " + word
+        except asyncio.CancelledError:
+            self.streams_cancelled += 1
+            raise
+        finally:
+            self.finished_at.append(time.monotonic())
+            if generated:
+                self.context.add("assistant", generated)
+
+    def checkpoint(self):
+        return self.context.snapshot()
+
+    def rollback(self, checkpoint):
+        self.context.restore(checkpoint)
+
+    def amend_last_input(self, text):
+        self.context.replace_last("user", text)
+
+    def truncate_last_response(self, spoken):
+        self.context.truncate_reply(spoken)
+
+
+class FakeConversation:
+    def __init__(self, agent, tts_delay):
+        self.agent = agent
+        self.tts_delay = tts_delay
+        self.call_sid = None
+        self.synthesis_cancelled = 0
+
+    async def open_transcriber(self, encoding, sample_rate):
+        return FakeTranscriber(CALLER_SCRIPT)
+
+    async def respond_to_transcripts(self, results, is_interrupt=False, stream=False):
+        responder = SpeculativeResponder(
+            lambda text: self.agent.respond(text, is_interrupt),
+            checkpoint=self.agent.checkpoint,
+            rollback=self.agent.rollback,
+            amend=self.agent.amend_last_input
+        )
+        return await responder.respond(results, stream=stream)
+
+    async def save_state(self):
+        pass
+
+    async def synthesize_audio(self, text):
+        # The greeting is pre-rendered at startup
+        if text == GREETING:
+            return mulaw_wav(b"\xff" * 1600)
+        try:
+            await asyncio.sleep(self.tts_delay)
+        except asyncio.CancelledError:
+            self.synthesis_cancelled += 1
+            raise
+        # About 15 characters of speech per second of 8 kHz mu-law
+        return mulaw_wav(b"\xff" * int(len(text) / 15 * 8000))
+
+
+class FakeSalesAgent:
+    def __init__(self, conversation):
+        self.conversation = conversation
+        self.active_conversations = ConversationRegistry()
+
+    def get_conversation(self, call_sid):
+        self.active_conversations[call_sid] = self.conversation
+        return self.conversation
+
+
+class FakeLogger:
+    def __init__(self):
+        self.turns = []
+
+    def log_interaction(self, call_sid, user_input, ai_response, timings=None):
+        self.turns.append((user_input, ai_response))
+
+
+class FakeTwilio:
+    """Plays sent audio in real time and reports marks back, as Twilio does."""
+
+    def __init__(self):
+        self.inbound: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.media_at = []
+        self.playback: asyncio.Queue = asyncio.Queue()
+        self.player = asyncio.ensure_future(self.play())
+
+    async def send_message(self, message):
+        self.sent.append(message)
+        if message["event"] == "clear":
+            # Drop buffered audio; the marks behind it are never played
+            self.player.cancel()
+            self.playback = asyncio.Queue()
+            self.player = asyncio.ensure_future(self.play())
+        elif message["event"] == "media":
+            self.media_at.append(time.monotonic())
+            self.playback.put_nowait(("media", len(message["media"]["payload"]) * 3 / 4 / 8000))
+        elif message["event"] == "mark":
+            self.playback.put_nowait(("mark", message["mark"]["name"]))
+
+    async def play(self):
+        while True:
+            kind, value = await self.playback.get()
+            if kind == "media":
+                await asyncio.sleep(value)
+            else:
+                self.inbound.put_nowait({"event": "mark", "mark": {"name": value}})
+
+    async def messages(self, duration):
+        yield {"event": "start", "start": {"callSid": "CAfake", "streamSid": "MZfake"}}
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            try:
+                yield await asyncio.wait_for(self.inbound.get(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+        yield {"event": "stop"}
+
+
+async def run(token_delay, tts_delay, duration):
+    agent = FakeAgent(token_delay)
+    conversation = FakeConversation(agent, tts_delay)
+    logger = FakeLogger()
+    twilio = FakeTwilio()
+    session = MediaStreamSession(FakeSalesAgent(conversation), logger, twilio.send_message)
+    session.metrics = BargeInMetrics()
+
+    await session.run(twilio.messages(duration))
+    twilio.player.cancel()
+
+    for message in agent.context.messages:
+        print(f"  {message['role']:>9}: {message['content']}")
+    print(f"  clears sent: {sum(m['event'] == 'clear' for m in twilio.sent)}  "
+          f"synthesis cancelled: {conversation.synthesis_cancelled}  "
+          f"generation cancelled: {agent.streams_cancelled}  {session.metrics.to_dict()}")
+    assert session.metrics.barge_ins == 1
+    assert sum(m["event"] == "clear" for m in twilio.sent) == 1
+    if tts_delay > 1:
+        # Every phrase still being rendered was abandoned
+        assert conversation.synthesis_cancelled > 0
+    return agent, logger, session, twilio
+
+
+async def interrupt_playback(tts_delay):
+    """The caller talks over the reply after hearing its first sentence."""
+    print("barge-in during playback:")
+    agent, logger, _, twilio = await run(0.1, tts_delay, 10.0)
+    # The reply's first phrase went out (after the greeting) before the reply was fully generated
+    assert twilio.media_at[1] < agent.finished_at[0], (twilio.media_at[1], agent.finished_at[0])
+    history = agent.context.messages
+    assert [m["role"] for m in history] == ["user", "assistant", "user", "assistant"], history
+    # The interrupted reply keeps only what was played before the caller spoke
+    assert REPLY.startswith(history[1]["content"].rstrip(".")), history[1]
+    assert len(history[1]["content"]) < len(REPLY)
+    assert history[3]["content"] == FOLLOW_UP_REPLY
+    assert logger.turns[0][1] == history[1]["content"]
+
+
+async def interrupt_generation(tts_delay):
+    """The caller talks again while a slow LLM is still generating the reply."""
+    print("barge-in during generation:")
+    agent, _, session, _ = await run(0.6, tts_delay, 11.0)
+    history = agent.context.messages
+    # Nothing of the first reply was heard, so none of it stays in the history
+    assert [m["role"] for m in history] == ["user", "user", "assistant"], history
+    assert agent.streams_cancelled == 1
+    assert session.metrics.generation_cancelled == 1
+
+
+async def interrupt_synthesis():
+    """The caller talks again while slow TTS is still rendering the reply."""
+    print("barge-in during synthesis:")
+    agent, _, _, _ = await run(0.01, 4.0, 12.0)
+    history = agent.context.messages
+    assert [m["role"] for m in history] == ["user", "user", "assistant"], history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tts-delay", type=float, default=0.15, help="fake TTS seconds per phrase")
+    args = parser.parse_args()
+    asyncio.run(interrupt_playback(args.tts_delay))
+    asyncio.run(interrupt_generation(args.tts_delay))
+    asyncio.run(interrupt_synthesis())
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
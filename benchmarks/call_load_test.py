@@ -0,0 +1,294 @@
+"""Drive many concurrent synthetic calls through the real Flask routes, end to end.
+
+Groq, ElevenLabs and Deepgram are replaced by a local stub server with
+configurable latency, so no credentials or network access are needed:
+
+    python -m benchmarks.call_load_test --calls 50 --turns 3
+    python -m benchmarks.call_load_test --calls 50 --save-baseline
+    python -m benchmarks.call_load_test --calls 50 --compare
+
+Each call posts /twilio/inbound, then --turns rounds of /twilio/user-input
+(or /twilio/audio-webhook with --audio-webhook, which goes through the
+Deepgram stub), then a completed /twilio/status. The report covers p50/p95/p99
+turn latency, throughput, the average time per turn stage (from app.metrics)
+and the Python heap retained per live conversation (measured with tracemalloc
+in a separate phase, so tracing does not skew the latencies).
+
+--save-baseline writes the results to --baseline; --compare prints the change
+against that file and exits non-zero if p95 turn latency or memory per
+conversation regress by more than --tolerance.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "call_load_baseline.json")
+REPLY = ("Our plans start at ten dollars a seat, and annual billing saves twenty percent. "
+         "Would you like me to email you the details?")
+QUESTIONS = ["pricing", "the enterprise plan", "single sign-on", "volume discounts", "a free trial"]
+
+
+class ProviderStub(BaseHTTPRequestHandler):
+    """Answers Groq chat completions, ElevenLabs TTS and Deepgram pre-recorded requests."""
+
+    protocol_version = "HTTP/1.1"
+    llm_first_token = 0.2
+    llm_token_delay = 0.005
+    tts_latency = 0.15
+    stt_latency = 0.1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/openai/v1/chat/completions"):
+            self.chat_completion(json.loads(body))
+        elif self.path.startswith("/v1/text-to-speech/"):
+            self.text_to_speech(json.loads(body)["text"])
+        elif self.path.startswith("/v1/listen"):
+            time.sleep(self.stt_latency)
+            self.send_body("application/json", json.dumps({"results": {"channels": [
+                {"alternatives": [{"transcript": "Tell me about your pricing.", "confidence": 0.99}]}
+            ]}}).encode())
+        else:
+            self.send_body("application/json", b"{}", status=404)
+
+    def send_body(self, content_type, body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def chat_completion(self, request):
+        # Like a real completion: the first sentence answers the question, the rest is boilerplate
+        question = request["messages"][-1]["content"].rstrip("?.! ")
+        text = f"Thanks for asking about {question.split('about ')[-1]}. {REPLY}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(self.llm_first_token)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                             "finish_reason": "stop" if i == len(words) - 1 else None}]
+            }
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(self.llm_token_delay)
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def text_to_speech(self, text):
+        time.sleep(self.tts_latency)
+        # About 15 characters of speech per second of 16-bit PCM at the requested rate
+        output_format = self.path.partition("output_format=")[2]
+        sample_rate = int(output_format.split("_")[-1]) if output_format.startswith("pcm_") else 22050
+        self.send_body("application/octet-stream", b"\x10\x00\xf0\xff" * int(len(text) / 15 * sample_rate / 2))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_provider_stub(args):
+    ProviderStub.llm_first_token = args.llm_first_token
+    ProviderStub.llm_token_delay = args.llm_token_delay
+    ProviderStub.tts_latency = args.tts_latency
+    ProviderStub.stt_latency = args.stt_latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProviderStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure_environment(stub_url, workdir):
+    """Point the app at the stub and keep its logs and clips out of the project tree."""
+    os.environ.update({
+        "GROQ_BASE_URL": stub_url,
+        "ELEVENLABS_API_URL": f"{stub_url}/v1",
+        "DEEPGRAM_API_URL": f"{stub_url}/v1/listen",
+        "AUDIO_RESPONSES_DIR": os.path.join(workdir, "audio_responses")
+    })
+    for name in ["GROQ_API_KEY", "DEEPGRAM_API_KEY", "ELEVEN_LABS_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN"]:
+        os.environ.setdefault(name, "stub")
+    # The conversation logger writes under ./logs
+    os.chdir(workdir)
+
+
+def recording():
+    """One second of silence as a base64 WAV, like a Twilio recording."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\x00\x00" * 8000)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoadTest:
+    def __init__(self, app, turns, audio_webhook, ramp):
+        self.app = app
+        self.turns = turns
+        self.audio_webhook = audio_webhook
+        self.ramp = ramp
+        self.recording = recording()
+        self.turn_latencies = []
+        self.inbound_latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def post(self, client, path, data, latencies=None):
+        started = time.perf_counter()
+        response = client.post(path, data=data)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if response.status_code != 200:
+                self.errors += 1
+            elif latencies is not None:
+                latencies.append(elapsed)
+        return response
+
+    def call(self, index):
+        client = self.app.test_client()
+        call_sid = f"CAload{index:028d}"
+        time.sleep(index * self.ramp)
+        self.post(client, "/twilio/inbound", {"CallSid": call_sid, "From": f"+1555{index:07d}"}, self.inbound_latencies)
+        for turn in range(self.turns):
+            if self.audio_webhook:
+                self.post(client, "/twilio/audio-webhook",
+                          {"CallSid": call_sid, "RecordingData": self.recording}, self.turn_latencies)
+            else:
+                question = QUESTIONS[(index + turn) % len(QUESTIONS)]
+                self.post(client, "/twilio/user-input",
+                          {"CallSid": call_sid, "SpeechResult": f"Can you tell me about {question}?"}, self.turn_latencies)
+        self.post(client, "/twilio/status", {"CallSid": call_sid, "CallStatus": "completed"})
+
+    def run(self, calls):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=calls) as pool:
+            list(pool.map(self.call, range(calls)))
+        return time.perf_counter() - started
+
+
+def measure_memory(app, agent, calls):
+    """Python heap retained per live conversation (after its inbound webhook and one turn)."""
+    client = app.test_client()
+    call_sids = [f"CAmem{index:029d}" for index in range(calls)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for index, call_sid in enumerate(call_sids):
+        client.post("/twilio/inbound", data={"CallSid": call_sid, "From": f"+1555{index:07d}"})
+        client.post("/twilio/user-input", data={"CallSid": call_sid, "SpeechResult": "Tell me about pricing."})
+    live = len(agent.active_conversations)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for call_sid in call_sids:
+        client.post("/twilio/status", data={"CallSid": call_sid, "CallStatus": "completed"})
+    return retained / max(live, 1)
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against the baseline; returns False if a tracked metric regressed."""
+    ok = True
+    for key in ["turn_p50", "turn_p95", "turn_p99", "turns_per_second", "bytes_per_conversation"]:
+        old, new = baseline.get(key), results[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        # Throughput regresses when it drops; everything else when it grows
+        regressed = (-change if key == "turns_per_second" else change) > tolerance
+        tracked = key in ("turn_p95", "bytes_per_conversation", "turns_per_second")
+        flag = "REGRESSED" if regressed and tracked else ""
+        print(f"  {key:>24}: {old:12.4f} -> {new:12.4f}  ({change:+.1%}) {flag}")
+        ok = ok and not (regressed and tracked)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50, help="concurrent calls")
+    parser.add_argument("--turns", type=int, default=3, help="turns per call")
+    parser.add_argument("--ramp", type=float, default=0.01, help="seconds between call starts")
+    parser.add_argument("--audio-webhook", action="store_true", help="send recordings through Deepgram instead of SpeechResult")
+    parser.add_argument("--llm-first-token", type=float, default=0.2)
+    parser.add_argument("--llm-token-delay", type=float, default=0.005)
+    parser.add_argument("--tts-latency", type=float, default=0.15)
+    parser.add_argument("--stt-latency", type=float, default=0.1)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed regression before --compare fails")
+    args = parser.parse_args()
+    baseline_path = os.path.abspath(args.baseline)
+
+    stub = start_provider_stub(args)
+    configure_environment(f"http://127.0.0.1:{stub.server_port}", tempfile.mkdtemp(prefix="call-load-"))
+    from app.metrics import stage_metrics
+    from app.runtime import run_async
+    from app.twilio_server import agent, app, warm_up_speech
+
+    run_async(warm_up_speech())
+    test = LoadTest(app, args.turns, args.audio_webhook, args.ramp)
+    elapsed = test.run(args.calls)
+    bytes_per_conversation = measure_memory(app, agent, args.calls)
+    stub.shutdown()
+
+    turns = test.turn_latencies
+    results = {
+        "calls": args.calls,
+        "turns_per_call": args.turns,
+        "route": "audio-webhook" if args.audio_webhook else "user-input",
+        "stub_latency": {"llm_first_token": args.llm_first_token, "llm_token_delay": args.llm_token_delay,
+                         "tts": args.tts_latency, "stt": args.stt_latency},
+        "errors": test.errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "inbound_p50": round(percentile(test.inbound_latencies, 0.5), 4),
+        "turn_p50": round(percentile(turns, 0.5), 4),
+        "turn_p95": round(percentile(turns, 0.95), 4),
+        "turn_p99": round(percentile(turns, 0.99), 4),
+        "turns_per_second": round(len(turns) / elapsed, 2),
+        "calls_per_second": round(args.calls / elapsed, 2),
+        "bytes_per_conversation": round(bytes_per_conversation),
+        # Where the turn time went, from the app's own stage histograms
+        "stage_avg_seconds": {stage: values["avg"] for stage, values in stage_metrics.to_dict().items()}
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {baseline_path}")
+    if args.compare:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        print(f"compared with {baseline_path}:")
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
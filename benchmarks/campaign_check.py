@@ -0,0 +1,172 @@
+"""Run a dialing campaign against a fake Twilio REST client, checking pacing, the live call cap and retries.
+
+The fake answers calls.create after --api-latency, then reports each call's
+outcome (busy, no-answer or completed after --talk-seconds) the way the
+status webhook would. Some calls fail with a status callback that arrives
+before calls.create returns (--early), and some never get a final status
+and are left for the registry's reaper (--lost). The real
+SalesAgent.make_outbound_call and a real ConversationRegistry sit between
+the engine and the fake, so no credentials or network access are needed:
+
+    python -m benchmarks.campaign_check
+    python -m benchmarks.campaign_check --numbers 500 --cps 50 --max-live 40 --talk-seconds 0.5
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from app.agent import SalesAgent
+from app.campaigns import CampaignEngine
+from app.conversation_registry import ConversationRegistry
+
+
+class FakeCalls:
+    """Stands in for client.calls: records when calls are placed and how many are live."""
+
+    def __init__(self, api_latency, talk_seconds, busy_ratio, no_answer_ratio, early_ratio, lost_ratio, seed):
+        self.api_latency = api_latency
+        self.talk_seconds = talk_seconds
+        self.busy_ratio = busy_ratio
+        self.no_answer_ratio = no_answer_ratio
+        self.early_ratio = early_ratio
+        self.lost_ratio = lost_ratio
+        self.random = random.Random(seed)
+        self.on_status = None
+
+        self._lock = threading.Lock()
+        self._sids = itertools.count()
+        self.created = []
+        self.live = 0
+        self.max_live = 0
+
+    def create(self, to, from_, url, status_callback):
+        time.sleep(self.api_latency)
+        with self._lock:
+            sid = f"CA{next(self._sids):032d}"
+            self.created.append(time.monotonic())
+            self.live += 1
+            self.max_live = max(self.max_live, self.live)
+            roll = self.random.random()
+        if roll < self.early_ratio:
+            # Twilio rejected the call and its callback beat this response
+            self.finish(sid, "failed")
+            return SimpleNamespace(sid=sid)
+        roll -= self.early_ratio
+        if roll < self.lost_ratio:
+            # The call ends, but its status callback never arrives
+            threading.Timer(self.talk_seconds, self.finish, (sid, None)).start()
+            return SimpleNamespace(sid=sid)
+        roll -= self.lost_ratio
+        if roll < self.busy_ratio:
+            status, after = "busy", self.api_latency
+        elif roll < self.busy_ratio + self.no_answer_ratio:
+            status, after = "no-answer", self.talk_seconds / 2
+        else:
+            status, after = "completed", self.talk_seconds
+        threading.Timer(after, self.finish, (sid, status)).start()
+        return SimpleNamespace(sid=sid)
+
+    def finish(self, sid, status):
+        with self._lock:
+            self.live -= 1
+        if status is not None:
+            self.on_status(sid, status)
+
+    def max_per_second(self):
+        """The most calls placed within any one-second window."""
+        window, most = deque(), 0
+        for created in self.created:
+            window.append(created)
+            while created - window[0] >= 1.0:
+                window.popleft()
+            most = max(most, len(window))
+        return most
+
+
+class StubAgent:
+    """The parts of SalesAgent a campaign uses, with the real make_outbound_call and a fake Twilio client."""
+
+    make_outbound_call = SalesAgent.make_outbound_call
+
+    def __init__(self, calls, max_live, ttl_seconds):
+        self.twilio_client = SimpleNamespace(calls=calls)
+        self.active_conversations = ConversationRegistry(
+            ttl_seconds=ttl_seconds, max_live=max_live, overflow_policy="reject", reap_interval=ttl_seconds / 4
+        )
+        self.active_conversations.start_reaper()
+
+    def get_conversation(self, call_sid, metadata=None, reserved=False):
+        conversation = SimpleNamespace(call_sid=call_sid, metadata=metadata or {}, terminate=lambda: None)
+        self.active_conversations.add(call_sid, conversation, reserved=reserved)
+        return conversation
+
+    def end_conversation(self, call_sid):
+        self.active_conversations.pop(call_sid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--numbers", type=int, default=200)
+    parser.add_argument("--cps", type=float, default=20, help="Calls per second to pace dials at")
+    parser.add_argument("--max-live", type=int, default=25, help="Cap on concurrent live calls")
+    parser.add_argument("--dial-workers", type=int, default=8)
+    parser.add_argument("--api-latency", type=float, default=0.15, help="Seconds the fake takes to answer calls.create")
+    parser.add_argument("--talk-seconds", type=float, default=1.0)
+    parser.add_argument("--busy", type=float, default=0.2, help="Share of attempts that end busy")
+    parser.add_argument("--no-answer", type=float, default=0.2, help="Share of attempts that go unanswered")
+    parser.add_argument("--early", type=float, default=0.05, help="Share of attempts whose failed status arrives first")
+    parser.add_argument("--lost", type=float, default=0.05, help="Share of attempts that never get a final status")
+    parser.add_argument("--retry-delays", default="0.5,1", help="Seconds before each busy/no-answer retry")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    calls = FakeCalls(args.api_latency, args.talk_seconds, args.busy, args.no_answer, args.early, args.lost, args.seed)
+    # The registry allows more than the campaign cap, so the cap is what holds dials back
+    agent = StubAgent(calls, max_live=args.max_live * 2, ttl_seconds=args.talk_seconds * 2)
+    engine = CampaignEngine(agent, calls_per_second=args.cps, max_live_calls=args.max_live, dial_workers=args.dial_workers)
+    # What close_evicted_call does for a reaped call
+    agent.active_conversations.on_evict = lambda call_sid, conversation, reason: engine.abandon(call_sid, reason)
+
+    def status_webhook(call_sid, status):
+        # What /twilio/status does for a terminal status
+        engine.record_status(call_sid, status)
+        agent.end_conversation(call_sid)
+
+    calls.on_status = status_webhook
+    delays = [float(delay) for delay in args.retry_delays.split(",") if delay]
+    numbers = [f"+1555{index:07d}" for index in range(args.numbers)]
+
+    engine.start()
+    started = time.monotonic()
+    campaign = engine.create(numbers, "+15550000000", "http://localhost:8000",
+                             name="check", retry_schedule={"busy": delays, "no-answer": delays})
+    while campaign.state != "finished":
+        time.sleep(0.05)
+    elapsed = time.monotonic() - started
+    engine.stop()
+
+    stats = campaign.stats(include_contacts=True)
+    print(f"{stats['numbers']} numbers, {stats['dials']} dials ({stats['retries']} retries) in {elapsed:.2f}s")
+    print(f"pace: {stats['dials_per_second']} dials/s (target {args.cps}), at most {calls.max_per_second()} in any second")
+    print(f"live calls: at most {calls.max_live} (cap {args.max_live}); {engine.capacity_stalls} stalls at the cap")
+    print(f"early statuses applied: {engine.early_statuses}, calls given up after reaping: {engine.lost_calls}")
+    print(f"outcomes: {stats['outcomes']}")
+    print(f"numbers: {', '.join(f'{state} {count}' for state, count in stats['states'].items() if count)}")
+
+    assert calls.max_live <= args.max_live, f"{calls.max_live} live calls exceeded the cap of {args.max_live}"
+    assert calls.max_per_second() <= int(args.cps) + 1, f"{calls.max_per_second()} dials in one second exceeded {args.cps}/s"
+    assert stats["done"] == stats["numbers"] and stats["dials"] == len(calls.created)
+    for contact in stats["contacts"]:
+        retries = len(contact["outcomes"]) - 1
+        assert contact["attempts"] == len(contact["outcomes"]) and retries <= 2 * len(delays), contact
+        expected = {"completed": "completed", "failed": "failed", "lost": "failed"}.get(contact["outcomes"][-1], "unreached")
+        assert contact["state"] == expected, contact
+    print("campaign check: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Exercise a conversation state store the way several workers would, without Twilio or any provider.
+
+Two workers alternate the webhooks of one call, a third resumes it as if
+after a restart, and two workers save the same turn at once to force a
+version conflict. Then many calls are saved to measure state size and
+save latency:
+
+    python -m benchmarks.conversation_store_check
+    python -m benchmarks.conversation_store_check --store sqlite:///tmp/states.db
+    python -m benchmarks.conversation_store_check --store redis://localhost:6379/15
+    python -m benchmarks.conversation_store_check --store fakeredis   # needs the fakeredis package
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.agent import EnhancedConversation
+from app.context_window import ConversationContext
+from app.conversation_store import RedisConversationStore, create_state_store
+
+
+class StubAgent:
+    """Stands in for GroqSalesAgent: a ConversationContext and a canned reply per input."""
+
+    def __init__(self):
+        self.context = ConversationContext()
+
+    async def respond(self, human_input, conversation_id=None, is_interrupt=False):
+        self.context.add("user", human_input)
+        reply = f"Noted: {human_input.lower()}"
+        yield reply
+        self.context.add("assistant", reply)
+
+    def reset(self):
+        self.context.reset()
+
+
+def worker_conversation(store, call_sid):
+    """What SalesAgent.get_conversation builds on a worker that has not seen the call yet."""
+    config = SimpleNamespace(api_key="unused", voice_id="voice", model_id="model")
+    conversation = EnhancedConversation(StubAgent(), config, config)
+    conversation.call_sid = call_sid
+    conversation.state_store = store
+    conversation.refresh_state()
+    return conversation
+
+
+async def take_turn(conversation, text):
+    async for _ in conversation.agent.respond(text, conversation.call_sid):
+        pass
+    await conversation.save_state()
+
+
+def transcript(conversation):
+    return [message["content"] for message in conversation.agent.context.messages]
+
+
+async def run(store, calls, turns):
+    call_sid = "CA-check"
+    store.delete(call_sid)
+
+    # Webhooks of one call alternate between two workers
+    first, second = worker_conversation(store, call_sid), worker_conversation(store, call_sid)
+    first.metadata.update(customer_number="+15550100", direction="inbound")
+    for turn in range(4):
+        worker = first if turn % 2 == 0 else second
+        worker.refresh_state()
+        await take_turn(worker, f"Turn {turn}")
+    assert transcript(second) == [text for turn in range(4) for text in (f"Turn {turn}", f"Noted: turn {turn}")], transcript(second)
+    print(f"alternating workers: ok (version {second.state_version})")
+
+    # A restarted worker picks the call up where it was
+    resumed = worker_conversation(store, call_sid)
+    assert transcript(resumed) == transcript(second) and resumed.metadata["customer_number"] == "+15550100"
+    print("resume after restart: ok")
+
+    # Two stale workers save at once; the loser replays its turn on top of the winner's
+    first.refresh_state()
+    second.refresh_state()
+    await asyncio.gather(take_turn(first, "Concurrent A"), take_turn(second, "Concurrent B"))
+    latest = worker_conversation(store, call_sid)
+    assert {"Concurrent A", "Concurrent B"} <= set(transcript(latest)) and len(transcript(latest)) == 12, transcript(latest)
+    print(f"concurrent save: ok ({store.conflicts} conflict(s) rebased)")
+    store.delete(call_sid)
+
+    # Size and latency of saving a turn across many calls
+    conversations = [worker_conversation(store, f"CA-load-{index}") for index in range(calls)]
+    started = time.perf_counter()
+    for turn in range(turns):
+        for conversation in conversations:
+            await take_turn(conversation, f"This is what the customer said on turn {turn}, about their order.")
+    elapsed = time.perf_counter() - started
+    for conversation in conversations:
+        store.delete(conversation.call_sid)
+    stats = store.stats()
+    print(f"{calls} calls x {turns} turns: {elapsed / (calls * turns) * 1000:.2f} ms per turn, "
+          f"avg state {stats['avg_state_bytes']} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default="memory", help="memory, sqlite:///<path>, redis://... or fakeredis")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.store == "fakeredis":
+        import fakeredis
+        store = RedisConversationStore(client=fakeredis.FakeRedis())
+    else:
+        store = create_state_store(args.store)
+    asyncio.run(run(store, args.calls, args.turns))
+
+
+if __name__ == "__main__":
+    main()
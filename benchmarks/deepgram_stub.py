@@ -0,0 +1,197 @@
+"""A local WebSocket server that stands in for Deepgram's live transcription API.
+
+Run it and point the app at it:
+
+    python -m benchmarks.deepgram_stub --port 8765
+    DEEPGRAM_STREAM_URL=ws://localhost:8765/v1/listen python main.py --asgi
+
+The stub "recognizes" one word of --transcript per chunk of non-silent audio,
+sending interim Results as it goes, and a final speech_final Results once
+the audio has been silent for the socket's endpointing. Results carry
+Deepgram's start/duration fields, so per-chunk latency can be measured
+against it. --delay adds processing latency and --drop-after closes the
+socket abruptly after that many chunks, to exercise reconnects.
+
+    python -m benchmarks.deepgram_stub --selftest
+
+streams speech and silence through DeepgramStreamingTranscriber against a
+stub that drops the first socket, and checks the transcripts, the reconnect
+and the latency stats.
+"""
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+# Bytes that encode silence for each encoding
+SILENCE = {"linear16": b"\x00", "mulaw": b"\xff", "alaw": b"\xd5"}
+BYTES_PER_SAMPLE = {"linear16": 2, "mulaw": 1, "alaw": 1}
+
+
+class StubSession:
+    """Transcribes one socket's audio against a fixed transcript."""
+
+    def __init__(self, socket, words, delay, drop_after):
+        self.socket = socket
+        self.words = words
+        self.delay = delay
+        self.drop_after = drop_after
+        query = parse_qs(urlparse(socket.request.path).query)
+        self.encoding = query.get("encoding", ["linear16"])[0]
+        self.sample_rate = int(query.get("sample_rate", ["8000"])[0])
+        self.endpointing = int(query.get("endpointing", ["300"])[0]) / 1000
+        self.silence = SILENCE.get(self.encoding, b"\x00")
+        self.bytes_per_second = self.sample_rate * BYTES_PER_SAMPLE.get(self.encoding, 2)
+
+        self.chunks = 0
+        self.clock = 0.0
+        self.heard = 0
+        self.utterance_start = None
+        self.silent_since = None
+
+    def results(self, start, end, transcript, is_final, speech_final=False):
+        return {
+            "type": "Results",
+            "start": round(start, 4),
+            "duration": round(end - start, 4),
+            "is_final": is_final,
+            "speech_final": speech_final,
+            "channel": {"alternatives": [{"transcript": transcript, "confidence": 0.99}]}
+        }
+
+    async def reply(self, message):
+        await asyncio.sleep(self.delay)
+        await self.socket.send(json.dumps(message))
+
+    def heard_text(self):
+        return " ".join(self.words[:self.heard])
+
+    async def finalize(self):
+        if self.utterance_start is not None:
+            await self.reply(self.results(self.utterance_start, self.clock, self.heard_text(), True, True))
+            self.words = self.words[self.heard:]
+            self.heard, self.utterance_start = 0, None
+
+    async def audio(self, chunk):
+        self.chunks += 1
+        start, self.clock = self.clock, self.clock + len(chunk) / self.bytes_per_second
+        if chunk.strip(self.silence):
+            self.silent_since = None
+            if self.utterance_start is None:
+                self.utterance_start = start
+            self.heard = min(len(self.words), self.heard + 1)
+            await self.reply(self.results(self.utterance_start, self.clock, self.heard_text(), False))
+        else:
+            if self.silent_since is None:
+                self.silent_since = start
+            if self.utterance_start is not None and self.clock - self.silent_since >= self.endpointing:
+                await self.finalize()
+            else:
+                # Deepgram answers silence with empty results as well
+                await self.reply(self.results(start, self.clock, "", False))
+
+    async def run(self):
+        async for message in self.socket:
+            if isinstance(message, str):
+                if json.loads(message).get("type") == "CloseStream":
+                    await self.finalize()
+                    await self.socket.close()
+                continue
+            await self.audio(message)
+            if self.drop_after and self.chunks >= self.drop_after:
+                # Simulate a network failure: no closing handshake
+                self.socket.transport.abort()
+                return
+
+
+class DeepgramStub:
+    def __init__(self, transcript, delay=0.05, drop_after=0, drop_once=True):
+        self.words = transcript.split()
+        self.delay = delay
+        self.drop_after = drop_after
+        self.drop_once = drop_once
+        self.connections = 0
+
+    async def handle(self, socket):
+        self.connections += 1
+        drop_after = self.drop_after if (self.connections == 1 or not self.drop_once) else 0
+        try:
+            await StubSession(socket, list(self.words), self.delay, drop_after).run()
+        except ConnectionClosed:
+            pass
+
+
+async def serve_forever(port, stub):
+    async with serve(stub.handle, "localhost", port):
+        print(f"Deepgram stub listening on ws://localhost:{port}/v1/listen")
+        await asyncio.Future()
+
+
+async def selftest(delay):
+    from app.deepgram_stream import DeepgramStreamingTranscriber, StreamingMetrics
+
+    # 20 ms frames of 8 kHz linear16, as the transcriber config describes
+    frame, speech, silence = 320, b"\x10\x20" * 160, b"\x00" * 320
+    config = SimpleNamespace(
+        api_key="stub", model_name="nova-2", language="en-US", tier="enhanced",
+        audio_encoding="linear16", sampling_rate=8000, chunk_size=1024
+    )
+    stub = DeepgramStub("tell me about your pricing", delay=delay, drop_after=4)
+    async with serve(stub.handle, "localhost", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        metrics = StreamingMetrics()
+        transcriber = DeepgramStreamingTranscriber(config, url=f"ws://localhost:{port}/v1/listen", metrics=metrics)
+        await transcriber.connect()
+
+        results = []
+
+        async def collect():
+            async for result in transcriber.results():
+                results.append(result)
+
+        collector = asyncio.ensure_future(collect())
+        started = time.monotonic()
+        # One second of speech, then a second of silence, in real time
+        frames = [speech] * 50 + [silence] * 50
+        for i, audio in enumerate(frames):
+            await asyncio.sleep(max(0.0, started + i * 0.02 - time.monotonic()))
+            await transcriber.send(audio)
+        await asyncio.sleep(delay + 0.2)
+        await transcriber.close()
+        await asyncio.wait_for(collector, 5)
+
+    for result in results:
+        print(f"  {'final  ' if result['is_final'] else 'interim'} {result['transcript']}")
+    print(f"  {metrics.to_dict()}")
+    print(f"  {transcriber.stats()}")
+    assert metrics.reconnects == 1 and stub.connections == 2
+    # Every byte went out in chunk_size pieces, apart from the tail flushed on close
+    assert metrics.chunks_sent == len(frames) * frame // config.chunk_size
+    assert any(result["is_final"] for result in results)
+    assert results[-1]["is_final"]
+    assert metrics.chunk_latencies and min(metrics.chunk_latencies) >= delay
+    print("ok")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--transcript", default="Hi, I'm calling about your pricing plans.")
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds before each result is sent")
+    parser.add_argument("--drop-after", type=int, default=0, help="abort each socket after this many chunks")
+    parser.add_argument("--selftest", action="store_true")
+    args = parser.parse_args()
+    if args.selftest:
+        asyncio.run(selftest(args.delay))
+    else:
+        stub = DeepgramStub(args.transcript, args.delay, args.drop_after, drop_once=False)
+        asyncio.run(serve_forever(args.port, stub))
+
+
+if __name__ == "__main__":
+    main()
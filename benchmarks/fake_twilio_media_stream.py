@@ -0,0 +1,105 @@
+"""Play the bundled output_audio.mp3 into the media stream endpoint, as Twilio would.
+
+Start the server with `python main.py --asgi`, then:
+
+    python -m benchmarks.fake_twilio_media_stream --url ws://localhost:8000/twilio/media-stream
+
+The MP3 is converted to 8 kHz mu-law with ffmpeg and sent in 20 ms frames in
+real time, followed by silence so Deepgram detects the end of the utterance.
+The agent's audio is collected and can be saved with --save (raw mu-law; play
+it with `ffplay -f mulaw -ar 8000 <file>`).
+"""
+import argparse
+import asyncio
+import base64
+import json
+import subprocess
+import time
+import uuid
+
+from websockets.asyncio.client import connect
+
+FRAME_BYTES = 160  # 20 ms of 8 kHz mu-law
+MULAW_SILENCE = b"\xff"
+
+
+def load_mulaw(path):
+    """Decode an audio file to raw 8 kHz mono mu-law with ffmpeg."""
+    return subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", path, "-ar", "8000", "-ac", "1", "-f", "mulaw", "-"],
+        check=True, capture_output=True
+    ).stdout
+
+
+async def send_audio(socket, stream_sid, audio, silence_seconds):
+    """Send audio in real-time 20 ms frames, then trailing silence."""
+    audio += MULAW_SILENCE * int(8000 * silence_seconds)
+    started = time.monotonic()
+    for chunk, offset in enumerate(range(0, len(audio), FRAME_BYTES)):
+        await asyncio.sleep(max(0.0, started + chunk * 0.02 - time.monotonic()))
+        await socket.send(json.dumps({
+            "event": "media",
+            "streamSid": stream_sid,
+            "media": {"chunk": str(chunk + 1), "timestamp": str(chunk * 20),
+                      "payload": base64.b64encode(audio[offset:offset + FRAME_BYTES]).decode()}
+        }))
+
+
+async def run(url, audio_path, silence_seconds, listen_seconds, save):
+    call_sid, stream_sid = f"CAfake{uuid.uuid4().hex[:26]}", f"MZfake{uuid.uuid4().hex[:26]}"
+    audio = load_mulaw(audio_path)
+    received, marks, media_times = bytearray(), [], []
+
+    async with connect(url) as socket:
+        await socket.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+        await socket.send(json.dumps({
+            "event": "start",
+            "streamSid": stream_sid,
+            "start": {"streamSid": stream_sid, "callSid": call_sid, "tracks": ["inbound"],
+                      "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1}}
+        }))
+
+        async def receive():
+            async for message in socket:
+                data = json.loads(message)
+                if data["event"] == "media":
+                    media_times.append(time.monotonic())
+                    received.extend(base64.b64decode(data["media"]["payload"]))
+                elif data["event"] == "mark":
+                    marks.append(data["mark"]["name"])
+                    # Acknowledge as Twilio does once the audio before the mark has played
+                    await socket.send(json.dumps({"event": "mark", "streamSid": stream_sid, "mark": data["mark"]}))
+
+        receiver = asyncio.ensure_future(receive())
+        # Let the greeting play before speaking, like a caller would
+        await asyncio.sleep(2)
+        await send_audio(socket, stream_sid, audio, silence_seconds)
+        speech_ended_at = time.monotonic() - silence_seconds
+        await asyncio.sleep(listen_seconds)
+
+        await socket.send(json.dumps({"event": "stop", "streamSid": stream_sid, "stop": {"callSid": call_sid}}))
+        receiver.cancel()
+
+    print(f"call {call_sid}: sent {len(audio) / 8000:.1f}s of speech, "
+          f"received {len(received) / 8000:.1f}s of audio in {len(marks)} segments")
+    replies = [at for at in media_times if at >= speech_ended_at]
+    if replies:
+        print(f"first reply audio {replies[0] - speech_ended_at:.2f}s after the caller stopped speaking")
+    if save:
+        with open(save, "wb") as f:
+            f.write(received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="ws://localhost:8000/twilio/media-stream")
+    parser.add_argument("--audio", default="output_audio.mp3")
+    parser.add_argument("--silence", type=float, default=1.5, help="seconds of silence after the speech")
+    parser.add_argument("--listen", type=float, default=8.0, help="seconds to wait for the reply")
+    parser.add_argument("--save", help="write the agent's audio to this file")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.audio, args.silence, args.listen, args.save))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compare one-shot requests.post calls with the shared pooled async client.
+
+Runs against a local keep-alive stub server, so no provider credentials are needed:
+
+    python -m benchmarks.http_pool_benchmark --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from app.http_client import PooledHTTPClient, get_pool_metrics
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a small JSON body over a keep-alive connection."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    connections = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler._lock:
+            StubHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency: float):
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_unpooled(url, total, concurrency):
+    """The previous behaviour: a fresh connection per requests.post, run off the loop."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await asyncio.to_thread(requests.post, url, json={"text": "hello"})
+
+    await asyncio.gather(*(one() for _ in range(total)))
+
+
+async def run_pooled(url, total, concurrency):
+    client = PooledHTTPClient(per_host_limit=concurrency)
+    try:
+        await asyncio.gather(*(client.post(url, json={"text": "hello"}) for _ in range(total)))
+    finally:
+        await client.aclose()
+
+
+def measure(label, runner, url, total, concurrency):
+    StubHandler.connections = 0
+    started = time.perf_counter()
+    asyncio.run(runner(url, total, concurrency))
+    elapsed = time.perf_counter() - started
+    print(f"{label:>10}: {elapsed:.2f}s  {total / elapsed:8.1f} req/s  "
+          f"{StubHandler.connections} TCP connections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="Stub server latency in seconds")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency)
+    url = f"http://127.0.0.1:{server.server_port}/v1/text-to-speech/voice"
+    try:
+        measure("unpooled", run_unpooled, url, args.requests, args.concurrency)
+        measure("pooled", run_pooled, url, args.requests, args.concurrency)
+        print("pool metrics:", json.dumps(get_pool_metrics(), indent=2))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
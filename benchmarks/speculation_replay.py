@@ -0,0 +1,99 @@
+"""Replay recorded interim/final transcript sequences through the speculative responder.
+
+A stub LLM with fixed latency stands in for Groq, so no network access is needed:
+
+    python -m benchmarks.speculation_replay --llm-latency 0.4
+    python -m benchmarks.speculation_replay --recording my_calls.json
+
+A recording is a JSON list of utterances; each utterance is a list of
+[seconds_since_utterance_start, transcript, is_final] results.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.context_window import ConversationContext
+from app.speculation import SpeculationMetrics, SpeculativeResponder
+
+SAMPLE_RECORDING = [
+    # Stable interim that matches the final: a hit
+    [[0.2, "I'm looking for", False], [0.5, "I'm looking for a CRM", False], [0.8, "I'm looking for a CRM", False],
+     [1.4, "I'm looking for a CRM.", True]],
+    # The caller keeps talking past the stable interim: the speculation diverges and restarts
+    [[0.2, "how much", False], [0.4, "how much", False], [0.9, "how much does the enterprise plan cost per seat", False],
+     [1.1, "how much does the enterprise plan cost per seat", False], [1.6, "How much does the enterprise plan cost per seat?", True]],
+    # The final transcript corrects the interim: a miss
+    [[0.3, "we have twenty users", False], [0.6, "we have twenty users", False], [1.2, "We have seventy two users.", True]],
+    # No stable interim before the final: nothing to speculate on
+    [[0.3, "yes", False], [0.5, "Yes, please send it.", True]],
+]
+
+
+class StubAgent:
+    """Mimics GroqSalesAgent's history handling with a fixed generation latency."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.context = ConversationContext()
+
+    async def generate(self, text):
+        self.context.add("user", text)
+        await asyncio.sleep(self.latency)
+        response = f"Thanks - noted: {text}"
+        self.context.add("assistant", response)
+        yield response
+
+
+async def replay(utterance):
+    """Yield an utterance's recorded results with their original timing."""
+    started = time.monotonic()
+    for offset, transcript, is_final in utterance:
+        await asyncio.sleep(max(0.0, started + offset - time.monotonic()))
+        yield {"transcript": transcript, "is_final": is_final}
+
+
+async def run(recording, latency, threshold, speculative):
+    agent = StubAgent(latency)
+    metrics = SpeculationMetrics()
+    waits = []
+    for utterance in recording:
+        responder = SpeculativeResponder(
+            agent.generate,
+            checkpoint=agent.context.snapshot,
+            rollback=agent.context.restore,
+            amend=lambda text: agent.context.replace_last("user", text),
+            threshold=threshold,
+            enabled=speculative,
+            metrics=metrics
+        )
+        started = time.monotonic()
+        result = await responder.respond(replay(utterance))
+        # Response latency as the caller perceives it: from the final transcript to the answer
+        waits.append(time.monotonic() - started - utterance[-1][0])
+        print(f"  {'speculative' if result['speculative'] else 'regular':>11}  {result['transcript']}")
+
+    # Every turn must appear exactly once in the history, whatever was speculated and rolled back
+    assert len(agent.context.messages) == 2 * len(recording), agent.context.messages
+    print(f"  mean response wait {sum(waits) / len(waits) * 1000:.0f} ms  {json.dumps(metrics.to_dict())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recording", help="JSON file of recorded utterances (default: built-in sample)")
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    args = parser.parse_args()
+
+    recording = SAMPLE_RECORDING
+    if args.recording:
+        with open(args.recording) as f:
+            recording = json.load(f)
+
+    for speculative in (False, True):
+        print("speculation on:" if speculative else "speculation off:")
+        asyncio.run(run(recording, args.llm_latency, args.threshold, speculative))
+
+
+if __name__ == "__main__":
+    main()
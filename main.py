@@ -1,7 +1,7 @@
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
-from app.twilio_server import app
 
 # Make sure we're loading environment variables
 load_dotenv()
@@ -31,11 +31,28 @@ if __name__ == "__main__":
     if not os.path.exists(template_dir):
         os.makedirs(template_dir)
         
+    parser = argparse.ArgumentParser(description="Run the Jivus AI Voice Agent server.")
+    parser.add_argument("--asgi", action="store_true",
+                        help="Serve through uvicorn on a long-lived event loop (production)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+                        help="Number of worker processes in ASGI mode (default: $WEB_CONCURRENCY or 1)")
+    args = parser.parse_args()
+    
     # Print startup message
     port = int(os.environ.get("PORT", 8000))
     print(f"Starting Jivus AI Voice Agent on port {port}")
-    print("Dashboard will be available at http://localhost:{port}")
+    print(f"Dashboard will be available at http://localhost:{port}")
     print("Ctrl+C to quit")
     
-    # Run the Flask app
-    app.run(debug=True, host='0.0.0.0', port=port)
\ No newline at end of file
+    if args.asgi:
+        # Production: one event loop per worker shared by all calls
+        import uvicorn
+        uvicorn.run("app.asgi:application", host='0.0.0.0', port=port, workers=args.workers, lifespan="on")
+    else:
+        # Development: Flask's built-in server, with warmup on the background loop.
+        # Imported only here: building the app starts background threads and opens the logs,
+        # which the ASGI master process must not do before it starts the workers
+        from app.runtime import runtime
+        from app.twilio_server import app, warm_up_speech
+        runtime.submit(warm_up_speech())
+        app.run(debug=os.environ.get("FLASK_DEBUG") == "1", host='0.0.0.0', port=port)
@@ -0,0 +1,154 @@
+"""CampaignEngine dialing through SalesAgent.make_outbound_call against a fake Twilio client."""
+import itertools
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.agent import SalesAgent
+from app.campaigns import CampaignEngine
+from app.conversation_registry import ConversationRegistry, RegistryFullError
+
+
+def contact_state(campaign):
+    return campaign.stats(include_contacts=True)["contacts"][0]["state"]
+
+
+def until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class FakeCalls:
+    """Stands in for client.calls; on_create runs while Twilio is placing the call."""
+
+    def __init__(self, on_create=None):
+        self.on_create = on_create
+        self.created = []
+        self._sids = itertools.count()
+
+    def create(self, to, from_, url, status_callback):
+        if self.on_create:
+            self.on_create()
+        sid = f"CA{next(self._sids):032d}"
+        self.created.append((sid, to))
+        return SimpleNamespace(sid=sid)
+
+
+class StubAgent:
+    """The parts of SalesAgent a campaign uses, with the real make_outbound_call."""
+
+    make_outbound_call = SalesAgent.make_outbound_call
+
+    def __init__(self, calls, max_live, fail_conversations=False):
+        self.twilio_client = SimpleNamespace(calls=calls)
+        self.active_conversations = ConversationRegistry(max_live=max_live, overflow_policy="reject")
+        self.fail_conversations = fail_conversations
+
+    def get_conversation(self, call_sid, metadata=None, reserved=False):
+        if self.fail_conversations:
+            if reserved:
+                self.active_conversations.release()
+            raise RuntimeError("state store unavailable")
+        conversation = SimpleNamespace(call_sid=call_sid, metadata=metadata or {}, terminate=lambda: None)
+        self.active_conversations.add(call_sid, conversation, reserved=reserved)
+        return conversation
+
+    def end_conversation(self, call_sid):
+        self.active_conversations.pop(call_sid)
+
+
+@pytest.fixture
+def engine_for():
+    engines = []
+
+    def make(agent):
+        engine = CampaignEngine(agent, calls_per_second=100, max_live_calls=10, dial_workers=2)
+        engine.start()
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.stop()
+
+
+def test_inbound_call_cannot_take_the_slot_of_a_call_being_dialed(engine_for):
+    rejected = []
+
+    def inbound_call_arrives():
+        try:
+            agent.active_conversations["CAinbound"] = SimpleNamespace(terminate=lambda: None)
+        except RegistryFullError:
+            rejected.append("CAinbound")
+
+    calls = FakeCalls(on_create=inbound_call_arrives)
+    agent = StubAgent(calls, max_live=1)
+    engine = engine_for(agent)
+    campaign = engine.create(["+15550000001"], "+15550000000", "http://localhost")
+    until(lambda: contact_state(campaign) == "live")
+
+    assert rejected == ["CAinbound"]
+    call_sid = calls.created[0][0]
+    assert call_sid in agent.active_conversations and agent.active_conversations.stats()["reserved"] == 0
+
+    engine.record_status(call_sid, "completed")
+    agent.end_conversation(call_sid)
+    until(lambda: campaign.state == "finished")
+    # Dialed exactly once
+    assert [to for _, to in calls.created] == ["+15550000001"]
+    assert campaign.stats()["dials"] == 1
+
+
+def test_placed_call_is_never_redialed_when_its_conversation_fails(engine_for):
+    calls = FakeCalls()
+    agent = StubAgent(calls, max_live=1, fail_conversations=True)
+    engine = engine_for(agent)
+    campaign = engine.create(["+15550000001"], "+15550000000", "http://localhost", retry_schedule={"failed": [0]})
+    until(lambda: contact_state(campaign) == "live")
+
+    assert engine.dial_errors == 1
+    # The slot held while dialing was given back
+    assert agent.active_conversations.stats()["reserved"] == 0
+
+    engine.record_status(calls.created[0][0], "completed")
+    until(lambda: campaign.state == "finished")
+    assert len(calls.created) == 1
+    assert contact_state(campaign) == "completed"
+
+
+def test_failed_create_gives_back_the_reserved_slot():
+    def twilio_down():
+        raise RuntimeError("Twilio unavailable")
+
+    agent = StubAgent(FakeCalls(on_create=twilio_down), max_live=1)
+    with pytest.raises(RuntimeError):
+        agent.make_outbound_call("+15550000001", "+15550000000", "http://localhost")
+    assert agent.active_conversations.stats()["reserved"] == 0
+    agent.active_conversations.check_capacity()
+
+
+def test_only_the_most_recent_finished_campaigns_are_kept():
+    calls = FakeCalls()
+    agent = StubAgent(calls, max_live=10)
+    engine = CampaignEngine(agent, calls_per_second=100, max_live_calls=10, dial_workers=2, keep_finished=2)
+    engine.start()
+    try:
+        campaigns = []
+        for index in range(4):
+            campaign = engine.create([f"+1555000000{index}"], "+15550000000", "http://localhost")
+            until(lambda: contact_state(campaign) == "live")
+            call_sid = calls.created[-1][0]
+            engine.record_status(call_sid, "completed")
+            agent.end_conversation(call_sid)
+            until(lambda: campaign.state == "finished")
+            campaigns.append(campaign)
+        running = engine.create(["+15550000009"], "+15550000000", "http://localhost")
+        until(lambda: engine.stats()["pruned_campaigns"] == 2)
+
+        assert [campaign.id for campaign in engine.list_campaigns()] == [campaigns[2].id, campaigns[3].id, running.id]
+        assert engine.get(campaigns[0].id) is None
+    finally:
+        engine.stop()
@@ -0,0 +1,79 @@
+"""GroqSalesAgent streaming against a fake Groq client."""
+import asyncio
+from types import SimpleNamespace
+
+from vocode.streaming.models.message import BaseMessage
+
+from app.groq_agent import GroqAgentConfig, GroqSalesAgent
+from app.provider_limits import groq_limiter
+
+
+class FakeCompletion:
+    """A streamed completion; with stall, it stops after its words until closed."""
+
+    def __init__(self, words, stall=False):
+        self.words = words
+        self.stall = stall
+        self.closed = False
+
+    async def _chunks(self):
+        for word in self.words:
+            await asyncio.sleep(0)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word))])
+        if self.stall:
+            await asyncio.Event().wait()
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeGroq:
+    def __init__(self, completion):
+        self.completion = completion
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        return self.completion
+
+
+def make_agent(completion):
+    config = GroqAgentConfig(initial_message=BaseMessage(text="Hello!"), model_name="test-model")
+    return GroqSalesAgent(config, llm_client=FakeGroq(completion))
+
+
+def test_groq_slot_is_released_once_the_completion_is_received():
+    async def test():
+        completion = FakeCompletion(["Our", " plans", " start", " at", " ten", " dollars."])
+        agent = make_agent(completion)
+        stream = agent.respond("How much is it?", "CAtest")
+        chunks = [await stream.__anext__()]
+        # A slow consumer (speech synthesis) has only taken one chunk, but Groq's slot is already free
+        for _ in range(20):
+            await asyncio.sleep(0)
+        assert groq_limiter.active == 0 and completion.closed
+        chunks += [chunk async for chunk in stream]
+        return agent, chunks
+
+    agent, chunks = asyncio.run(test())
+    assert "".join(chunks) == "Our plans start at ten dollars."
+    assert agent.conversation_history[-1] == {"role": "assistant", "content": "Our plans start at ten dollars."}
+
+
+def test_consumer_stopping_early_closes_the_stream_and_frees_the_slot():
+    async def test():
+        completion = FakeCompletion(["Our", " plans"], stall=True)
+        agent = make_agent(completion)
+        stream = agent.respond("How much is it?", "CAtest")
+        first = await stream.__anext__()
+        assert groq_limiter.active == 1
+        # e.g. a barge-in
+        await stream.aclose()
+        return agent, completion, first
+
+    agent, completion, first = asyncio.run(test())
+    assert completion.closed and groq_limiter.active == 0
+    assert first == "Our"
+    assert agent.conversation_history[-1] == {"role": "assistant", "content": "Our"}
@@ -0,0 +1,352 @@
+"""Barge-in on a media stream, driven through fake Twilio and Deepgram streams."""
+import asyncio
+import base64
+
+from app.audio import mulaw_wav
+from app.context_window import ConversationContext
+from app.conversation_registry import ConversationRegistry
+from app.media_stream import BargeInMetrics, MediaStreamSession
+from app.speculation import SpeculativeResponder
+
+GREETING = "Hi!"
+REPLY = "Our plans start at ten dollars a seat. Enterprise adds single sign-on."
+FIRST_SENTENCE = "Our plans start at ten dollars a seat."
+FOLLOW_UP_REPLY = "Yes, above fifty seats."
+
+
+async def until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+class FakeTranscriber:
+    """Stands in for the Deepgram socket: yields whatever the test says."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def send(self, audio):
+        pass
+
+    async def results(self):
+        while True:
+            yield await self.queue.get()
+
+    async def close(self):
+        pass
+
+
+class FakeAgent:
+    """Streams canned replies word by word, recording history like GroqSalesAgent."""
+
+    def __init__(self, replies, stall_after=None):
+        self.replies = iter(replies)
+        # Stop generating (until cancelled) after this many words of the first reply
+        self.stall_after = stall_after
+        self.context = ConversationContext()
+        self.streams_cancelled = 0
+
+    async def get_initial_message(self):
+        return GREETING
+
+    async def respond(self, human_input, is_interrupt=False):
+        self.context.add("user", human_input)
+        stall_after, self.stall_after = self.stall_after, None
+        generated = ""
+        try:
+            for count, word in enumerate(next(self.replies).split(" ")):
+                if count == stall_after:
+                    await asyncio.Event().wait()
+                await asyncio.sleep(0)
+                chunk = word if not generated else " " + word
+                generated += chunk
+                yield chunk
+        except asyncio.CancelledError:
+            self.streams_cancelled += 1
+            raise
+        finally:
+            if generated:
+                self.context.add("assistant", generated)
+
+    def checkpoint(self):
+        return self.context.snapshot()
+
+    def rollback(self, checkpoint):
+        self.context.restore(checkpoint)
+
+    def amend_last_input(self, text):
+        self.context.replace_last("user", text)
+
+    def truncate_last_response(self, spoken):
+        self.context.truncate_reply(spoken)
+
+
+class FakeConversation:
+    def __init__(self, agent, fail_synthesis_of=None):
+        self.agent = agent
+        # Phrases containing this text fail to synthesize, like an ElevenLabs error
+        self.fail_synthesis_of = fail_synthesis_of
+        self.transcriber = FakeTranscriber()
+        self.call_sid = None
+        self.is_active = True
+
+    async def open_transcriber(self, encoding, sample_rate):
+        return self.transcriber
+
+    async def respond_to_transcripts(self, results, is_interrupt=False, stream=False):
+        responder = SpeculativeResponder(
+            lambda text: self.agent.respond(text, is_interrupt),
+            checkpoint=self.agent.checkpoint,
+            rollback=self.agent.rollback,
+            amend=self.agent.amend_last_input
+        )
+        return await responder.respond(results, stream=stream)
+
+    async def save_state(self):
+        pass
+
+    def terminate(self):
+        self.is_active = False
+
+    async def synthesize_audio(self, text):
+        if self.fail_synthesis_of and self.fail_synthesis_of in text:
+            raise RuntimeError("ElevenLabs request failed")
+        return mulaw_wav(b"\xff" * 160 * len(text))
+
+
+class FakeSalesAgent:
+    def __init__(self, conversation, ttl_seconds=600):
+        self.conversation = conversation
+        self.active_conversations = ConversationRegistry(ttl_seconds=ttl_seconds)
+
+    def get_conversation(self, call_sid):
+        self.active_conversations[call_sid] = self.conversation
+        return self.conversation
+
+
+class FakeLogger:
+    def __init__(self):
+        self.turns = []
+
+    def log_interaction(self, call_sid, user_input, ai_response, timings=None):
+        self.turns.append((user_input, ai_response))
+
+
+class FakeTwilio:
+    """The Twilio side of the socket: records what the session sends and plays marks when told to."""
+
+    def __init__(self):
+        self.sent = []
+        self.inbound: asyncio.Queue = asyncio.Queue()
+
+    async def send_message(self, message):
+        self.sent.append(message)
+
+    def marks(self):
+        return [m["mark"]["name"] for m in self.sent if m["event"] == "mark"]
+
+    def clears(self):
+        return sum(m["event"] == "clear" for m in self.sent)
+
+    async def send_media(self):
+        """Send 20 ms of caller audio and wait until the session has handled it."""
+        self.inbound.put_nowait({"event": "media", "media": {"payload": base64.b64encode(b"\xff" * 160).decode("ascii")}})
+        await self.inbound.join()
+
+    async def play(self, mark):
+        """Report a mark as played and wait until the session has handled it."""
+        self.inbound.put_nowait({"event": "mark", "mark": {"name": mark}})
+        await self.inbound.join()
+
+    async def messages(self):
+        yield {"event": "start", "start": {"callSid": "CAtest", "streamSid": "MZtest"}}
+        while True:
+            message = await self.inbound.get()
+            yield message
+            self.inbound.task_done()
+            if message["event"] == "stop":
+                return
+
+
+class Call:
+    """A media stream session wired to the fakes, past its greeting."""
+
+    def __init__(self, replies, stall_after=None, ttl_seconds=600, fail_synthesis_of=None):
+        self.agent = FakeAgent(replies, stall_after)
+        self.conversation = FakeConversation(self.agent, fail_synthesis_of)
+        self.sales_agent = FakeSalesAgent(self.conversation, ttl_seconds)
+        self.logger = FakeLogger()
+        self.twilio = FakeTwilio()
+        self.session = MediaStreamSession(self.sales_agent, self.logger, self.twilio.send_message)
+        self.session.metrics = BargeInMetrics()
+
+    def say(self, transcript, is_final=False):
+        self.conversation.transcriber.queue.put_nowait({"transcript": transcript, "is_final": is_final})
+
+    async def __aenter__(self):
+        self.task = asyncio.ensure_future(self.session.run(self.twilio.messages()))
+        await until(lambda: self.twilio.marks() == ["r1-seg-0"])
+        await self.twilio.play("r1-seg-0")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.twilio.inbound.put_nowait({"event": "stop"})
+        await self.task
+
+
+def run(test):
+    asyncio.run(asyncio.wait_for(test(), 10))
+
+
+def test_interrupt_mid_segment_keeps_only_what_was_played():
+    async def test():
+        async with Call([REPLY, FOLLOW_UP_REPLY]) as call:
+            call.say("Tell me about pricing.", is_final=True)
+            await until(lambda: call.twilio.marks()[1:] == ["r2-seg-0", "r2-seg-1"])
+            # The first sentence has been heard; the caller talks over the second
+            await call.twilio.play("r2-seg-0")
+            call.say("wait")
+            await until(lambda: call.twilio.clears() == 1)
+
+            call.say("Wait, do you have discounts?", is_final=True)
+            await until(lambda: "r3-seg-0" in call.twilio.marks())
+            await call.twilio.play("r3-seg-0")
+            await until(lambda: len(call.logger.turns) == 2)
+
+        assert call.agent.context.messages == [
+            {"role": "user", "content": "Tell me about pricing."},
+            {"role": "assistant", "content": "Our plans start at ten dollars a seat..."},
+            {"role": "user", "content": "Wait, do you have discounts?"},
+            {"role": "assistant", "content": FOLLOW_UP_REPLY},
+        ]
+        assert call.logger.turns == [
+            ("Tell me about pricing.", "Our plans start at ten dollars a seat..."),
+            ("Wait, do you have discounts?", FOLLOW_UP_REPLY),
+        ]
+        metrics = call.session.metrics.to_dict()
+        assert metrics["barge_ins"] == 1 and metrics["generation_cancelled"] == 0
+        assert metrics["unspoken_chars"] == len(REPLY) - len(FIRST_SENTENCE) - 1
+
+    run(test)
+
+
+def test_mark_from_cleared_reply_is_ignored():
+    async def test():
+        async with Call([REPLY, FOLLOW_UP_REPLY]) as call:
+            call.say("Tell me about pricing.", is_final=True)
+            await until(lambda: call.twilio.marks()[1:] == ["r2-seg-0", "r2-seg-1"])
+            call.say("wait")
+            await until(lambda: call.twilio.clears() == 1)
+            call.say("Wait, do you have discounts?", is_final=True)
+            await until(lambda: "r3-seg-0" in call.twilio.marks())
+
+            # Twilio echoes a mark of the cleared reply while the next one is playing
+            await call.twilio.play("r2-seg-0")
+            await call.twilio.play("r2-seg-1")
+            await asyncio.sleep(0.05)
+            assert len(call.logger.turns) == 1
+
+            await call.twilio.play("r3-seg-0")
+            await until(lambda: len(call.logger.turns) == 2)
+
+        # Nothing of the cleared reply was heard, so none of it is in the history or the transcript
+        assert [m["role"] for m in call.agent.context.messages] == ["user", "user", "assistant"]
+        assert call.logger.turns == [
+            ("Tell me about pricing.", ""),
+            ("Wait, do you have discounts?", FOLLOW_UP_REPLY),
+        ]
+
+    run(test)
+
+
+def test_interrupt_during_generation_cancels_the_llm_stream():
+    async def test():
+        async with Call([REPLY, FOLLOW_UP_REPLY], stall_after=3) as call:
+            call.say("Tell me about pricing.", is_final=True)
+            await until(lambda: call.agent.context.messages[-1:] == [{"role": "user", "content": "Tell me about pricing."}])
+            call.say("wait")
+            await until(lambda: call.twilio.clears() == 1)
+            call.say("Wait, do you have discounts?", is_final=True)
+            await until(lambda: "r3-seg-0" in call.twilio.marks())
+            await call.twilio.play("r3-seg-0")
+            await until(lambda: len(call.logger.turns) == 2)
+
+        assert call.agent.streams_cancelled == 1
+        assert call.session.metrics.generation_cancelled == 1
+        # The partial reply was never spoken, so it is dropped from the history
+        assert call.agent.context.messages == [
+            {"role": "user", "content": "Tell me about pricing."},
+            {"role": "user", "content": "Wait, do you have discounts?"},
+            {"role": "assistant", "content": FOLLOW_UP_REPLY},
+        ]
+        assert not any(mark.startswith("r2-") for mark in call.twilio.marks())
+
+    run(test)
+
+
+def test_failed_turn_keeps_the_call_going():
+    async def test():
+        async with Call([REPLY, FOLLOW_UP_REPLY], fail_synthesis_of="Enterprise") as call:
+            call.say("Tell me about pricing.", is_final=True)
+            await until(lambda: call.session.metrics.failed_turns == 1)
+            # The phrase sent before the error still plays
+            assert call.twilio.marks()[1:] == ["r2-seg-0"]
+            await call.twilio.play("r2-seg-0")
+
+            call.say("Do you have discounts?", is_final=True)
+            await until(lambda: "r3-seg-0" in call.twilio.marks())
+            await call.twilio.play("r3-seg-0")
+            await until(lambda: len(call.logger.turns) == 2)
+
+        assert call.agent.context.messages == [
+            {"role": "user", "content": "Tell me about pricing."},
+            {"role": "assistant", "content": "Our plans start at ten dollars a seat..."},
+            {"role": "user", "content": "Do you have discounts?"},
+            {"role": "assistant", "content": FOLLOW_UP_REPLY},
+        ]
+        assert call.logger.turns == [
+            ("Tell me about pricing.", "Our plans start at ten dollars a seat..."),
+            ("Do you have discounts?", FOLLOW_UP_REPLY),
+        ]
+        assert call.twilio.clears() == 0 and call.session.metrics.barge_ins == 0
+
+    run(test)
+
+
+def test_media_frames_keep_the_call_from_expiring():
+    async def test():
+        async with Call([REPLY], ttl_seconds=0.2) as call:
+            registry = call.sales_agent.active_conversations
+            # Talk for several TTLs without a single webhook
+            for _ in range(12):
+                await call.twilio.send_media()
+                await asyncio.sleep(0.05)
+                registry.reap()
+            assert "CAtest" in registry and call.conversation.is_active
+
+        # Once the stream is gone the entry ages out as before
+        await asyncio.sleep(0.3)
+        registry.reap()
+        assert "CAtest" not in registry and not call.conversation.is_active
+        assert registry.stats()["leaked"] == 1
+
+    run(test)
+
+
+def test_history_truncation():
+    context = ConversationContext()
+    context.add("user", "Tell me about pricing.")
+    context.add("assistant", REPLY)
+    context.truncate_reply(FIRST_SENTENCE + " ")
+    assert context.messages[-1] == {"role": "assistant", "content": "Our plans start at ten dollars a seat..."}
+
+    context.add("user", "And support?")
+    context.add("assistant", "Support is included.")
+    context.truncate_reply("")
+    assert context.messages[-1] == {"role": "user", "content": "And support?"}
+
+    # A reply that was already dropped leaves the caller's turn alone
+    context.truncate_reply("")
+    assert context.messages[-1] == {"role": "user", "content": "And support?"}
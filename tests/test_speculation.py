@@ -0,0 +1,120 @@
+"""SpeculativeResponder against a fake Deepgram result stream and a word-streaming agent."""
+import asyncio
+
+from app.context_window import ConversationContext
+from app.speculation import SpeculationMetrics, SpeculativeResponder
+
+
+class StubAgent:
+    """Streams "Re: <transcript>" with GroqSalesAgent's history handling."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.context = ConversationContext()
+        self.generated_for = []
+
+    async def respond(self, text):
+        self.context.add("user", text)
+        self.generated_for.append(text)
+        generated = ""
+        try:
+            for word in f"Re: {text}".split(" "):
+                await asyncio.sleep(self.delay)
+                chunk = word if not generated else " " + word
+                generated += chunk
+                yield chunk
+        finally:
+            if generated:
+                self.context.add("assistant", generated)
+
+
+def make_responder(agent, metrics=None):
+    return SpeculativeResponder(
+        agent.respond,
+        checkpoint=agent.context.snapshot,
+        rollback=agent.context.restore,
+        amend=lambda text: agent.context.replace_last("user", text),
+        metrics=metrics or SpeculationMetrics()
+    )
+
+
+async def transcripts(script, gap=0.01, hold_open=False):
+    """A Deepgram result stream: [transcript, is_final] pairs a little apart."""
+    for transcript, is_final in script:
+        await asyncio.sleep(gap)
+        yield {"transcript": transcript, "is_final": is_final}
+    if hold_open:
+        # Like the socket while the caller is still talking
+        await asyncio.Event().wait()
+
+
+def test_speculative_reply_is_rolled_back_when_the_final_transcript_differs():
+    async def test():
+        agent = StubAgent()
+        agent.context.add("assistant", "How can I help?")
+        metrics = SpeculationMetrics()
+        turn = await make_responder(agent, metrics).respond(transcripts([
+            ["I want the basic plan", False],
+            ["I want the basic plan", False],
+            ["I want the enterprise plan with single sign-on instead", True],
+        ]))
+        return agent, metrics, turn
+
+    agent, metrics, turn = asyncio.run(test())
+    assert turn == {
+        "transcript": "I want the enterprise plan with single sign-on instead",
+        "response": "Re: I want the enterprise plan with single sign-on instead",
+        "speculative": False
+    }
+    assert agent.generated_for[0] == "I want the basic plan"
+    # The speculated turn left no trace in the history
+    assert agent.context.messages == [
+        {"role": "assistant", "content": "How can I help?"},
+        {"role": "user", "content": "I want the enterprise plan with single sign-on instead"},
+        {"role": "assistant", "content": "Re: I want the enterprise plan with single sign-on instead"},
+    ]
+    assert (metrics.started, metrics.hits, metrics.misses) == (1, 0, 1)
+
+
+def test_cancelled_turn_rolls_back_a_running_speculation():
+    async def test():
+        agent = StubAgent(delay=1.0)
+        task = asyncio.ensure_future(make_responder(agent).respond(transcripts([
+            ["send me the contract", False],
+            ["send me the contract", False],
+        ], hold_open=True)))
+        # The caller hangs up (or barges in) while the speculation is generating
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return agent
+
+    agent = asyncio.run(test())
+    assert agent.generated_for == ["send me the contract"]
+    assert agent.context.messages == []
+
+
+def test_committed_speculation_streams_before_it_is_generated():
+    async def test():
+        agent = StubAgent(delay=0.05)
+        metrics = SpeculationMetrics()
+        turn = await make_responder(agent, metrics).respond(transcripts([
+            ["do you integrate with salesforce", False],
+            ["do you integrate with salesforce", False],
+            ["Do you integrate with Salesforce?", True],
+        ]), stream=True)
+        reply = turn["reply"]
+        still_generating = not reply.task.done()
+        chunks = [chunk async for chunk in reply]
+        return agent, metrics, turn, still_generating, chunks
+
+    agent, metrics, turn, still_generating, chunks = asyncio.run(test())
+    assert turn["speculative"] and still_generating
+    assert "".join(chunks) == turn["reply"].text == "Re: do you integrate with salesforce"
+    assert agent.generated_for == ["do you integrate with salesforce"]
+    # The history keeps the final transcript, not the interim it was generated from
+    assert agent.context.messages[0] == {"role": "user", "content": "Do you integrate with Salesforce?"}
+    assert metrics.hits == 1 and metrics.latency_saved_seconds > 0
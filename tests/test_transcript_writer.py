@@ -0,0 +1,23 @@
+"""TranscriptWriter group commits and where their disk time is reported."""
+import json
+
+from app.transcript_writer import TranscriptWriter
+
+
+def test_write_time_is_reported_per_call_from_the_writer_thread(tmp_path):
+    writes = []
+    writer = TranscriptWriter(str(tmp_path), flush_interval=1.0, durability="fsync",
+                              on_write=lambda call_sid, seconds: writes.append((call_sid, seconds)))
+    writer.append("CA1", {"type": "turn", "user": "hi", "agent": "hello"})
+    writer.append("CA2", {"type": "turn", "user": "hey", "agent": "hello"})
+    writer.append("CA1", {"type": "end", "status": "completed"})
+    # Queueing a record doesn't touch the disk, so nothing has been reported yet
+    assert writes == []
+    assert writer.flush(timeout=5)
+    writer.close()
+
+    # One write (and fsync) per call file in the batch
+    assert sorted(call_sid for call_sid, _ in writes) == ["CA1", "CA2"]
+    assert all(seconds > 0 for _, seconds in writes)
+    with open(tmp_path / "CA1.jsonl") as f:
+        assert [json.loads(line)["type"] for line in f] == ["turn", "end"]